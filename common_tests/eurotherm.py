@@ -8,6 +8,7 @@ from parameterized import parameterized
 
 from utils.calibration_utils import reset_calibration_file, use_calibration_file
 from utils.channel_access import ChannelAccess
+from utils.checkpoint import PvReadback, PvSetpoint, restore_checkpoint_or_set_up
 from utils.emulator_launcher import LewisLauncher
 from utils.ioc_launcher import EPICS_TOP, IOCRegister
 from utils.testing import get_running_lewis_and_ioc, parameterized_list, skip_if_recsim
@@ -60,7 +61,9 @@ class EurothermBaseTests(
 
     def setUp(self):
         self._setup_lewis_and_channel_access()
-        self._reset_device_state()
+        restore_checkpoint_or_set_up(
+            self, self._reset_device_state, self._device_state_checkpoint_items
+        )
         self.ca_no_prefix = ChannelAccess()
         self._lewis: LewisLauncher
 
@@ -88,6 +91,35 @@ class EurothermBaseTests(
         # Ensure the temperature isn't being changed by a ramp any more
         self.ca.assert_that_pv_value_is_unchanged(f"{sensor}:TEMP", wait=3)
 
+    def _device_state_checkpoint_items(self, sensor=PV_SENSORS[0]):
+        """
+        The state _reset_device_state leaves the device in. A different calibration, alarm or
+        ramp rate needs the whole reset; the ramp and temperatures can be put back directly.
+        """
+        return [
+            PvReadback(self.ca, f"{sensor}:CAL:RBV"),
+            PvReadback(self.ca, f"{sensor}:TEMP.SEVR"),
+            PvReadback(self.ca, f"{sensor}:RATE", tolerance=0.01),
+            PvSetpoint(self.ca, f"{sensor}:RAMPON:SP"),
+            PvReadback(self.ca, f"{sensor}:RAMPON"),
+            PvReadback(
+                self.ca,
+                f"{sensor}:TEMP",
+                tolerance=0.1,
+                restore=lambda temperature: self._set_setpoint_and_current_temperature(
+                    temperature, sensor
+                ),
+            ),
+            PvReadback(
+                self.ca,
+                f"{sensor}:TEMP:SP:RBV",
+                tolerance=0.1,
+                restore=lambda temperature: self._set_setpoint_and_current_temperature(
+                    temperature, sensor
+                ),
+            ),
+        ]
+
     def _set_setpoint_and_current_temperature(self, temperature, sensor=PV_SENSORS[0]):
         if IOCRegister.uses_rec_sim:
             self.ca.set_pv_value(f"{sensor}:SIM:TEMP:SP", temperature)
@@ -1 +1,3 @@
 DEFAULT_USE_PVA = False
+# Put a traffic tap between every IOC and its emulator, not just those asking for one
+TAP_ALL_EMULATOR_LINKS = False
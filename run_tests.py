@@ -3,32 +3,59 @@ Run the tests.
 """
 
 import argparse
+import atexit
 import glob
 import importlib
+import json
 import os
 import subprocess
 import sys
+import tempfile
+import time
 import traceback
 import unittest
 
 import xmlrunner
 from genie_python.utilities import cleanup_subprocs_on_process_exit
+from xmlrunner.result import _XMLTestResult
 
 import global_settings
 from run_utils import ModuleTests, modified_environment, package_contents
 from utils.build_architectures import BuildArchitectures
+from utils.checkpoint import CheckpointRegister
 from utils.device_launcher import device_collection_launcher, device_launcher
 from utils.emulator_launcher import (
+    DEFAULT_LEWIS_PACKAGE,
+    DEFAULT_LEWIS_PYTHON,
     DEVICE_EMULATOR_PATH,
     Emulator,
+    EmulatorRegister,
     LewisLauncher,
     MultiLewisLauncher,
     NullEmulatorLauncher,
     TestEmulatorData,
 )
-from utils.free_ports import get_free_ports
-from utils.ioc_launcher import EPICS_TOP, IOCS_DIR, IocLauncher
+from utils.emulator_pool import LewisInterpreterPool
+from utils.flakiness import FLAKINESS_DATABASE, FlakinessRegister, failure_signature
+from utils.free_ports import PORT_LEASE_DIRECTORY, PortLeaseRegister, get_free_ports
+from utils.ioc_launcher import EPICS_TOP, IOCS_DIR, IocLauncher, IocsNotRunningCheck
+from utils.launch_timing import LaunchTimingRegister
+from utils.log_archive import TestTimeline, archive_logs
+from utils.log_file import LOG_FILES_DIRECTORY
+from utils.stream_conditions import LinkConditioner
+from utils.stream_proxy import request_terminator_option
+from utils.stream_tap import TrafficTap
 from utils.test_modes import TestModes
+from utils.testing import skip_before_setup
+
+# Directory for the test reports
+TEST_REPORTS_DIR = "test-reports"
+# File in the test reports directory for the launch timings
+LAUNCH_TIMINGS_REPORT = "launch_timings.json"
+# File in the test reports directory for the tests which have spent longest on retries
+FLAKY_TESTS_REPORT = "flaky_tests.json"
+# Number of tests in the flaky tests report
+FLAKY_TESTS_IN_REPORT = 50
 
 
 def clean_environment():
@@ -61,6 +88,55 @@ def check_and_do_pre_ioc_launch_hook(ioc):
         raise TypeError("Pre IOC launch hook not callable, so nothing has been done for it.")
 
 
+def make_emulator_links(test_module, ioc, mode, ioc_port):
+    """
+    Makes the proxies to put between an IOC and its emulator, if the IOC entry asks for them.
+
+    The IOC connects to the first on ioc_port, each one connects to the next and the last connects
+    to the emulator. Only IOCs with a single emulator in DEVSIM mode can have links.
+
+    Args:
+        test_module: module containing IOC tests
+        ioc: the IOC entry
+        mode (TestModes): The mode to run in.
+        ioc_port: the port the IOC connects to
+
+    Returns:
+        list of links, from the emulator end to the IOC end
+        the port the emulator should listen on
+    """
+    tap = ioc.get("traffic_tap", False) or global_settings.TAP_ALL_EMULATOR_LINKS
+    conditions = ioc.get("link_conditions", False)
+    if "emulator" not in ioc or mode != TestModes.DEVSIM or not (tap or conditions):
+        return [], ioc_port
+
+    emulator_id = ioc.get("emulator_id", ioc["emulator"])
+    links = []
+    port = ioc_port
+    # The tap is nearest the IOC, so it measures the link as the IOC sees it
+    if tap:
+        target_port = get_free_ports(1)[0]
+        report_file = os.path.join(
+            TEST_REPORTS_DIR,
+            "traffic_{}_{}.json".format(test_module.__name__.replace(".", "_"), emulator_id),
+        )
+        links.append(
+            TrafficTap(
+                emulator_id,
+                target_port,
+                port,
+                report_file=report_file,
+                request_terminator=request_terminator_option(ioc),
+            )
+        )
+        port = target_port
+    if conditions:
+        target_port = get_free_ports(1)[0]
+        links.append(LinkConditioner(emulator_id, target_port, port))
+        port = target_port
+    return list(reversed(links)), port
+
+
 def make_device_launchers_from_module(test_module, mode):
     """
     Returns a list of device launchers and directories for the given test module.
@@ -69,7 +145,8 @@ def make_device_launchers_from_module(test_module, mode):
         mode (TestModes): The mode to run in.
 
     Returns:
-        list of device launchers (context managers which launch ioc + emulator pairs)
+        list of device launchers (context managers which launch ioc + emulator pairs), preceded
+            by a check that none of the IOCs are already running
         set of device directories
 
     """
@@ -96,6 +173,7 @@ def make_device_launchers_from_module(test_module, mode):
     print(f"Testing module {test_module.__name__} in {TestModes.name(mode)} mode.")
 
     device_launchers = []
+    ioc_launchers = []
     device_directories = set()
     for ioc in iocs:
         check_and_do_pre_ioc_launch_hook(ioc)
@@ -109,9 +187,11 @@ def make_device_launchers_from_module(test_module, mode):
         emmulator_port = free_port[0]
         macros["EMULATOR_PORT"] = emmulator_port
         macros["LOG_PORT"] = free_port[1]
+        links, emmulator_port = make_emulator_links(test_module, ioc, mode, emmulator_port)
 
         ioc_launcher_class = ioc.get("ioc_launcher_class", IocLauncher)
         ioc_launcher = ioc_launcher_class(test_module.__name__, ioc, mode, var_dir)
+        ioc_launchers.append(ioc_launcher)
 
         if "emulator" in ioc and mode != TestModes.RECSIM:
             emulator_launcher_class = ioc.get("emulator_launcher_class", LewisLauncher)
@@ -142,9 +222,9 @@ def make_device_launchers_from_module(test_module, mode):
         else:
             emulator_launcher = None
 
-        device_launchers.append(device_launcher(ioc_launcher, emulator_launcher))
+        device_launchers.append(device_launcher(ioc_launcher, emulator_launcher, links))
 
-    return device_launchers, device_directories
+    return [IocsNotRunningCheck(ioc_launchers), *device_launchers], device_directories
 
 
 def load_and_run_tests(
@@ -203,20 +283,28 @@ def load_and_run_tests(
                 continue
 
             clean_environment()
-            device_launchers, device_directories = make_device_launchers_from_module(
-                module.file, mode
-            )
-            tested_ioc_directories.update(device_directories)
-            test_results.append(
-                run_tests(
-                    arguments.prefix,
-                    module.name,
-                    module.tests,
-                    device_collection_launcher(device_launchers),
-                    failfast,
-                    ask_before_running_tests,
+            # The ports of the module's devices are free for the next module once it has run
+            with PortLeaseRegister.scope():
+                device_launchers, device_directories = make_device_launchers_from_module(
+                    module.file, mode
                 )
-            )
+                tested_ioc_directories.update(device_directories)
+                test_results.append(
+                    run_tests(
+                        arguments.prefix,
+                        module.name,
+                        module.tests,
+                        device_collection_launcher(device_launchers),
+                        failfast,
+                        ask_before_running_tests,
+                    )
+                )
+
+    report_launch_timings()
+    report_flaky_tests()
+
+    if arguments.archive_logs:
+        archive_run_logs()
 
     if report_coverage:
         report_test_coverage_for_devices(tested_ioc_directories)
@@ -254,6 +342,67 @@ def prompt_user_to_run_tests(test_names, device_launchers):
             sys.exit(0)  # raises SystemExit exception to call other cleanups
 
 
+def report_launch_timings(number_to_print=5):
+    """
+    Write the timings of starting and stopping every IOC and emulator in the run to the test
+    reports directory, and print the phases which took longest.
+
+    Args:
+        number_to_print: how many of the slowest phases to print
+    """
+    if not LaunchTimingRegister.Records:
+        return
+    report_file = os.path.join(TEST_REPORTS_DIR, LAUNCH_TIMINGS_REPORT)
+    LaunchTimingRegister.write_report(report_file)
+    print(f"\nLaunch timings written to {report_file}. Slowest phases:")
+    slowest = list(LaunchTimingRegister.summary()["by_phase"].items())[:number_to_print]
+    for phase, duration in slowest:
+        print(f"    {duration:8.1f}s  {phase}")
+    for record in LaunchTimingRegister.Records:
+        warning_count = record.get("boot", {}).get("warning_count")
+        if warning_count:
+            print(f"IOC {record['device']} booted with {warning_count} possible problems")
+
+
+def report_flaky_tests(number_to_print=5):
+    """
+    Write the tests which, over all recorded runs, have spent longest on failed attempts which were
+    retried to the test reports directory, and print the worst.
+
+    Args:
+        number_to_print: how many of the tests to print
+    """
+    if FlakinessRegister.Store is None:
+        return
+    flakiest = FlakinessRegister.Store.flakiest(FLAKY_TESTS_IN_REPORT)
+    if not flakiest:
+        return
+    report_file = os.path.join(TEST_REPORTS_DIR, FLAKY_TESTS_REPORT)
+    os.makedirs(TEST_REPORTS_DIR, exist_ok=True)
+    with open(report_file, "w") as f:
+        json.dump(flakiest, f, indent=2)
+    print(f"\nFlaky tests written to {report_file}. Most time spent on retries:")
+    for test in flakiest[:number_to_print]:
+        print(
+            f"    {test['retry_time']:8.1f}s  {test['test']} "
+            f"(retried in {test['runs_retried']} of {test['runs']} runs)"
+        )
+
+
+def archive_run_logs():
+    """
+    Compress and index what the IOCs and emulators logged during the run, emptying their logs.
+    """
+    log_dir = os.path.join(var_dir, LOG_FILES_DIRECTORY)
+    run_dir = archive_logs(log_dir, list(TestTimeline.Tests))
+    TestTimeline.clear()
+    if run_dir is not None:
+        print(
+            f"\nLogs archived to {run_dir}. To see what was logged during a test run:\n"
+            f"    python -m utils.log_archive query --test <test name> {os.path.dirname(run_dir)}"
+        )
+
+
 def report_test_coverage_for_devices(tested_directories):
     """
     Report the ioc directories not tested
@@ -326,6 +475,60 @@ class ReportFailLoadTestsuiteTestCase(unittest.TestCase):
         self.fail(self.msg)
 
 
+# xmlrunner has no public result class to extend. XMLTestRunner creates its resultclass in place of
+# _XMLTestResult and calls its XML reporting methods on it, so this must subclass the private class;
+# requirements.txt pins unittest-xml-reporting to major versions which have it.
+class EmulatorAwareTestResult(_XMLTestResult):
+    """
+    Test result which tells the running emulators when each test starts, e.g. so that recorded
+    device traffic can be split up by test, and records when each test starts and stops, so that
+    archived logs can be searched by test. Tests skipped in the current mode are skipped before
+    their setUp runs.
+    """
+
+    def startTest(self, test):
+        EmulatorRegister.start_test(test.id())
+        TestTimeline.start_test(test.id())
+        skip_before_setup(test)
+        self._test_started = time.monotonic()
+        self._test_outcome = "passed"
+        super().startTest(test)
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        TestTimeline.stop_test(test.id())
+        FlakinessRegister.finish_test(
+            test.id(), self._test_outcome, time.monotonic() - self._test_started
+        )
+
+    def _record_failure(self, test, outcome, err):
+        self._test_outcome = outcome
+        attempts = FlakinessRegister.attempts(test.id())
+        if len(attempts.failures) < attempts.attempts:
+            # Not already recorded by unstable_test
+            attempts.failures.append(failure_signature(err[1]))
+
+    def addFailure(self, test, err):
+        self._record_failure(test, "failed", err)
+        super().addFailure(test, err)
+
+    def addError(self, test, err):
+        self._record_failure(test, "failed", err)
+        super().addError(test, err)
+
+    def addSkip(self, test, reason):
+        self._test_outcome = "skipped"
+        super().addSkip(test, reason)
+
+    def addExpectedFailure(self, test, err):
+        self._test_outcome = "expected failure"
+        super().addExpectedFailure(test, err)
+
+    def addUnexpectedSuccess(self, test):
+        self._test_outcome = "unexpected success"
+        super().addUnexpectedSuccess(test)
+
+
 def run_tests(
     prefix,
     module_name,
@@ -355,9 +558,15 @@ def run_tests(
 
     test_names = [f"tests.{test}" for test in tests_to_run]
     runner = xmlrunner.XMLTestRunner(
-        output="test-reports", stream=sys.stdout, failfast=failfast_switch, verbosity=3
+        output=TEST_REPORTS_DIR,
+        stream=sys.stdout,
+        failfast=failfast_switch,
+        verbosity=3,
+        resultclass=EmulatorAwareTestResult,
     )
     test_suite = unittest.TestLoader().loadTestsFromNames(test_names)
+    # Checkpoints are of the devices of the last module, which have been closed
+    CheckpointRegister.clear()
 
     try:
         with modified_environment(**settings), device_launchers:
@@ -466,6 +675,31 @@ if __name__ == "__main__":
         help="""Run tests using PV Access instead of Channel Access. (Note: tests can locally
         override this).""",
     )
+    parser.add_argument(
+        "-lps",
+        "--lewis-pool-size",
+        default=0,
+        type=int,
+        help="""Number of pre-started Lewis interpreters to keep idle so that emulators start
+        quickly (default: 0, start every emulator in a new interpreter).""",
+    )
+
+    parser.add_argument(
+        "-tt",
+        "--traffic-tap",
+        action="store_true",
+        help="""Measure the traffic between every IOC and its emulator, not just those whose IOC
+        entry sets traffic_tap. Reports are written to the test-reports directory.""",
+    )
+
+    parser.add_argument(
+        "-al",
+        "--archive-logs",
+        action="store_true",
+        help="""At the end of the run compress and index the IOC and emulator logs into the
+        archive directory of the log directory and empty them, so that they do not grow from run
+        to run. Query the archive with python -m utils.log_archive.""",
+    )
 
     arguments = parser.parse_args()
 
@@ -514,6 +748,7 @@ if __name__ == "__main__":
     report_coverage = arguments.report_coverage
     ask_before_running_tests = arguments.ask_before_running
     global_settings.DEFAULT_USE_PVA = arguments.pv_access
+    global_settings.TAP_ALL_EMULATOR_LINKS = arguments.traffic_tap
     tests_mode = None
     if arguments.tests_mode == "RECSIM":
         tests_mode = TestModes.RECSIM
@@ -535,6 +770,20 @@ if __name__ == "__main__":
     # make sure we close any subprocesses we create when we exit
     cleanup_subprocs_on_process_exit()
 
+    # Lease ports from blocks no other test run on the machine is using
+    PortLeaseRegister.share(os.path.join(tempfile.gettempdir(), PORT_LEASE_DIRECTORY))
+    atexit.register(PortLeaseRegister.release_all)
+
+    # Keep the outcomes of tests from run to run, to choose retries of unstable tests
+    FlakinessRegister.open(os.path.join(var_dir, LOG_FILES_DIRECTORY, FLAKINESS_DATABASE))
+    atexit.register(FlakinessRegister.close)
+
+    if arguments.lewis_pool_size > 0:
+        # Start warming the pool for the default emulators while the first IOC boots
+        LewisInterpreterPool.configure(arguments.lewis_pool_size)
+        LewisInterpreterPool.get(DEFAULT_LEWIS_PYTHON, emulator_path, DEFAULT_LEWIS_PACKAGE)
+        atexit.register(LewisInterpreterPool.close_all)
+
     done = False
     success = False
     count = 0
@@ -6,9 +6,10 @@ from parameterized import parameterized
 from common_tests.eurotherm import (
     NONE_TXT_CALIBRATION_MAX_TEMPERATURE,
     NONE_TXT_CALIBRATION_MIN_TEMPERATURE,
+    PV_SENSORS,
     EurothermBaseTests,
 )
-from utils.calibration_utils import use_calibration_file
+from utils.calibration_utils import use_calibration_file, use_calibration_files
 from utils.emulator_launcher import LewisLauncher
 from utils.ioc_launcher import ProcServLauncher, get_default_ioc_dir
 from utils.test_modes import TestModes
@@ -113,6 +114,29 @@ class EurothermTests(EurothermBaseTests, unittest.TestCase):
             self.ca.assert_that_pv_is("A01:TEMP:RANGE:OVER.B", c006_calibration_file_max)
             self.ca.assert_that_pv_is("A01:TEMP:RANGE:UNDER.B", c006_calibration_file_min)
 
+    def test_GIVEN_many_sensors_WHEN_calibration_files_changed_together_THEN_each_sensor_changes(
+        self,
+    ) -> None:
+        c006_calibration_file_max = 330.26135292267900000000
+        calibration_files = {
+            f"{sensor}:": "C006.txt" if i % 2 == 0 else "None.txt"
+            for i, sensor in enumerate(PV_SENSORS)
+        }
+
+        self._assert_using_mock_table_location()
+        with use_calibration_files(self.ca, calibration_files):
+            for prefix, filename in calibration_files.items():
+                self.ca.assert_that_pv_is(f"{prefix}CAL:RBV", filename)
+                self.ca.assert_that_pv_is(
+                    f"{prefix}TEMP:RANGE:OVER.B",
+                    c006_calibration_file_max
+                    if filename == "C006.txt"
+                    else NONE_TXT_CALIBRATION_MAX_TEMPERATURE,
+                )
+
+        for prefix in calibration_files:
+            self.ca.assert_that_pv_is(f"{prefix}CAL:RBV", "None.txt")
+
     def test_GIVEN_sim_delay_WHEN_temp_read_from_many_sensors_THEN_all_reads_correct(self) -> None:
         self._lewis.backdoor_run_function_on_device("set_delay_time", [(200 / 1000)])
         for id in range(1, 7):
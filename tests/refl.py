@@ -7,6 +7,7 @@ from math import radians, tan
 from genie_python.channel_access_exceptions import WriteAccessException
 from parameterized import parameterized
 
+from utils.axis import AxisMotion
 from utils.channel_access import ChannelAccess
 from utils.ioc_launcher import (
     IOCRegister,
@@ -217,6 +218,7 @@ class ReflTests(unittest.TestCase):
         self.ca_galil = ChannelAccess(
             default_timeout=30, device_prefix="MOT", default_wait_time=0.0
         )
+        self.galil_motion = AxisMotion(self.ca_galil, setpoint_suffix="", motor_suffix="")
         self.ca_cs = ChannelAccess(default_timeout=30, device_prefix="CS", default_wait_time=0.0)
         self.ca_no_prefix = ChannelAccess()
         stop_motors_with_retry(self.ca_cs, 5)
@@ -375,11 +377,12 @@ class ReflTests(unittest.TestCase):
         expected = INITIAL_VELOCITY
         self.set_up_velocity_tests(expected)
 
-        self.ca.set_pv_value("PARAM:THETA:SP", 5)
+        # Both axes move for a change of theta, so wait for each to finish its move rather than
+        # just being done moving, which they are before the move starts
+        with self.galil_motion.moving(["MTR0102", "MTR0104"], timeout=10):
+            self.ca.set_pv_value("PARAM:THETA:SP", 5)
 
-        self.ca_galil.assert_that_pv_is("MTR0102.DMOV", 1, timeout=10)
         self.ca_galil.assert_that_pv_is("MTR0102.VELO", expected)
-        self.ca_galil.assert_that_pv_is("MTR0104.DMOV", 1, timeout=10)
         self.ca_galil.assert_that_pv_is("MTR0104.VELO", expected)
 
     def test_GIVEN_motor_velocity_altered_by_move_WHEN_moving_THEN_velocity_altered(self):
@@ -1,14 +1,44 @@
-from utils.channel_access import ChannelAccess
+"""
+Helpers for moving motor axes in tests.
+
+The single axis helpers work on the axes of the MOT prefix, e.g. the SANS2D tank axes. AxisMotion
+drives many axes at once: it sets all their setpoints before waiting, waits on monitors of their
+done moving fields, and records the position of each axis through the move. For example::
+
+    motion = AxisMotion(ChannelAccess(device_prefix="MOT"))
+    traces = motion.move({"FRONTDETZ": 100, "REARDETZ": 200})
+    assert_that(traces["FRONTDETZ"].max_speed(), less_than(SPEED_LIMIT))
+
+or, for axes moved by something else, e.g. the reflectometry server::
+
+    motion = AxisMotion(self.ca_galil, setpoint_suffix="", motor_suffix="")
+    with motion.moving(["MTR0102", "MTR0104"], timeout=10) as traces:
+        self.ca.set_pv_value("PARAM:THETA:SP", 5)
+"""
+
+import functools
+import time
+from types import TracebackType
+
+from utils.channel_access import ChannelAccess, _MonitorAssertion
+
+# Default time in seconds for every axis of a move to be done
+DEFAULT_MOVE_TIMEOUT = 30
+
+# Time in seconds between checks of whether a move is done
+MOVE_POLL_INTERVAL = 0.01
+
+
+@functools.cache
+def _motor_channel_access() -> ChannelAccess:
+    return ChannelAccess(device_prefix="MOT")
 
 
 def set_axis_moving(axis: str) -> None:
-    ca_motors = ChannelAccess(device_prefix="MOT")
+    ca_motors = _motor_channel_access()
     current_position = ca_motors.get_pv_value(axis)
-    low_limit = ca_motors.get_pv_value(axis + ":MTR.LLM")
-    high_limit = ca_motors.get_pv_value(axis + ":MTR.HLM")
+    low_limit, high_limit = AxisMotion(ca_motors).limits(axis)
     assert isinstance(current_position, float)
-    assert isinstance(low_limit, float)
-    assert isinstance(high_limit, float)
     if current_position - low_limit < high_limit - current_position:
         ca_motors.set_pv_value(axis + ":SP", high_limit)
     else:
@@ -16,15 +46,283 @@ def set_axis_moving(axis: str) -> None:
 
 
 def stop_axis_moving(axis: str) -> None:
-    ca_motors = ChannelAccess(device_prefix="MOT")
+    ca_motors = _motor_channel_access()
     ca_motors.set_pv_value(axis + ":MTR.STOP", 1, wait=True)
 
 
 def assert_axis_moving(axis: str, timeout: int = 1) -> None:
-    ca_motors = ChannelAccess(device_prefix="MOT")
+    ca_motors = _motor_channel_access()
     ca_motors.assert_that_pv_is(axis + ":MTR.MOVN", 1, timeout=timeout)
 
 
 def assert_axis_not_moving(axis: str, timeout: int = 1) -> None:
-    ca_motors = ChannelAccess(device_prefix="MOT")
+    ca_motors = _motor_channel_access()
     ca_motors.assert_that_pv_is(axis + ":MTR.MOVN", 0, timeout=timeout)
+
+
+class AxisTrace:
+    """
+    The positions of an axis through a move, as its readback monitor updated.
+    """
+
+    def __init__(self, axis: str) -> None:
+        """
+        Args:
+            axis: the axis
+        """
+        self.axis = axis
+        # Pairs of time.monotonic() and position
+        self.positions: list[tuple[float, float]] = []
+
+    def add_position(self, position: float) -> None:
+        self.positions.append((time.monotonic(), position))
+
+    def velocities(self) -> list[tuple[float, float]]:
+        """
+        Returns:
+            pairs of time and velocity between successive positions
+        """
+        return [
+            ((start + end) / 2, (end_position - start_position) / (end - start))
+            for (start, start_position), (end, end_position) in zip(
+                self.positions, self.positions[1:]
+            )
+            if end > start
+        ]
+
+    def max_speed(self) -> float:
+        """
+        Returns:
+            the largest speed between successive positions; 0 if the axis did not move
+        """
+        return max((abs(velocity) for _, velocity in self.velocities()), default=0.0)
+
+    def final_position(self) -> float | None:
+        """
+        Returns:
+            the last position; None if there was no update
+        """
+        return self.positions[-1][1] if self.positions else None
+
+
+class _PositionMonitor(_MonitorAssertion):
+    """
+    Monitors the readback of an axis, adding each update to its trace.
+    """
+
+    def __init__(self, channel_access: ChannelAccess, pv: str, trace: AxisTrace) -> None:
+        self.trace = trace
+        super().__init__(channel_access, pv)
+
+    def _set_val(self, value: float, alarm_severity: str, alarm_status: str) -> None:
+        if self._closed:
+            return
+        super()._set_val(value, alarm_severity, alarm_status)
+        self.trace.add_position(value)
+
+
+class AxesMove:
+    """
+    Context manager which waits on exit for several axes to be done moving, recording their
+    positions from entry. An axis is done once its done moving field has gone to 0 and back to 1
+    since entry, or, if given a target, once it is done moving within its retry deadband of the
+    target, so that an axis which did not need to move does not wait. The monitors are removed on
+    exit, so the traces only cover the move.
+    """
+
+    def __init__(
+        self,
+        motion: "AxisMotion",
+        axes: list[str],
+        targets: dict[str, float] | None = None,
+        timeout: float = DEFAULT_MOVE_TIMEOUT,
+    ) -> None:
+        """
+        Args:
+            motion: the motion helper for the axes
+            axes: the axes which move
+            targets: the positions the axes are moving to, by axis
+            timeout: the most time in seconds to wait for the axes to be done
+        """
+        self.motion = motion
+        self.axes = axes
+        self.targets = targets or {}
+        self.timeout = timeout
+        self.traces = {axis: AxisTrace(axis) for axis in axes}
+        self._done_moving: dict[str, _MonitorAssertion] = {}
+        self._positions: dict[str, _PositionMonitor] = {}
+        self._updates_before_move: dict[str, int] = {}
+        self._deadbands: dict[str, float] = {}
+
+    def __enter__(self) -> dict[str, AxisTrace]:
+        ca = self.motion.channel_access
+        try:
+            for axis in self.axes:
+                motor = self.motion.motor(axis)
+                self._done_moving[axis] = _MonitorAssertion(ca, f"{motor}.DMOV")
+                self._positions[axis] = _PositionMonitor(ca, f"{motor}.RBV", self.traces[axis])
+                if axis in self.targets:
+                    self._deadbands[axis] = float(ca.get_pv_value(f"{motor}.RDBD"))
+            for axis in self.axes:
+                # Poll so that the current values of the monitors come before the move
+                self._done_moving[axis].value  # noqa: B018
+                self._updates_before_move[axis] = len(self._done_moving[axis].all_values)
+        except BaseException:
+            self.close()
+            raise
+        return self.traces
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_val: BaseException | None,
+        exc_tb: TracebackType | None,
+    ) -> None:
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """
+        Remove the monitors of the axes, so that their traces stop changing.
+        """
+        for monitor in [*self._done_moving.values(), *self._positions.values()]:
+            monitor.close()
+
+    def is_done(self, axis: str) -> bool:
+        """
+        Args:
+            axis: the axis
+        Returns:
+            True if the axis is done moving
+        """
+        done_moving = self._done_moving[axis]
+        if done_moving.value != 1:
+            return False
+        if 0 in done_moving.all_values[self._updates_before_move[axis] :]:
+            return True
+        position = self._positions[axis].value
+        return (
+            axis in self.targets
+            and position is not None
+            and abs(position - self.targets[axis]) <= self._deadbands[axis]
+        )
+
+    def wait(self) -> None:
+        """
+        Wait for every axis to be done moving.
+
+        Raises:
+            AssertionError: if an axis is not done within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        moving = list(self.axes)
+        while moving := [axis for axis in moving if not self.is_done(axis)]:
+            if time.monotonic() >= deadline:
+                raise AssertionError(
+                    "Axes not done moving after {} seconds: {}".format(
+                        self.timeout,
+                        ", ".join(f"{axis} at {self._positions[axis].value}" for axis in moving),
+                    )
+                )
+            time.sleep(MOVE_POLL_INTERVAL)
+
+
+class AxisMotion:
+    """
+    Moves several axes of a motor IOC at once.
+    """
+
+    def __init__(
+        self,
+        channel_access: ChannelAccess | None = None,
+        setpoint_suffix: str = ":SP",
+        motor_suffix: str = ":MTR",
+    ) -> None:
+        """
+        Args:
+            channel_access: channel access for the axes; None for the MOT prefix
+            setpoint_suffix: added to an axis to give the PV its position is set with
+            motor_suffix: added to an axis to give its motor record, e.g. "" if the axes are motor
+                records such as MTR0101
+        """
+        self.channel_access = (
+            channel_access if channel_access is not None else _motor_channel_access()
+        )
+        self.setpoint_suffix = setpoint_suffix
+        self.motor_suffix = motor_suffix
+
+    def motor(self, axis: str) -> str:
+        """
+        Args:
+            axis: the axis
+        Returns:
+            the motor record of the axis
+        """
+        return f"{axis}{self.motor_suffix}"
+
+    def limits(self, axis: str) -> tuple[float, float]:
+        """
+        Args:
+            axis: the axis
+        Returns:
+            the low and high soft limits of the axis
+        """
+        motor = self.motor(axis)
+        low_limit = self.channel_access.get_pv_value(f"{motor}.LLM")
+        high_limit = self.channel_access.get_pv_value(f"{motor}.HLM")
+        assert isinstance(low_limit, float)
+        assert isinstance(high_limit, float)
+        return low_limit, high_limit
+
+    def moving(
+        self,
+        axes: list[str],
+        targets: dict[str, float] | None = None,
+        timeout: float = DEFAULT_MOVE_TIMEOUT,
+    ) -> AxesMove:
+        """
+        Wait at the end of the block for axes moved in it to be done, recording their positions.
+
+        Args:
+            axes: the axes which move
+            targets: the positions the axes are moving to, by axis, if known
+            timeout: the most time in seconds to wait for the axes to be done
+        Returns:
+            context manager giving the traces of the axes by axis
+        """
+        return AxesMove(self, axes, targets, timeout)
+
+    def move(
+        self, setpoints: dict[str, float], timeout: float = DEFAULT_MOVE_TIMEOUT
+    ) -> dict[str, AxisTrace]:
+        """
+        Set the positions of several axes, all before waiting for any, and wait for them all to be
+        done moving.
+
+        Args:
+            setpoints: the positions to move to, by axis
+            timeout: the most time in seconds to wait for the axes to be done
+        Returns:
+            the traces of the axes through the move, by axis
+        Raises:
+            AssertionError: if an axis is not done within the timeout
+        """
+        with self.moving(list(setpoints), setpoints, timeout) as traces:
+            for axis, position in setpoints.items():
+                self.channel_access.set_pv_value(
+                    f"{axis}{self.setpoint_suffix}", position, sleep_after_set=0
+                )
+        return traces
+
+    def stop(self, axes: list[str]) -> None:
+        """
+        Stop several axes.
+
+        Args:
+            axes: the axes to stop
+        """
+        for axis in axes:
+            self.channel_access.set_pv_value(f"{self.motor(axis)}.STOP", 1, sleep_after_set=0)
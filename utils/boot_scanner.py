@@ -0,0 +1,134 @@
+"""
+Scanning the output of a booting IOC for signs that it has started, failed or has problems.
+"""
+
+import re
+from collections.abc import Iterable
+from typing import Any
+
+# Output which means the IOC has failed to boot
+DEFAULT_BOOT_FAILURE_PATTERNS = (r"iocInit: Database not loaded",)
+
+# Output which means something may be wrong with the IOC, though it can still boot
+DEFAULT_BOOT_WARNING_PATTERNS = (
+    r"macLib: macro \S+ is undefined",
+    r"(?i:\berror\b)",
+    r"(?i:\bwarning\b)",
+)
+
+# Most warning lines to keep
+MAX_WARNING_LINES = 50
+
+_SUCCESS = "success"
+_FAILURE = "failure"
+_WARNING = "warning"
+
+
+class BootScanResult:
+    """
+    What a BootScanner has found in the boot output.
+    """
+
+    def __init__(self) -> None:
+        # The line showing the IOC has started; None if not seen
+        self.success_line: str | None = None
+        # The line showing the IOC has failed to boot; None if not seen
+        self.failure_line: str | None = None
+        self.warning_count = 0
+        # The first MAX_WARNING_LINES warning lines
+        self.warning_lines: list[str] = []
+
+    @property
+    def finished(self) -> bool:
+        """
+        :return: True if the boot has either succeeded or failed
+        """
+        return self.success_line is not None or self.failure_line is not None
+
+    @property
+    def succeeded(self) -> bool:
+        """
+        :return: True if the boot succeeded
+        """
+        return self.success_line is not None and self.failure_line is None
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        :return: the result as a JSON serialisable dictionary
+        """
+        return {
+            "succeeded": self.succeeded,
+            "success_line": self.success_line,
+            "failure_line": self.failure_line,
+            "warning_count": self.warning_count,
+            "warning_lines": list(self.warning_lines),
+        }
+
+
+class BootScanner:
+    """
+    Matches lines of boot output against success, failure and warning patterns, all at once with
+    a single regular expression. A failure takes precedence over success in the same line, and
+    success over a warning. Patterns can not use global flags such as (?i); use (?i:...) instead.
+    """
+
+    def __init__(
+        self,
+        success_patterns: Iterable[str],
+        failure_patterns: Iterable[str] = DEFAULT_BOOT_FAILURE_PATTERNS,
+        warning_patterns: Iterable[str] = DEFAULT_BOOT_WARNING_PATTERNS,
+    ) -> None:
+        """
+        :param success_patterns: regular expressions for output showing the IOC has started
+        :param failure_patterns: regular expressions for output showing the IOC failed to boot
+        :param warning_patterns: regular expressions for output showing possible problems
+        """
+        self._kinds: dict[str, str] = {}
+        alternatives = []
+        for kind, patterns in (
+            (_FAILURE, failure_patterns),
+            (_SUCCESS, success_patterns),
+            (_WARNING, warning_patterns),
+        ):
+            for pattern in patterns:
+                group = f"p{len(self._kinds)}"
+                self._kinds[group] = kind
+                # Every alternative starts at the start of the line, so that the first pattern in
+                # the expression to match anywhere in the line wins
+                alternatives.append(f".*?(?P<{group}>{pattern})")
+        self._pattern = re.compile("|".join(alternatives)) if alternatives else None
+
+    @classmethod
+    def for_started_text(cls, started_text: str) -> "BootScanner":
+        """
+        :param started_text: text the IOC prints once it has started
+        :return: a scanner only looking for the text
+        """
+        return cls([re.escape(started_text)], failure_patterns=(), warning_patterns=())
+
+    def scan(self, lines: Iterable[str], result: BootScanResult) -> BootScanResult:
+        """
+        Scan new lines of output, stopping at the first which finishes the boot.
+
+        :param lines: the lines
+        :param result: the result so far, which is updated
+        :return: the result
+        """
+        if self._pattern is None:
+            return result
+        for line in lines:
+            match = self._pattern.match(line)
+            if match is None:
+                continue
+            kind = self._kinds[match.lastgroup]
+            line = line.rstrip("\r\n")
+            if kind == _FAILURE:
+                result.failure_line = line
+                return result
+            if kind == _SUCCESS:
+                result.success_line = line
+                return result
+            result.warning_count += 1
+            if len(result.warning_lines) < MAX_WARNING_LINES:
+                result.warning_lines.append(line)
+        return result
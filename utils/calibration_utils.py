@@ -3,32 +3,111 @@ import typing
 from contextlib import contextmanager
 
 CAL_SEL_PV = "CAL:SEL"
+CAL_RBV_PV = "CAL:RBV"
+
+# Time in seconds for a selected calibration file to be loaded before selecting it again
+CALIBRATION_CHANGE_TIMEOUT = 3
+
+# Number of times to select a calibration file before giving up
+CALIBRATION_MAX_TRIES = 10
 
 if typing.TYPE_CHECKING:
     from utils.channel_access import ChannelAccess
 
 
-def set_calibration_file(channel_access: "ChannelAccess", filename: str, prefix: str = "") -> None:
+def _wait_until_loaded(
+    channel_access: "ChannelAccess", filename: str, prefix: str, deadline: float
+) -> bool:
     """
-    Sets a calibration file. Retries if it didn't set properly first time.
+    Wait for a selected calibration file to be loaded without alarms.
+    Args:
+        channel_access: Channel Access object.
+        filename: Calibration file name being selected.
+        prefix: Optional PV prefix in the format "PREFIX:".
+        deadline: time.monotonic() by which it must be loaded.
+    Returns:
+        True if it was loaded in time, False if not.
+    """
+    try:
+        channel_access.assert_that_pv_is(
+            f"{prefix}{CAL_RBV_PV}", filename, timeout=max(0.0, deadline - time.monotonic())
+        )
+        for pv in (CAL_SEL_PV, f"{CAL_SEL_PV}:RBV"):
+            channel_access.assert_that_pv_alarm_is(
+                f"{prefix}{pv}",
+                channel_access.Alarms.NONE,
+                timeout=max(0.0, deadline - time.monotonic()),
+            )
+    except AssertionError:
+        return False
+    return True
+
+
+def calibration_file_is_loaded(
+    channel_access: "ChannelAccess", filename: str, prefix: str = ""
+) -> bool:
+    """
+    Whether a calibration file is already selected and loaded without alarms.
     Args:
         channel_access: Channel Access object.
         filename: Calibration file name.
         prefix: Optional PV prefix in the format "PREFIX:".
+    Returns:
+        True if the calibration file is loaded, False if not.
+    """
+    return channel_access.get_pv_value(f"{prefix}{CAL_RBV_PV}") == filename and all(
+        channel_access.get_pv_value(f"{prefix}{pv}.SEVR") == channel_access.Alarms.NONE
+        for pv in (CAL_SEL_PV, f"{CAL_SEL_PV}:RBV")
+    )
+
+
+def set_calibration_files(channel_access: "ChannelAccess", filenames: dict[str, str]) -> None:
     """
-    max_retries = 10
+    Sets the calibration files of several sensors at once, e.g. A01 to A06 of a Eurotherm. Sensors
+    which already have their calibration file loaded are left alone. Every file is selected before
+    waiting for any to load, and a change is seen as soon as the readback and alarms update rather
+    than after a fixed sleep. Retries sensors whose file didn't set properly.
+    Args:
+        channel_access: Channel Access object.
+        filenames: Calibration file name by optional PV prefix in the format "PREFIX:".
+    """
+    pending = {
+        prefix: filename
+        for prefix, filename in filenames.items()
+        if not calibration_file_is_loaded(channel_access, filename, prefix)
+    }
+
+    for _ in range(CALIBRATION_MAX_TRIES):
+        if not pending:
+            return
+        for prefix, filename in pending.items():
+            channel_access.set_pv_value(f"{prefix}{CAL_SEL_PV}", filename, sleep_after_set=0)
+        deadline = time.monotonic() + CALIBRATION_CHANGE_TIMEOUT
+        pending = {
+            prefix: filename
+            for prefix, filename in pending.items()
+            if not _wait_until_loaded(channel_access, filename, prefix, deadline)
+        }
 
-    for _ in range(max_retries):
-        channel_access.set_pv_value(f"{prefix}{CAL_SEL_PV}", filename)
-        channel_access.assert_that_pv_alarm_is(f"{prefix}{CAL_SEL_PV}", channel_access.Alarms.NONE)
-        time.sleep(3)
-        channel_access.assert_that_pv_alarm_is(
-            f"{prefix}{CAL_SEL_PV}:RBV", channel_access.Alarms.NONE
+    if pending:
+        raise ValueError(
+            "Couldn't set calibration files {} after {} tries".format(
+                ", ".join(f"{prefix}'{filename}'" for prefix, filename in pending.items()),
+                CALIBRATION_MAX_TRIES,
+            )
         )
-        if channel_access.get_pv_value(f"{prefix}CAL:RBV") == filename:
-            break
-    else:
-        raise ValueError(f"Couldn't set calibration file to '{filename}' after {max_retries} tries")
+
+
+def set_calibration_file(channel_access: "ChannelAccess", filename: str, prefix: str = "") -> None:
+    """
+    Sets a calibration file, unless it is already loaded. Retries if it didn't set properly first
+    time.
+    Args:
+        channel_access: Channel Access object.
+        filename: Calibration file name.
+        prefix: Optional PV prefix in the format "PREFIX:".
+    """
+    set_calibration_files(channel_access, {prefix: filename})
 
 
 def reset_calibration_file(
@@ -37,6 +116,12 @@ def reset_calibration_file(
     set_calibration_file(channel_access, default_file, prefix)
 
 
+def reset_calibration_files(
+    channel_access: "ChannelAccess", prefixes: typing.Iterable[str], default_file: str = "None.txt"
+) -> None:
+    set_calibration_files(channel_access, dict.fromkeys(prefixes, default_file))
+
+
 @contextmanager
 def use_calibration_file(
     channel_access: "ChannelAccess", filename: str, default_file: str = "None.txt", prefix: str = ""
@@ -46,3 +131,14 @@ def use_calibration_file(
         yield
     finally:
         reset_calibration_file(channel_access, default_file, prefix)
+
+
+@contextmanager
+def use_calibration_files(
+    channel_access: "ChannelAccess", filenames: dict[str, str], default_file: str = "None.txt"
+) -> typing.Generator[None, None, None]:
+    set_calibration_files(channel_access, filenames)
+    try:
+        yield
+    finally:
+        reset_calibration_files(channel_access, filenames, default_file)
@@ -49,15 +49,31 @@ class _MonitorAssertion(_ValueSource):
         self._full_pv_name = channel_access.create_pv_with_prefix(pv)
         self.all_values = []
         self.latest_value = None
+        self._closed = False
         import global_settings
 
         self.pv_access = pv_access if pv_access is not None else global_settings.DEFAULT_USE_PVA
         if self.pv_access:
-            P4PWrapper.add_monitor(channel_access.create_pv_with_prefix(pv), self._set_val)
+            subscription = P4PWrapper.add_monitor(
+                channel_access.create_pv_with_prefix(pv), self._set_val
+            )
+            self._unsubscribe = subscription.close
         else:
-            CaChannelWrapper.add_monitor(channel_access.create_pv_with_prefix(pv), self._set_val)
+            self._unsubscribe = CaChannelWrapper.add_monitor(
+                channel_access.create_pv_with_prefix(pv), self._set_val
+            )
+
+    def close(self) -> None:
+        """
+        Remove the monitor. Updates which arrive afterwards, e.g. on the next poll, are ignored.
+        """
+        if not self._closed:
+            self._closed = True
+            self._unsubscribe()
 
     def _set_val(self, value: PVValue, alarm_severity: str, alarm_status: str) -> None:
+        if self._closed:
+            return
         self.latest_value = value
         self.all_values.append(value)
 
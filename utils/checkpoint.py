@@ -0,0 +1,290 @@
+"""
+Sharing an expensive setUp between the tests of a class, e.g. the cases of a parameterized test.
+
+Once setUp has put the IOC and emulator into a known state, a checkpoint records the PVs and
+emulator properties describing that state. Before each later test only what differs from the
+checkpoint is put back, and the checkpoint is checked to hold again, instead of running the whole
+setUp. If something differs which can not be put back, or the checkpoint does not hold after
+putting things back, the whole setUp runs and a new checkpoint is recorded, so tests still start
+from the same state. For example::
+
+    def setUp(self):
+        self._lewis, self._ioc = get_running_lewis_and_ioc("eurotherm", "EUROTHRM_01")
+        self.ca = ChannelAccess(device_prefix="EUROTHRM_01")
+        restore_checkpoint_or_set_up(self, self._reset_device_state, lambda: [
+            PvReadback(self.ca, "A01:CAL:RBV"),
+            PvSetpoint(self.ca, "A01:RAMPON:SP"),
+            PvReadback(self.ca, "A01:TEMP", tolerance=0.1, restore=self._set_temperature),
+        ])
+"""
+
+import unittest
+from abc import ABCMeta, abstractmethod
+from collections.abc import Callable, Hashable
+from time import monotonic, sleep
+from typing import Any, ClassVar
+
+from genie_python.genie import PVValue
+
+from utils.channel_access import ChannelAccess
+from utils.emulator_launcher import EmulatorLauncher
+from utils.ioc_launcher import IOCRegister
+
+# Default time in seconds for a checkpoint to hold again once the differences are put back
+DEFAULT_CHECKPOINT_TIMEOUT = 5
+
+# Time in seconds between checks of a checkpoint
+CHECKPOINT_POLL_INTERVAL = 0.1
+
+
+class CheckpointItem(metaclass=ABCMeta):
+    """
+    Part of the state of an IOC or emulator which a checkpoint records.
+    """
+
+    # Whether the item can be put back to its recorded value
+    restorable = True
+
+    def __init__(self, tolerance: float | None = None) -> None:
+        """
+        :param tolerance: how far a number may be from the recorded value; None to need it equal
+        """
+        self.tolerance = tolerance
+
+    @abstractmethod
+    def read(self) -> Any:  # noqa: ANN401
+        """
+        :return: the current value
+        """
+
+    def restore(self, value: Any) -> None:  # noqa: ANN401, B027
+        """
+        Put back the recorded value.
+
+        :param value: the recorded value
+        """
+
+    @abstractmethod
+    def describe(self) -> str:
+        """
+        :return: a description of the item for messages
+        """
+
+    def matches(self, recorded: Any, current: Any) -> bool:  # noqa: ANN401
+        """
+        :param recorded: the recorded value
+        :param current: the current value
+        :return: True if the current value is the recorded one
+        """
+        if self.tolerance is not None:
+            try:
+                return abs(float(current) - float(recorded)) <= self.tolerance
+            except (TypeError, ValueError):
+                pass
+        return current == recorded
+
+
+class PvSetpoint(CheckpointItem):
+    """
+    A PV which is put back by setting it.
+    """
+
+    def __init__(
+        self,
+        ca: ChannelAccess,
+        pv: str,
+        readback: str | None = None,
+        tolerance: float | None = None,
+    ) -> None:
+        """
+        :param ca: channel access for the IOC
+        :param pv: the PV to set
+        :param readback: the PV to read the value from; None to read the PV set
+        :param tolerance: how far a number may be from the recorded value; None to need it equal
+        """
+        super().__init__(tolerance)
+        self.ca = ca
+        self.pv = pv
+        self.readback = readback if readback is not None else pv
+
+    def read(self) -> PVValue:
+        return self.ca.get_pv_value(self.readback)
+
+    def restore(self, value: PVValue) -> None:
+        self.ca.set_pv_value(self.pv, value, sleep_after_set=0)
+
+    def describe(self) -> str:
+        return f"PV {self.readback}"
+
+
+class PvReadback(CheckpointItem):
+    """
+    A PV which can only be put back by doing something else, e.g. through the emulator backdoor, or
+    not at all.
+    """
+
+    def __init__(
+        self,
+        ca: ChannelAccess,
+        pv: str,
+        restore: Callable[[PVValue], None] | None = None,
+        tolerance: float | None = None,
+    ) -> None:
+        """
+        :param ca: channel access for the IOC
+        :param pv: the PV
+        :param restore: called with the recorded value to put it back; None if it can not be, so
+            that the whole setUp runs if the PV has changed
+        :param tolerance: how far a number may be from the recorded value; None to need it equal
+        """
+        super().__init__(tolerance)
+        self.ca = ca
+        self.pv = pv
+        self._restore = restore
+        self.restorable = restore is not None
+
+    def read(self) -> PVValue:
+        return self.ca.get_pv_value(self.pv)
+
+    def restore(self, value: PVValue) -> None:
+        if self._restore is not None:
+            self._restore(value)
+
+    def describe(self) -> str:
+        return f"PV {self.pv}"
+
+
+class EmulatorProperty(CheckpointItem):
+    """
+    A property of the emulated device, put back through the backdoor.
+    """
+
+    def __init__(
+        self, emulator: EmulatorLauncher, name: str, tolerance: float | None = None
+    ) -> None:
+        """
+        :param emulator: the emulator
+        :param name: the name of the property
+        :param tolerance: how far a number may be from the recorded value; None to need it equal
+        """
+        super().__init__(tolerance)
+        self.emulator = emulator
+        self.name = name
+
+    def read(self) -> Any:  # noqa: ANN401
+        return self.emulator.backdoor_get_value_from_device(self.name)
+
+    def restore(self, value: Any) -> None:  # noqa: ANN401
+        self.emulator.backdoor_set_on_device(self.name, value)
+
+    def describe(self) -> str:
+        return f"emulator property {self.name}"
+
+
+class StateCheckpoint:
+    """
+    The recorded values of some checkpoint items.
+    """
+
+    def __init__(self, items: list[CheckpointItem]) -> None:
+        """
+        :param items: the items, which are put back in this order
+        """
+        self.items = items
+        self.values: list[Any] = []
+
+    def record(self) -> None:
+        """
+        Record the current values of the items.
+        """
+        self.values = [item.read() for item in self.items]
+
+    def differences(self) -> list[tuple[CheckpointItem, Any]]:
+        """
+        :return: the items whose values differ from those recorded, and the recorded values
+        """
+        return [
+            (item, recorded)
+            for item, recorded in zip(self.items, self.values)
+            if not item.matches(recorded, item.read())
+        ]
+
+    def restore(self) -> bool:
+        """
+        Put back the items which differ from the checkpoint.
+
+        :return: False if an item which differs can not be put back; nothing is put back then
+        """
+        differences = self.differences()
+        if not all(item.restorable for item, _ in differences):
+            return False
+        for item, recorded in differences:
+            item.restore(recorded)
+        return True
+
+    def wait_until_held(self, timeout: float = DEFAULT_CHECKPOINT_TIMEOUT) -> None:
+        """
+        Wait for every item to have its recorded value.
+
+        :param timeout: the most time in seconds to wait
+        :raises AssertionError: if the checkpoint does not hold within the timeout
+        """
+        deadline = monotonic() + timeout
+        while differences := self.differences():
+            if monotonic() >= deadline:
+                raise AssertionError(
+                    "Checkpoint does not hold after {} seconds: {}".format(
+                        timeout, ", ".join(item.describe() for item, _ in differences)
+                    )
+                )
+            sleep(CHECKPOINT_POLL_INTERVAL)
+
+
+class CheckpointRegister:
+    """
+    The checkpoints of the test classes which share their setUp, by class, test mode and group.
+    """
+
+    Checkpoints: ClassVar[dict[Hashable, StateCheckpoint]] = {}
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Forget all the checkpoints, so that the next test of every class runs its whole setUp.
+        """
+        cls.Checkpoints.clear()
+
+
+def restore_checkpoint_or_set_up(
+    test: unittest.TestCase,
+    set_up: Callable[[], None],
+    checkpoint_items: Callable[[], list[CheckpointItem]],
+    group: Hashable = None,
+    timeout: float = DEFAULT_CHECKPOINT_TIMEOUT,
+) -> None:
+    """
+    Put back the state of the checkpoint of the test's class, or if that can not be done run the
+    whole setUp and record a new checkpoint.
+
+    :param test: the test being set up
+    :param set_up: puts the IOC and emulator into the state the tests start from
+    :param checkpoint_items: makes the items recorded in the checkpoint once set_up has run
+    :param group: tests of the class sharing a checkpoint, e.g. the cases of a parameterized test;
+        None for all the tests of the class
+    :param timeout: the most time in seconds for the checkpoint to hold once put back
+    """
+    key = (type(test), IOCRegister.test_mode, group)
+    checkpoint = CheckpointRegister.Checkpoints.pop(key, None)
+    if checkpoint is not None:
+        try:
+            if checkpoint.restore():
+                checkpoint.wait_until_held(timeout)
+                CheckpointRegister.Checkpoints[key] = checkpoint
+                return
+        except Exception as e:  # noqa: BLE001
+            print(f"Could not restore checkpoint for {test.id()}, setting up again: {e}")
+
+    set_up()
+    checkpoint = StateCheckpoint(checkpoint_items())
+    checkpoint.record()
+    CheckpointRegister.Checkpoints[key] = checkpoint
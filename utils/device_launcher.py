@@ -4,19 +4,22 @@ from contextlib import AbstractContextManager, ExitStack, contextmanager
 
 @contextmanager
 def device_launcher(
-    ioc: AbstractContextManager, lewis: AbstractContextManager | None
+    ioc: AbstractContextManager,
+    lewis: AbstractContextManager | None,
+    links: list[AbstractContextManager] | None = None,
 ) -> Generator[None, None, None]:
     """
     Context manager that launches an ioc and emulator pair
     :param ioc: the ioc launcher
     :param lewis: the lewis launcher
+    :param links: things between the ioc and emulator, e.g. a traffic tap, from the emulator end;
+        started after the emulator and before the ioc
     """
-    if lewis is not None:
-        with lewis, ioc:
-            yield
-    else:
-        with ioc:
-            yield
+    with ExitStack() as stack:
+        for launcher in (lewis, *(links or []), ioc):
+            if launcher is not None:
+                stack.enter_context(launcher)
+        yield
 
 
 @contextmanager
@@ -5,3 +5,26 @@ class UnableToConnectToEmulatorException(IOError):  # noqa: N818 (historic name)
 
     def __init__(self, emulator_name: str, err: str | BaseException) -> None:
         super().__init__(f"Unable to connect to Emnulator {emulator_name}: {err}")
+
+
+class EmulatorDiedException(IOError):  # noqa: N818 (consistent with the exception above)
+    """
+    The emulator has exited or stopped responding while tests were still using it.
+
+    This is deliberately not a subclass of UnableToConnectToEmulatorException so that assertion
+    helpers which retry on connection problems fail immediately instead.
+    """
+
+    def __init__(self, emulator_name: str, diagnostics: str) -> None:
+        super().__init__(f"Emulator {emulator_name} is no longer running: {diagnostics}")
+
+
+class EmulatorBackdoorException(IOError):  # noqa: N818 (consistent with the exceptions above)
+    """
+    A backdoor command reached the emulator but failed there, e.g. because the property does not
+    exist.
+    """
+
+    def __init__(self, emulator_name: str, err: str, code: int | None = None) -> None:
+        super().__init__(f"Backdoor command failed on emulator {emulator_name}: {err}")
+        self.code = code
@@ -5,27 +5,48 @@ Lewis emulator interface classes.
 import abc
 import contextlib
 import os
+import socket
 import subprocess
 import sys
+import threading
 from collections.abc import Callable, Generator
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from functools import partial
 from time import sleep, time
 from types import TracebackType
-from typing import Any, ClassVar, Self, TypeAlias, TypeVar
+from typing import Any, ClassVar, Self, TextIO, TypeAlias, TypeVar
 
+import numpy as np
 import psutil
 
-from utils.emulator_exceptions import UnableToConnectToEmulatorException
+from utils.emulator_exceptions import (
+    EmulatorBackdoorException,
+    EmulatorDiedException,
+    UnableToConnectToEmulatorException,
+)
+from utils.emulator_pool import LewisInterpreterPool
 from utils.formatters import format_value
-from utils.free_ports import get_free_ports
+from utils.free_ports import get_free_ports, release_ports
 from utils.ioc_launcher import EPICS_TOP, IOCRegister
-from utils.log_file import log_filename
+from utils.launch_timing import LaunchTimingRegister, PhaseTimer
+from utils.lewis_control import LewisControlConnection, parse_backdoor_value
+from utils.log_file import log_filename, tail_log_file
+from utils.process_tree import NEW_CONSOLE_CREATION_FLAGS
+from utils.stream_proxy import request_terminator_option
+from utils.stream_recording import (
+    STARTUP_TEST_ID,
+    StreamRecorder,
+    StreamRecording,
+    StreamReplayServer,
+    stream_recording_filename,
+)
 from utils.test_modes import TestModes
 
 DEVICE_EMULATOR_PATH = EPICS_TOP / "support" / "DeviceEmulator" / "master"
 DEFAULT_PY_PATH = os.path.join("C:\\", "Instrument", "Apps", "Python3")
+DEFAULT_LEWIS_PYTHON = os.path.join(DEFAULT_PY_PATH, "python.exe")
+DEFAULT_LEWIS_PACKAGE = "lewis_emulators"
 
 
 EmulatorValue: TypeAlias = int | float | str | bool
@@ -70,6 +91,105 @@ class EmulatorRegister:
         """
         del cls.RunningEmulators[name]
 
+    @classmethod
+    def start_test(cls, test_id: str) -> None:
+        """
+        Tell all running emulators a test is starting.
+
+        :param test_id: the id of the test, e.g. from TestCase.id()
+        """
+        for emulator in list(cls.RunningEmulators.values()):
+            emulator.start_test(test_id)
+
+
+class EmulatorWatchdog(threading.Thread):
+    """
+    Background thread which monitors an emulator process and, optionally, its control port.
+
+    If the process exits, or the control port stops accepting connections after having been up, the
+    exit code and the tail of the emulator log are captured and the emulator is marked as dead.
+    """
+
+    def __init__(
+        self,
+        emulator_name: str,
+        process: subprocess.Popen,
+        log_file_name: str,
+        control_port: int | None = None,
+        interval: float = 1.0,
+        max_control_port_failures: int = 3,
+    ) -> None:
+        """
+        Args:
+            emulator_name: name of the emulator, used in messages
+            process: the emulator process to monitor
+            log_file_name: the log file the emulator writes to
+            control_port: the local control port to check for liveness; None to not check it
+            interval: time between checks in seconds
+            max_control_port_failures: number of consecutive failed connections to the control port
+                before the emulator is considered dead
+        """
+        super().__init__(name=f"{emulator_name} watchdog", daemon=True)
+        self._emulator_name = emulator_name
+        self._process = process
+        self._log_file_name = log_file_name
+        self._control_port = control_port
+        self._interval = interval
+        self._max_control_port_failures = max_control_port_failures
+        self._stop_event = threading.Event()
+        self.exit_code: int | None = None
+        self.diagnostics: str | None = None
+
+    @property
+    def is_dead(self) -> bool:
+        """
+        Returns: True if the emulator has been detected as dead
+        """
+        return self.diagnostics is not None
+
+    def stop(self) -> None:
+        """
+        Stop monitoring, e.g. because the emulator is about to be closed deliberately.
+        """
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout=self._interval + 1)
+
+    def run(self) -> None:
+        control_port_seen = False
+        control_port_failures = 0
+        while not self._stop_event.wait(self._interval):
+            self.exit_code = self._process.poll()
+            if self.exit_code is not None:
+                self._mark_dead(f"process exited with code {self.exit_code}")
+                return
+
+            if self._control_port is None:
+                continue
+
+            if self._control_port_is_open():
+                control_port_seen = True
+                control_port_failures = 0
+            elif control_port_seen:
+                control_port_failures += 1
+                if control_port_failures >= self._max_control_port_failures:
+                    self._mark_dead(f"control port {self._control_port} stopped responding")
+                    return
+
+    def _control_port_is_open(self) -> bool:
+        try:
+            with socket.create_connection(("127.0.0.1", self._control_port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def _mark_dead(self, reason: str) -> None:
+        if self._stop_event.is_set():
+            return  # closed deliberately while we were checking
+        log_tail = "".join(tail_log_file(self._log_file_name))
+        self.diagnostics = f"{reason}. Last lines of {self._log_file_name}:\n{log_tail}"
+        print(f"Emulator {self._emulator_name} has died: {reason}")
+
 
 class EmulatorLauncher(metaclass=abc.ABCMeta):
     def __init__(
@@ -97,9 +217,21 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         self._options = options
         self._test_name = test_name
         self._emulator_path = emulator_path
+        # Timeout in seconds of emulator assertions made without one
+        self._default_timeout: float = options.get("default_timeout", 5)
+        # Timings of the phases of the last open and close
+        self.open_timings = PhaseTimer("open")
+        self.close_timings = PhaseTimer("close")
 
     def __enter__(self) -> Self:
-        self._open()
+        self.open_timings = PhaseTimer("open")
+        try:
+            with self.open_timings.measure_total():
+                self._open()
+        finally:
+            LaunchTimingRegister.add_record(
+                self._test_name, "emulator", self._emulator_id, self.open_timings
+            )
         EmulatorRegister.add_emulator(self._emulator_id, self)
         return self
 
@@ -109,7 +241,14 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         exc_value: BaseException | None,
         traceback: TracebackType | None,
     ) -> None:
-        self._close()
+        self.close_timings = PhaseTimer("close")
+        try:
+            with self.close_timings.measure_total():
+                self._close()
+        finally:
+            LaunchTimingRegister.add_record(
+                self._test_name, "emulator", self._emulator_id, self.close_timings
+            )
         EmulatorRegister.remove_emulator(self._emulator_id)
 
     def _get_device(self) -> str:
@@ -118,6 +257,23 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
     def _get_var_dir(self) -> str:
         return self._var_dir
 
+    def assert_alive(self) -> None:
+        """
+        Check the emulator has not died. Launchers which monitor their emulator override this.
+
+        Raises:
+            EmulatorDiedException: if the emulator is known to have died
+        """
+
+    def start_test(self, test_id: str) -> None:
+        """
+        Called when a test starts. Launchers which track tests, e.g. to record traffic per test,
+        override this.
+
+        Args:
+            test_id: the id of the test, e.g. from TestCase.id()
+        """
+
     @abc.abstractmethod
     def _close(self) -> None:
         """
@@ -219,6 +375,39 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError("This emulator launcher does not override backdoor_command.")
 
+    def backdoor_get_value_from_device(self, variable: str, as_array: bool = False) -> Any:  # noqa: ANN401
+        """
+        Gets a value from the emulator via the backdoor as a python value rather than a string.
+
+        Launchers which can only get strings from the backdoor parse them; see
+        parse_backdoor_value for the limitations of this.
+
+        Args:
+            variable: The name of the variable to get
+            as_array: True to return the value as a numpy array
+
+        Returns:
+            The value, e.g. an int, float, bool, list or None.
+        """
+        value = parse_backdoor_value(self.backdoor_get_from_device(variable))
+        return np.asarray(value) if as_array else value
+
+    def backdoor_call_on_device(
+        self, function_name: str, arguments: list[Any] | None = None
+    ) -> Any:  # noqa: ANN401
+        """
+        Runs a function on an emulator via the backdoor and returns its result as a python value.
+
+        Args:
+            function_name: name of the function to run
+            arguments: arguments to the function
+
+        Returns:
+            The value returned by the function.
+        """
+        lines = self.backdoor_run_function_on_device(function_name, arguments)
+        return parse_backdoor_value("".join(line.decode("utf-8") for line in lines))
+
     def backdoor_set_and_assert_set(
         self, variable: str, value: EmulatorValue, *args: list[Any], **kwargs: dict[str, Any]
     ) -> None:
@@ -243,7 +432,8 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         expected_value: T,
         timeout: float | None = None,
         message: str | None = None,
-        cast: Callable[[str], T] = lambda val: val,
+        cast: Callable[[Any], T] = lambda val: val,
+        typed: bool = False,
     ) -> None:
         """
         Assert that the emulator property has the expected value or that it becomes the expected
@@ -251,12 +441,14 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
 
         Args:
             emulator_property (string): emulator property to check
-            expected_value: expected value. Emulator backdoor always returns a string, so the value
-                should be a string.
+            expected_value: expected value. Unless typed is True the emulator backdoor returns a
+                string, so the value should be a string.
             timeout (float): if it hasn't changed within this time raise assertion error
             message (string): Extra message to print
             cast (callable): function which casts the returned value to an appropriate type before
                 checking equality. E.g. to cast to float pass the float class as this argument.
+            typed (bool): True to compare the python value of the property, e.g. an int or list,
+                rather than its string.
         Raises:
             AssertionError: if emulator property is not the expected value
         """
@@ -265,7 +457,11 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
             message = f"Expected emulator to have value {format_value(expected_value)}."
 
         return self.assert_that_emulator_value_causes_func_to_return_true(
-            emulator_property, lambda val: cast(val) == expected_value, timeout=timeout, msg=message
+            emulator_property,
+            lambda val: cast(val) == expected_value,
+            timeout=timeout,
+            msg=message,
+            typed=typed,
         )
 
     def assert_that_emulator_value_is_not(
@@ -274,7 +470,8 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         value: T,
         timeout: float | None = None,
         message: str | None = None,
-        cast: Callable[[str], T] = lambda val: val,
+        cast: Callable[[Any], T] = lambda val: val,
+        typed: bool = False,
     ) -> None:
         """
         Assert that the emulator property does not have the passed value and that it does not become
@@ -282,12 +479,14 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
 
         Args:
             emulator_property (string): emulator property to check
-            value: value to check against. Emulator backdoor always returns a string, so the value
-                should be a string.
+            value: value to check against. Unless typed is True the emulator backdoor returns a
+                string, so the value should be a string.
             timeout (float): if it hasn't changed within this time raise assertion error
             message (string): Extra message to print
             cast (callable): function which casts the returned value to an appropriate type before
                 checking equality. E.g. to cast to float pass the float class as this argument.
+            typed (bool): True to compare the python value of the property, e.g. an int or list,
+                rather than its string.
         Raises:
             AssertionError: if emulator property *is* the passed value
             UnableToConnectToPVException: if emulator property does not exist within timeout
@@ -297,15 +496,20 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
             message = f"Expected PV to *not* have value {format_value(value)}."
 
         return self.assert_that_emulator_value_causes_func_to_return_false(
-            emulator_property, lambda val: cast(val) == value, timeout=timeout, msg=message
+            emulator_property,
+            lambda val: cast(val) == value,
+            timeout=timeout,
+            msg=message,
+            typed=typed,
         )
 
     def assert_that_emulator_value_causes_func_to_return_true(
         self,
         emulator_property: str,
-        func: Callable[[str], bool],
+        func: Callable[[Any], bool],
         timeout: float | None = None,
         msg: str | None = None,
+        typed: bool = False,
     ) -> None:
         """
         Check that an emulator property satisfies a given function within some timeout.
@@ -316,12 +520,13 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
                 if the value is valid.
             timeout: time to wait for the emulator to satisfy the function
             msg: custom message to print on failure
+            typed: True to pass the python value of the property to func rather than its string
         Raises:
             AssertionError: If the function does not evaluate to true within the given timeout
         """
 
         def wrapper(msg: str) -> str | None:
-            value = self.backdoor_get_from_device(emulator_property)
+            value = self._backdoor_get_for_assert(emulator_property, typed)
             try:
                 return_value = func(value)
             except Exception as e:  # noqa: BLE001
@@ -358,9 +563,10 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
     def assert_that_emulator_value_causes_func_to_return_false(
         self,
         emulator_property: str,
-        func: Callable[[str], bool],
+        func: Callable[[Any], bool],
         timeout: float | None = None,
         msg: str | None = None,
+        typed: bool = False,
     ) -> None:
         """
         Check that an emulator property does not satisfy a given function within some timeout.
@@ -371,12 +577,13 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
                 if the value is valid (i.e. *not* the value we're checking).
             timeout: time to wait for the PV to satisfy the function
             msg: custom message to print on failure
+            typed: True to pass the python value of the property to func rather than its string
         Raises:
             AssertionError: If the function does not evaluate to false within the given timeout
         """
 
         def wrapper(msg: str) -> str | None:
-            value = self.backdoor_get_from_device(emulator_property)
+            value = self._backdoor_get_for_assert(emulator_property, typed)
             try:
                 return_value = func(value)
             except Exception as e:  # noqa: BLE001
@@ -409,6 +616,11 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         if err is not None:
             raise AssertionError(err)
 
+    def _backdoor_get_for_assert(self, emulator_property: str, typed: bool) -> Any:  # noqa: ANN401
+        if typed:
+            return self.backdoor_get_value_from_device(emulator_property)
+        return self.backdoor_get_from_device(emulator_property)
+
     def _wait_for_emulator_lambda(
         self, wait_for_lambda: Callable[[], T], timeout: float | None
     ) -> T:
@@ -426,7 +638,6 @@ class EmulatorLauncher(metaclass=abc.ABCMeta):
         current_time: float = start_time
 
         if timeout is None:
-            assert isinstance(self, LewisLauncher), "No default timeout for non-lewis launchers"
             timeout = self._default_timeout
 
         while current_time - start_time < timeout:
@@ -581,18 +792,24 @@ class LewisLauncher(EmulatorLauncher):
         super().__init__(test_name, device, emulator_path, var_dir, port, options)
 
         self._lewis_path: str = options.get("lewis_path", LewisLauncher._DEFAULT_LEWIS_PATH)
-        self._python_path: str = options.get(
-            "python_path", os.path.join(DEFAULT_PY_PATH, "python.exe")
-        )
+        self._python_path: str = options.get("python_path", DEFAULT_LEWIS_PYTHON)
         self._lewis_protocol: str = options.get("lewis_protocol", "stream")
         self._lewis_additional_path: str = options.get("lewis_additional_path", emulator_path)
-        self._lewis_package: str = options.get("lewis_package", "lewis_emulators")
-        self._default_timeout: float = options.get("default_timeout", 5)
+        self._lewis_package: str = options.get("lewis_package", DEFAULT_LEWIS_PACKAGE)
         self._speed: float = options.get("speed", 100)
+        self._watchdog_interval: float | None = options.get("emulator_watchdog_interval", 1.0)
+        self._use_interpreter_pool: bool = options.get("lewis_use_interpreter_pool", True)
+        self._use_control_connection: bool = options.get("lewis_control_connection", True)
 
         self._process = None
         self._logFile = None
         self._connected = None
+        self._control_port: str | None = None
+        self._watchdog: EmulatorWatchdog | None = None
+        self._control_connection: LewisControlConnection | None = None
+        # Names of the objects exposed by the lewis control server for this device
+        self._device_object = "device"
+        self._simulation_object = "simulation"
 
     @classmethod
     def from_emulator(cls, test_name: str, emulator: Emulator) -> Self:
@@ -612,11 +829,21 @@ class LewisLauncher(EmulatorLauncher):
         Closes the Lewis session by killing the process.
         """
         print(f"Terminating Lewis Emulator ({self._device})")
+        if self._watchdog is not None:
+            with self.close_timings.phase("stop watchdog"):
+                self._watchdog.stop()
+            self._watchdog = None
+        if self._control_connection is not None:
+            self._control_connection.close()
+            self._control_connection = None
         if self._process is not None:
-            self._process.terminate()
+            with self.close_timings.phase("terminate"):
+                self._process.terminate()
         if self._logFile is not None:
             self._logFile.close()
             print(f"Lewis log written to {self._log_filename()}")
+        if self._control_port is not None:
+            release_ports(int(self._control_port))
 
     def _open(self) -> None:
         """
@@ -627,46 +854,102 @@ class LewisLauncher(EmulatorLauncher):
         """
         self._logFile = open(self._log_filename(), "a")  # noqa: SIM115
         self._control_port = str(get_free_ports(1)[0])
-        lewis_command_line = [
-            self._python_path,
-            "-u",
-            "-m",
-            "lewis",
+        lewis_arguments = [
             "-r",
             f"127.0.0.1:{self._control_port}",
         ]
-        lewis_command_line.extend(
+        lewis_arguments.extend(
             [
                 "-p",
-                f"{self._lewis_protocol}: {{bind_address: 127.0.0.1, port: {self._port}}}",
+                f"{self._lewis_protocol}: {{bind_address: 127.0.0.1, port: {self._lewis_port()}}}",
             ]
         )
         if self._lewis_additional_path is not None:
-            lewis_command_line.extend(["-a", self._lewis_additional_path])
+            lewis_arguments.extend(["-a", self._lewis_additional_path])
         if self._lewis_package is not None:
-            lewis_command_line.extend(["-k", self._lewis_package])
+            lewis_arguments.extend(["-k", self._lewis_package])
 
         # Set lewis speed
-        lewis_command_line.extend(["-e", str(self._speed), self._device])
+        lewis_arguments.extend(["-e", str(self._speed), self._device])
+        lewis_command_line = [self._python_path, "-u", "-m", "lewis", *lewis_arguments]
         print(
             f"Started Lewis Emulator ({self._device}), Lewis log file is {self._log_filename()}\n"
         )
         self._logFile.write("Started Lewis with '{}'\n".format(" ".join(lewis_command_line)))
         self._logFile.flush()
         print("Started Lewis with '{}'\n".format(" ".join(lewis_command_line)))
-        self._process = subprocess.Popen(
-            lewis_command_line,
-            creationflags=subprocess.CREATE_NEW_CONSOLE,
-            stdout=self._logFile,
-            stderr=subprocess.STDOUT,
-        )
+        with self.open_timings.phase("claim pooled interpreter"):
+            self._process = self._claim_pooled_interpreter(lewis_arguments)
+        if self._process is None:
+            with self.open_timings.phase("start process"):
+                self._process = subprocess.Popen(
+                    lewis_command_line,
+                    creationflags=NEW_CONSOLE_CREATION_FLAGS,
+                    stdout=self._logFile,
+                    stderr=subprocess.STDOUT,
+                )
         self._connected = True
+        with self.open_timings.phase("start watchdog"):
+            self._start_watchdog()
+
+    def _lewis_port(self) -> int:
+        """
+        :return: the port lewis should serve the device on; the port the IOC connects to unless a
+            launcher puts something in between
+        """
+        return self._port
+
+    def _claim_pooled_interpreter(self, lewis_arguments: list[str]) -> subprocess.Popen | None:
+        """
+        Run the emulator in a pre-started interpreter from the Lewis interpreter pool, if the pool
+        is turned on and this launcher has not opted out with lewis_use_interpreter_pool.
+
+        :param lewis_arguments: the arguments lewis would be started with
+        :return: the process running lewis; None if lewis needs to be started normally
+        """
+        if not self._use_interpreter_pool:
+            return None
+        pool = LewisInterpreterPool.get(
+            self._python_path, self._lewis_additional_path, self._lewis_package
+        )
+        if pool is None:
+            return None
+        process = pool.claim(lewis_arguments, self._log_filename())
+        if process is not None:
+            print(f"Lewis Emulator ({self._device}) is running in a pre-started interpreter")
+        return process
+
+    def _start_watchdog(self) -> None:
+        """
+        Start monitoring the lewis process and control port in the background, unless disabled by
+        setting the emulator_watchdog_interval option to None or 0.
+        """
+        if not self._watchdog_interval or self._process is None:
+            return
+        self._watchdog = EmulatorWatchdog(
+            self._emulator_id,
+            self._process,
+            self._log_filename(),
+            control_port=int(self._control_port) if self._control_port is not None else None,
+            interval=self._watchdog_interval,
+        )
+        self._watchdog.start()
 
     def _log_filename(self) -> str:
         return log_filename(
             self._test_name, "lewis", self._emulator_id, TestModes.DEVSIM, self._var_dir
         )
 
+    def assert_alive(self) -> None:
+        """
+        Check the lewis emulator has not been detected as dead by its watchdog.
+
+        Raises:
+            EmulatorDiedException: if the emulator has died, with the exit code and end of its log
+        """
+        if self._watchdog is not None and self._watchdog.diagnostics is not None:
+            raise EmulatorDiedException(self._emulator_id, self._watchdog.diagnostics)
+
     def check(self) -> bool:
         """
         Check that the lewis emulator is running.
@@ -675,12 +958,13 @@ class LewisLauncher(EmulatorLauncher):
         """
         proc = self._process
         assert proc is not None
-        if proc.poll() is None:
+        if proc.poll() is None and (self._watchdog is None or not self._watchdog.is_dead):
             return True
         print("Lewis has terminated! It said:")
-        stdoutdata, stderrdata = proc.communicate()
-        sys.stderr.write(stderrdata.decode("utf-8"))
-        sys.stdout.write(stdoutdata.decode("utf-8"))
+        if self._watchdog is not None and self._watchdog.diagnostics is not None:
+            sys.stdout.write(self._watchdog.diagnostics)
+        else:
+            sys.stdout.write("".join(tail_log_file(self._log_filename())))
         return False
 
     def _convert_to_string_for_backdoor(self, value: EmulatorValue) -> str:
@@ -705,8 +989,13 @@ class LewisLauncher(EmulatorLauncher):
         :param value: new value it should have
         :return:
         """
+        connection = self._get_control_connection()
+        if connection is not None:
+            self._log_backdoor_command(f"{self._device_object} {variable} {value!r}")
+            connection.set(self._device_object, str(variable), value)
+            return
         self.backdoor_command(
-            ["device", str(variable), self._convert_to_string_for_backdoor(value)]
+            [self._device_object, str(variable), self._convert_to_string_for_backdoor(value)]
         )
 
     def backdoor_run_function_on_device(
@@ -720,9 +1009,16 @@ class LewisLauncher(EmulatorLauncher):
         :param function_name: name of the function to call
         :param arguments: an iterable of the arguments for the function; None means no arguments.
             Arguments will automatically be turned into json
-        :return:
+        :return: lines of the printed return value
         """
-        command = ["device", function_name]
+        connection = self._get_control_connection()
+        if connection is not None:
+            result = self.backdoor_call_on_device(function_name, arguments)
+            if result is None:
+                return []
+            return [line.strip().encode("utf-8") for line in str(result).splitlines()]
+
+        command = [self._device_object, function_name]
         if arguments is not None:
             command.extend(
                 [self._convert_to_string_for_backdoor(argument) for argument in arguments]
@@ -730,6 +1026,30 @@ class LewisLauncher(EmulatorLauncher):
 
         return self.backdoor_command(command)
 
+    def _log_backdoor_command(self, command: str) -> None:
+        time_stamp = datetime.fromtimestamp(time(), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        log_file = self._logFile
+        assert log_file is not None
+        log_file.write(f"{time_stamp}: lewis backdoor command: {command}\n")
+        log_file.flush()
+
+    def _get_control_connection(self) -> LewisControlConnection | None:
+        """
+        Get the direct connection to the lewis control server, creating it if needed.
+
+        :return: the connection; None if backdoor commands should go through lewis-control, because
+            pyzmq is not installed or the lewis_control_connection option is False
+        :raises EmulatorDiedException: if the emulator has died
+        """
+        self.assert_alive()
+        if not self._use_control_connection or not LewisControlConnection.is_available():
+            return None
+        if self._control_connection is None:
+            self._control_connection = LewisControlConnection(
+                self._emulator_id, "127.0.0.1", self._control_port, timeout=4
+            )
+        return self._control_connection
+
     def backdoor_command(self, command: list[str]) -> list[bytes]:
         """
         Send a command to the backdoor of lewis.
@@ -737,19 +1057,16 @@ class LewisLauncher(EmulatorLauncher):
         :param command: array of command line arguments to send
         :return: lines from the command output
         """
+        self.assert_alive()
         lewis_command_line = [
             os.path.join(self._lewis_path, "lewis-control.exe"),
             "-r",
             f"127.0.0.1:{self._control_port}",
         ]
         lewis_command_line.extend(command)
-        time_stamp = datetime.fromtimestamp(time(), tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        self._log_backdoor_command(" ".join(lewis_command_line))
         log_file = self._logFile
         assert log_file is not None
-        log_file.write(
-            "{}: lewis backdoor command: {}\n".format(time_stamp, " ".join(lewis_command_line))
-        )
-        log_file.flush()
         try:
             p = subprocess.Popen(
                 lewis_command_line, stderr=subprocess.STDOUT, stdout=subprocess.PIPE
@@ -790,7 +1107,7 @@ class LewisLauncher(EmulatorLauncher):
         :return:
         """
         if self._connected:
-            self.backdoor_command(["simulation", "disconnect_device"])
+            self.backdoor_command([self._simulation_object, "disconnect_device"])
         self._connected = False
 
     def backdoor_emulator_connect_device(self, *args: list[Any], **kwargs: dict[str, Any]) -> None:
@@ -800,7 +1117,7 @@ class LewisLauncher(EmulatorLauncher):
         :return:
         """
         if not self._connected:
-            self.backdoor_command(["simulation", "connect_device"])
+            self.backdoor_command([self._simulation_object, "connect_device"])
         self._connected = True
 
     def backdoor_get_from_device(
@@ -811,8 +1128,51 @@ class LewisLauncher(EmulatorLauncher):
         :param variable: name of the variable
         :return: the variables value
         """
+        connection = self._get_control_connection()
+        if connection is not None:
+            self._log_backdoor_command(f"{self._device_object} {variable}")
+            value = connection.get(self._device_object, str(variable))
+            # lewis-control prints nothing for None
+            return "" if value is None else str(value)
+
         # backdoor_command returns a list of bytes and join takes str so convert them here
-        return "".join(i.decode("utf-8") for i in self.backdoor_command(["device", str(variable)]))
+        return "".join(
+            i.decode("utf-8") for i in self.backdoor_command([self._device_object, str(variable)])
+        )
+
+    def backdoor_get_value_from_device(self, variable: str, as_array: bool = False) -> Any:  # noqa: ANN401
+        """
+        Return a value on a device from lewis as a python value, e.g. an int, float, bool or list.
+
+        :param variable: name of the variable
+        :param as_array: True to return the value as a numpy array
+        :return: the variables value
+        """
+        connection = self._get_control_connection()
+        if connection is None:
+            return super().backdoor_get_value_from_device(variable, as_array)
+        self._log_backdoor_command(f"{self._device_object} {variable}")
+        value = connection.get(self._device_object, str(variable))
+        return np.asarray(value) if as_array else value
+
+    def backdoor_call_on_device(
+        self, function_name: str, arguments: list[Any] | None = None
+    ) -> Any:  # noqa: ANN401
+        """
+        Run a function on a device in lewis and return its result as a python value.
+
+        :param function_name: name of the function to call
+        :param arguments: the arguments for the function; None means no arguments
+        :return: the value returned by the function
+        """
+        connection = self._get_control_connection()
+        if connection is None:
+            return super().backdoor_call_on_device(function_name, arguments)
+        arguments = [] if arguments is None else list(arguments)
+        self._log_backdoor_command(
+            "{} {} {}".format(self._device_object, function_name, " ".join(map(repr, arguments)))
+        )
+        return connection.call(self._device_object, function_name, *arguments)
 
 
 class MultiLewisLauncher:
@@ -820,15 +1180,28 @@ class MultiLewisLauncher:
     Launch multiple lewis emulators.
     """
 
+    # The launcher used for each of the emulators
+    launcher_class: ClassVar[type[LewisLauncher]] = LewisLauncher
+
     def __init__(self, test_name: str, emulators: list[Emulator]) -> None:
         self.test_name: str = test_name
         self.emulator_launchers: dict[int, LewisLauncher] = {
-            emulator.launcher_address: LewisLauncher.from_emulator(test_name, emulator)
+            emulator.launcher_address: self.launcher_class.from_emulator(test_name, emulator)
             for emulator in emulators
         }
+        # Timings of the phases of the last open and close
+        self.open_timings = PhaseTimer("open")
+        self.close_timings = PhaseTimer("close")
 
     def __enter__(self) -> Self:
-        self._open()
+        self.open_timings = PhaseTimer("open")
+        try:
+            with self.open_timings.measure_total():
+                self._open()
+        finally:
+            LaunchTimingRegister.add_record(
+                self.test_name, "emulators", self.test_name, self.open_timings
+            )
         EmulatorRegister.add_emulator(self.test_name, self)
         return self
 
@@ -838,22 +1211,51 @@ class MultiLewisLauncher:
         exc_value: BaseException | None,
         traceback: TracebackType | None,
     ) -> None:
-        self._close()
+        self.close_timings = PhaseTimer("close")
+        try:
+            with self.close_timings.measure_total():
+                self._close()
+        finally:
+            LaunchTimingRegister.add_record(
+                self.test_name, "emulators", self.test_name, self.close_timings
+            )
         EmulatorRegister.remove_emulator(self.test_name)
 
     def _close(self) -> None:
         """
         Stop the lewis emulators.
         """
-        for launcher in self.emulator_launchers.values():
-            launcher._close()
+        for address, launcher in self.emulator_launchers.items():
+            with self.close_timings.phase(f"close {address}"):
+                launcher._close()
 
     def _open(self) -> None:
         """
         Start the lewis emulators.
         """
+        for address, launcher in self.emulator_launchers.items():
+            with self.open_timings.phase(f"open {address}"):
+                launcher._open()
+
+    def assert_alive(self) -> None:
+        """
+        Check none of the lewis emulators have died.
+
+        Raises:
+            EmulatorDiedException: if any of the emulators has died
+        """
+        for launcher in self.emulator_launchers.values():
+            launcher.assert_alive()
+
+    def start_test(self, test_id: str) -> None:
+        """
+        Tell all the lewis emulators a test is starting.
+
+        Args:
+            test_id: the id of the test, e.g. from TestCase.id()
+        """
         for launcher in self.emulator_launchers.values():
-            launcher._open()
+            launcher.start_test(test_id)
 
     def backdoor_get_from_device(
         self, launcher_address: int, variable: str, *args: list[Any], **kwargs: dict[str, Any]
@@ -868,6 +1270,21 @@ class MultiLewisLauncher:
         """
         return self.emulator_launchers[launcher_address].backdoor_get_from_device(variable)
 
+    def backdoor_get_value_from_device(
+        self, launcher_address: int, variable: str, as_array: bool = False
+    ) -> Any:  # noqa: ANN401
+        """
+        Get the variable value as a python value from the emulator with the given launcher address.
+
+        :param launcher_address: The identifier of the device we want to get the value from.
+        :param variable: The variable to obtain the value of from the device.
+        :param as_array: True to return the value as a numpy array.
+        :return: The variable's value.
+        """
+        return self.emulator_launchers[launcher_address].backdoor_get_value_from_device(
+            variable, as_array
+        )
+
     def backdoor_set_on_device(
         self,
         launcher_address: int,
@@ -915,6 +1332,396 @@ class MultiLewisLauncher:
             function_name, arguments
         )
 
+    def backdoor_call_on_device(
+        self, launcher_address: int, function_name: str, arguments: list[Any] | None = None
+    ) -> Any:  # noqa: ANN401
+        """
+        Run a function on the emulator addressed by the launcher address and return its result.
+
+        :param launcher_address: The identifier of the device we want to run the function on.
+        :param function_name: The name of the function to run on the device.
+        :param arguments: The arguments to pass to the function.
+        :return: The value returned by the function.
+        """
+        return self.emulator_launchers[launcher_address].backdoor_call_on_device(
+            function_name, arguments
+        )
+
+
+class HostedLewisLauncher(LewisLauncher):
+    """
+    A lewis emulated device which runs inside a process shared with other devices, started by
+    SharedProcessMultiLewisLauncher. Backdoor commands go through the shared control server to the
+    objects for this device's launcher address.
+    """
+
+    def __init__(
+        self,
+        test_name: str,
+        device: str,
+        emulator_path: str,
+        var_dir: str,
+        port: int,
+        options: dict[str, Any],
+    ) -> None:
+        super().__init__(test_name, device, emulator_path, var_dir, port, options)
+        self._host_log_filename: str | None = None
+
+    @classmethod
+    def from_emulator(cls, test_name: str, emulator: Emulator) -> Self:
+        """
+        Create the launcher for a device hosted in a shared process.
+
+        Args:
+            test_name: name of test we are creating device emulator for
+            emulator: Information to launch the emulator with
+        """
+        launcher = super().from_emulator(test_name, emulator)
+        launcher._device_object = f"device_{emulator.launcher_address}"
+        launcher._simulation_object = f"simulation_{emulator.launcher_address}"
+        return launcher
+
+    def attach_to_host(
+        self,
+        process: subprocess.Popen,
+        control_port: str,
+        log_file: TextIO,
+        log_file_name: str,
+        watchdog: EmulatorWatchdog | None,
+    ) -> None:
+        """
+        Use the shared lewis process for this device.
+
+        Args:
+            process: the shared lewis process
+            control_port: the port of the shared control server
+            log_file: the open log file of the shared process
+            log_file_name: the name of the shared log file
+            watchdog: the watchdog monitoring the shared process, if any
+        """
+        self._process = process
+        self._control_port = control_port
+        self._logFile = log_file
+        self._host_log_filename = log_file_name
+        self._watchdog = watchdog
+        self._connected = True
+
+    def _log_filename(self) -> str:
+        if self._host_log_filename is not None:
+            return self._host_log_filename
+        return super()._log_filename()
+
+    def _open(self) -> None:
+        """
+        The shared process is started by SharedProcessMultiLewisLauncher.
+        """
+
+    def _close(self) -> None:
+        """
+        The shared process is stopped by SharedProcessMultiLewisLauncher.
+        """
+        if self._control_connection is not None:
+            self._control_connection.close()
+            self._control_connection = None
+
+
+class SharedProcessMultiLewisLauncher(MultiLewisLauncher):
+    """
+    Launch multiple lewis emulated devices in a single lewis process.
+
+    Each device listens on its own port and is addressed by its launcher address through one
+    control server, so the number of processes, the memory used and the start up time do not grow
+    with the number of devices. Use it by setting `emulators_launcher_class` to this class in the
+    IOC entry. The protocol, speed, python, path and package options are shared by all the devices.
+    """
+
+    launcher_class: ClassVar[type[LewisLauncher]] = HostedLewisLauncher
+
+    HOST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lewis_multi_host.py")
+
+    def __init__(self, test_name: str, emulators: list[Emulator]) -> None:
+        super().__init__(test_name, emulators)
+        if not self.emulator_launchers:
+            raise ValueError("Need at least one emulator to launch")
+        self._process: subprocess.Popen | None = None
+        self._log_file: TextIO | None = None
+        self._watchdog: EmulatorWatchdog | None = None
+
+    def _open(self) -> None:
+        """
+        Start the lewis process hosting all the devices.
+        """
+        launchers = self.emulator_launchers
+        # All the emulators are created from the same IOC entry so share their lewis options
+        first = next(iter(launchers.values()))
+        log_file_name = log_filename(
+            self.test_name, "lewis", "shared_host", TestModes.DEVSIM, first._var_dir
+        )
+        self._log_file = open(log_file_name, "a")  # noqa: SIM115
+        control_port = str(get_free_ports(1)[0])
+
+        command_line = [
+            first._python_path,
+            "-u",
+            self.HOST_SCRIPT,
+            "-r",
+            f"127.0.0.1:{control_port}",
+            "-p",
+            first._lewis_protocol,
+            "-e",
+            str(first._speed),
+        ]
+        if first._lewis_additional_path:
+            command_line.extend(["-a", first._lewis_additional_path])
+        if first._lewis_package is not None:
+            command_line.extend(["-k", first._lewis_package])
+        for address, launcher in launchers.items():
+            command_line.extend(["-d", str(address), launcher._device, str(launcher._port)])
+
+        print(
+            f"Started {len(launchers)} Lewis Emulators in one process, "
+            f"Lewis log file is {log_file_name}\n"
+        )
+        self._log_file.write("Started Lewis host with '{}'\n".format(" ".join(command_line)))
+        self._log_file.flush()
+        with self.open_timings.phase("start process"):
+            self._process = subprocess.Popen(
+                command_line,
+                creationflags=NEW_CONSOLE_CREATION_FLAGS,
+                stdout=self._log_file,
+                stderr=subprocess.STDOUT,
+            )
+
+        if first._watchdog_interval:
+            self._watchdog = EmulatorWatchdog(
+                f"{self.test_name} shared lewis host",
+                self._process,
+                log_file_name,
+                control_port=int(control_port),
+                interval=first._watchdog_interval,
+            )
+            self._watchdog.start()
+
+        for launcher in launchers.values():
+            assert isinstance(launcher, HostedLewisLauncher)
+            launcher.attach_to_host(
+                self._process, control_port, self._log_file, log_file_name, self._watchdog
+            )
+
+    def _close(self) -> None:
+        """
+        Stop the lewis process hosting all the devices.
+        """
+        print(f"Terminating shared Lewis Emulator process ({self.test_name})")
+        # Close the control connections of the hosted devices
+        super()._close()
+        if self._watchdog is not None:
+            with self.close_timings.phase("stop watchdog"):
+                self._watchdog.stop()
+            self._watchdog = None
+        if self._process is not None:
+            with self.close_timings.phase("terminate"):
+                self._process.terminate()
+        if self._log_file is not None:
+            self._log_file.close()
+
+
+class RecordingLewisLauncher(LewisLauncher):
+    """
+    Launches Lewis with a StreamRecorder between the IOC and the emulator. The traffic and the
+    values read through the backdoor are recorded for each test, so that the module can later be
+    run against a ReplayEmulatorLauncher instead of Lewis.
+
+    The recording is written when the emulator is closed, to the stream_recording_file option or
+    by default to a file next to the lewis log.
+    """
+
+    def __init__(
+        self,
+        test_name: str,
+        device: str,
+        emulator_path: str,
+        var_dir: str,
+        port: int,
+        options: dict[str, Any],
+    ) -> None:
+        super().__init__(test_name, device, emulator_path, var_dir, port, options)
+        self._recording_file: str = options.get(
+            "stream_recording_file"
+        ) or stream_recording_filename(test_name, self._emulator_id, var_dir)
+        self._request_terminator = request_terminator_option(options)
+        self._recorder: StreamRecorder | None = None
+        self._device_port: int | None = None
+        self._reading_typed_value = False
+
+    def _lewis_port(self) -> int:
+        assert self._device_port is not None
+        return self._device_port
+
+    def _open(self) -> None:
+        self._device_port = get_free_ports(1)[0]
+        self._recorder = StreamRecorder(
+            f"{self._emulator_id} recorder",
+            self._device_port,
+            self._port,
+            device=self._device,
+            request_terminator=self._request_terminator,
+        )
+        self._recorder.start()
+        super()._open()
+
+    def _close(self) -> None:
+        super()._close()
+        if self._device_port is not None:
+            release_ports(self._device_port)
+        if self._recorder is not None:
+            self._recorder.stop()
+            self._recorder.recording.save(self._recording_file)
+            print(f"Stream recording written to {self._recording_file}")
+            self._recorder = None
+
+    def start_test(self, test_id: str) -> None:
+        if self._recorder is not None:
+            self._recorder.start_test(test_id)
+
+    def _record_backdoor_value(self, variable: str, value: Any, typed: bool) -> None:  # noqa: ANN401
+        if self._recorder is not None:
+            if hasattr(value, "tolist"):
+                value = value.tolist()
+            self._recorder.recording.add_backdoor_value(
+                self._recorder.test_id, variable, value, typed
+            )
+
+    def backdoor_get_from_device(
+        self, variable: str, *args: list[Any], **kwargs: dict[str, Any]
+    ) -> str:
+        value = super().backdoor_get_from_device(variable)
+        if not self._reading_typed_value:
+            self._record_backdoor_value(variable, value, typed=False)
+        return value
+
+    def backdoor_get_value_from_device(self, variable: str, as_array: bool = False) -> Any:  # noqa: ANN401
+        self._reading_typed_value = True
+        try:
+            value = super().backdoor_get_value_from_device(variable, as_array)
+        finally:
+            self._reading_typed_value = False
+        self._record_backdoor_value(variable, value, typed=True)
+        return value
+
+
+class ReplayEmulatorLauncher(EmulatorLauncher):
+    """
+    Answers the IOC from a recording made with RecordingLewisLauncher instead of running an
+    emulator, so that tests run without the cost of the emulator and with the device timing fixed.
+
+    Backdoor reads return the values recorded for the running test, in the order they were read.
+    Backdoor writes and function calls do nothing, because their effect on the device is already
+    part of the recording.
+
+    Options:
+        stream_recording_file: the recording to use; defaults to where RecordingLewisLauncher writes
+        stream_replay_delays: True (default) to reply as slowly as the device did, False to reply
+            immediately
+    """
+
+    def __init__(
+        self,
+        test_name: str,
+        device: str,
+        emulator_path: str,
+        var_dir: str,
+        port: int,
+        options: dict[str, Any],
+    ) -> None:
+        super().__init__(test_name, device, emulator_path, var_dir, port, options)
+        self._recording_file: str = options.get(
+            "stream_recording_file"
+        ) or stream_recording_filename(test_name, self._emulator_id, var_dir)
+        self._use_recorded_delays: bool = options.get("stream_replay_delays", True)
+        self._server: StreamReplayServer | None = None
+        self._test_id = STARTUP_TEST_ID
+        self._backdoor_positions: dict[tuple[str, bool], int] = {}
+
+    def _open(self) -> None:
+        recording = StreamRecording.load(self._recording_file)
+        self._server = StreamReplayServer(
+            f"{self._emulator_id} replay",
+            recording,
+            self._port,
+            use_recorded_delays=self._use_recorded_delays,
+        )
+        self._server.start()
+        print(f"Replaying ({self._device}) from {self._recording_file}")
+
+    def _close(self) -> None:
+        if self._server is None:
+            return
+        self._server.stop()
+        unmatched = self._server.unmatched_requests
+        if unmatched:
+            print(
+                f"Replay of ({self._device}) had {len(unmatched)} requests which were not in the "
+                f"recording, e.g. {unmatched[0]!r}"
+            )
+        self._server = None
+
+    def start_test(self, test_id: str) -> None:
+        self._test_id = test_id
+        self._backdoor_positions = {}
+        if self._server is not None:
+            self._server.start_test(test_id)
+
+    def _next_backdoor_value(self, variable: str, typed: bool) -> Any:  # noqa: ANN401
+        assert self._server is not None
+        recording = self._server.recording
+        values = recording.backdoor_values(self._test_id, variable, typed)
+        if not values:
+            # Not read in this test, so use the last value read anywhere in the recording
+            for test_id in reversed(recording.test_ids):
+                values = recording.backdoor_values(test_id, variable, typed)[-1:]
+                if values:
+                    break
+        if not values:
+            raise EmulatorBackdoorException(
+                self._emulator_id, f"no value of {variable} in {self._recording_file}"
+            )
+        position = self._backdoor_positions.get((variable, typed), 0)
+        self._backdoor_positions[(variable, typed)] = position + 1
+        return values[min(position, len(values) - 1)]
+
+    def backdoor_get_from_device(
+        self, variable: str, *args: list[Any], **kwargs: dict[str, Any]
+    ) -> str:
+        return self._next_backdoor_value(variable, typed=False)
+
+    def backdoor_get_value_from_device(self, variable: str, as_array: bool = False) -> Any:  # noqa: ANN401
+        try:
+            value = self._next_backdoor_value(variable, typed=True)
+        except EmulatorBackdoorException:
+            return super().backdoor_get_value_from_device(variable, as_array)
+        return np.asarray(value) if as_array else value
+
+    def backdoor_set_on_device(
+        self, variable: str, value: EmulatorValue, *args: list[Any], **kwargs: dict[str, Any]
+    ) -> None:
+        pass
+
+    def backdoor_emulator_disconnect_device(
+        self, *args: list[Any], **kwargs: dict[str, Any]
+    ) -> None:
+        assert self._server is not None
+        self._server.set_connected(False)
+
+    def backdoor_emulator_connect_device(self, *args: list[Any], **kwargs: dict[str, Any]) -> None:
+        assert self._server is not None
+        self._server.set_connected(True)
+
+    def backdoor_run_function_on_device(
+        self, function_name: str, arguments: list[Any] | None = None
+    ) -> list[bytes]:
+        return []
+
 
 class CommandLineEmulatorLauncher(EmulatorLauncher):
     def __init__(
@@ -956,7 +1763,8 @@ class CommandLineEmulatorLauncher(EmulatorLauncher):
             ),
             "a",
         )
-        self._call_command_line(self.command_line.format(port=self._port))
+        with self.open_timings.phase("run command line"):
+            self._call_command_line(self.command_line.format(port=self._port))
 
     def _call_command_line(self, command_line: str | list[str]) -> None:
         if self._cwd_emulator_path:
@@ -966,7 +1774,7 @@ class CommandLineEmulatorLauncher(EmulatorLauncher):
         self._process = psutil.Popen(
             command_line,
             cwd=cwd,
-            creationflags=subprocess.CREATE_NEW_CONSOLE,
+            creationflags=NEW_CONSOLE_CREATION_FLAGS,
             stdout=self._log_file,
             stderr=subprocess.STDOUT,
         )
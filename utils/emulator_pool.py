@@ -0,0 +1,227 @@
+"""
+A pool of pre-started Lewis interpreters.
+
+Starting Lewis normally means starting a python interpreter and importing Lewis and the whole
+emulator package before the device is created, which takes seconds. A pool keeps a number of
+interpreters which have already done this idle so that a launcher can claim one and just tell it
+which device to run. Claimed interpreters run the emulator until the launcher closes it and are then
+discarded, so each emulator still gets a fresh process; the pool starts a replacement whenever one
+is claimed.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from typing import ClassVar
+
+from utils.lewis_pool_worker import READY_MESSAGE
+from utils.process_tree import NEW_CONSOLE_CREATION_FLAGS
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lewis_pool_worker.py")
+
+# Time to wait for a worker which has been started but has not finished importing
+MAX_TIME_TO_WAIT_FOR_WORKER = 30
+
+
+class _PoolWorker:
+    """
+    A single pre-started interpreter waiting to be told which emulator to run.
+    """
+
+    def __init__(self, command_line: list[str]) -> None:
+        self.process = subprocess.Popen(
+            command_line,
+            creationflags=NEW_CONSOLE_CREATION_FLAGS,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        self.ready = threading.Event()
+        self.startup_output: list[str] = []
+        threading.Thread(target=self._wait_for_ready, daemon=True).start()
+
+    def _wait_for_ready(self) -> None:
+        stdout = self.process.stdout
+        assert stdout is not None
+        for line in stdout:
+            decoded_line = line.decode("utf-8", errors="replace")
+            if READY_MESSAGE in decoded_line:
+                self.ready.set()
+                return
+            self.startup_output.append(decoded_line)
+
+    def is_usable(self) -> bool:
+        """
+        Returns: True if the worker is still running and not yet claimed
+        """
+        return self.process.poll() is None
+
+    def run_emulator(self, arguments: list[str], log_file_name: str) -> None:
+        """
+        Tell the worker to run lewis with the given arguments, logging to the given file.
+
+        Args:
+            arguments: arguments as they would be passed to `python -m lewis`
+            log_file_name: the file the worker should send its output to
+        """
+        stdin = self.process.stdin
+        assert stdin is not None
+        request = json.dumps({"arguments": arguments, "log_file": log_file_name})
+        stdin.write(f"{request}\n".encode("utf-8"))
+        stdin.flush()
+        stdin.close()
+        stdout = self.process.stdout
+        assert stdout is not None
+        stdout.close()
+
+    def discard(self) -> None:
+        """
+        Stop the worker.
+        """
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            if pipe is not None:
+                pipe.close()
+
+
+class LewisInterpreterPool:
+    """
+    A pool of idle Lewis interpreters for one combination of python, emulator path and package.
+
+    The pool is off by default; call configure with a size greater than zero to turn it on.
+    """
+
+    size: ClassVar[int] = 0
+
+    # Static dictionary of pools keyed on (python path, additional path, package)
+    Pools: ClassVar[dict[tuple[str, str | None, str | None], "LewisInterpreterPool"]] = {}
+
+    def __init__(
+        self,
+        python_path: str,
+        additional_path: str | None,
+        package: str | None,
+        size: int,
+        worker_script: str = WORKER_SCRIPT,
+    ) -> None:
+        """
+        Args:
+            python_path: the python interpreter to run Lewis with
+            additional_path: path to add to sys.path to find the emulator package; None for none
+            package: the emulator package to import; None for the Lewis default
+            size: number of idle interpreters to keep
+            worker_script: the script each worker runs
+        """
+        self._command_line = [python_path, "-u", worker_script]
+        if additional_path is not None:
+            self._command_line.extend(["-a", additional_path])
+        if package is not None:
+            self._command_line.extend(["-k", package])
+        self._size = size
+        self._idle: list[_PoolWorker] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, size: int) -> None:
+        """
+        Set the number of idle interpreters each pool should keep.
+
+        Args:
+            size: the pool size; 0 turns the pool off
+        """
+        cls.size = size
+
+    @classmethod
+    def get(
+        cls, python_path: str, additional_path: str | None, package: str | None
+    ) -> "LewisInterpreterPool | None":
+        """
+        Get the pool for the given interpreter and package, starting it if needed.
+
+        Returns:
+            the pool; None if pooling is turned off
+        """
+        if cls.size <= 0:
+            return None
+        key = (python_path, additional_path, package)
+        pool = cls.Pools.get(key)
+        if pool is None:
+            pool = cls(python_path, additional_path, package, cls.size)
+            cls.Pools[key] = pool
+            pool.fill()
+        return pool
+
+    @classmethod
+    def close_all(cls) -> None:
+        """
+        Stop all idle interpreters in all pools.
+        """
+        for pool in cls.Pools.values():
+            pool.close()
+        cls.Pools.clear()
+
+    def fill(self) -> None:
+        """
+        Start workers until the pool has its full number of idle interpreters. This does not wait
+        for them to finish importing.
+        """
+        with self._lock:
+            for worker in [worker for worker in self._idle if not worker.is_usable()]:
+                print(
+                    "Discarding Lewis pool worker which exited during start up: {}".format(
+                        "".join(worker.startup_output)
+                    )
+                )
+                worker.discard()
+                self._idle.remove(worker)
+            while len(self._idle) < self._size:
+                self._idle.append(_PoolWorker(self._command_line))
+
+    def claim(
+        self,
+        arguments: list[str],
+        log_file_name: str,
+        timeout: float = MAX_TIME_TO_WAIT_FOR_WORKER,
+    ) -> subprocess.Popen | None:
+        """
+        Claim an idle interpreter and start an emulator in it.
+
+        Args:
+            arguments: arguments as they would be passed to `python -m lewis`
+            log_file_name: the file the emulator should log to
+            timeout: how long to wait for a worker which is still importing
+
+        Returns:
+            the process now running the emulator; None if no worker could be used, in which case
+            the caller should start Lewis itself
+        """
+        with self._lock:
+            usable_workers = [worker for worker in self._idle if worker.is_usable()]
+            usable_workers.sort(key=lambda worker: not worker.ready.is_set())
+            worker = usable_workers[0] if usable_workers else None
+            if worker is not None:
+                self._idle.remove(worker)
+
+        self.fill()
+
+        if worker is None:
+            return None
+        if not worker.ready.wait(timeout):
+            print(f"Lewis pool worker was not ready after {timeout} seconds, discarding it")
+            worker.discard()
+            return None
+
+        worker.run_emulator(arguments, log_file_name)
+        return worker.process
+
+    def close(self) -> None:
+        """
+        Stop all idle interpreters in this pool.
+        """
+        with self._lock:
+            for worker in self._idle:
+                worker.discard()
+            self._idle.clear()
@@ -0,0 +1,256 @@
+"""
+A record across runs of how each test went, used to decide how many times an unstable_test may be
+retried and to report which tests waste the most time on retries.
+
+The test result of run_tests records every test in a local SQLite database: whether it passed, how
+many attempts it took, how long it took and how long was spent on failed attempts, and signatures
+of its failures. A failure signature is the exception type and first line of its message with the
+numbers taken out, so that the same failure with different values has the same signature.
+
+When an unstable_test fails, its retries are chosen from its history:
+
+* with too little history it is retried up to max_retries times, as before
+* a failure which has failed every attempt of the test in several recent runs, and has never been
+  followed by a pass, is not retried, as it is more likely a real regression than a flake
+* a failure not seen before is retried once, so that a new flake can be told from a regression
+* otherwise it is retried just enough times for a flake with the test's observed rate of failing
+  attempts to be unlikely to fail every attempt, at least once and up to max_retries
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+from time import time
+from typing import Any, ClassVar
+
+# File the outcomes of tests are kept in
+FLAKINESS_DATABASE = "test_flakiness.sqlite3"
+
+# Number of most recent runs of a test its retries are chosen from
+HISTORY_RUNS = 50
+
+# Runs of a test needed before its retries are chosen from its history
+MIN_RUNS_FOR_ADAPTIVE_RETRIES = 5
+
+# Recent runs in which a failure must have failed every attempt before it is not retried
+REGRESSION_RUNS = 2
+
+# Chance of a flaky test failing every attempt which the retries are chosen to stay below
+TARGET_FLAKY_FAILURE_PROBABILITY = 0.001
+
+# Most characters of a failure message kept in its signature
+_SIGNATURE_MESSAGE_LENGTH = 200
+
+_NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?")
+
+
+def failure_signature(error: BaseException) -> str:
+    """
+    :param error: what a test failed with
+    :return: the signature of the failure: the exception type and first line of the message, with
+        numbers replaced by #
+    """
+    lines = str(error).strip().splitlines()
+    message = _NUMBER.sub("#", lines[0] if lines else "")[:_SIGNATURE_MESSAGE_LENGTH]
+    return f"{type(error).__name__}: {message}"
+
+
+class TestAttempts:
+    """
+    The attempts at running a test in this run.
+    """
+
+    def __init__(self) -> None:
+        self.attempts = 1
+        # Time in seconds spent on attempts which failed and were retried, and between them
+        self.retry_time = 0.0
+        # Signatures of the failures, in order
+        self.failures: list[str] = []
+
+
+class FlakinessStore:
+    """
+    The database of test outcomes.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        :param path: the database file, created if it does not exist
+        """
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS outcomes ("
+            "test TEXT NOT NULL, run TEXT NOT NULL, finished REAL NOT NULL, outcome TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL, duration REAL NOT NULL, retry_time REAL NOT NULL, "
+            "failures TEXT NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS outcomes_test ON outcomes (test)")
+        self._connection.commit()
+
+    def record(
+        self,
+        test: str,
+        run: str,
+        outcome: str,
+        attempts: TestAttempts,
+        duration: float,
+    ) -> None:
+        """
+        :param test: the id of the test
+        :param run: the id of the run
+        :param outcome: how the test went, e.g. "passed" or "failed"
+        :param attempts: the attempts at running it
+        :param duration: time in seconds the test took, including retries
+        """
+        self._connection.execute(
+            "INSERT INTO outcomes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                test,
+                run,
+                time(),
+                outcome,
+                attempts.attempts,
+                duration,
+                attempts.retry_time,
+                json.dumps(attempts.failures),
+            ),
+        )
+        self._connection.commit()
+
+    def history(self, test: str, runs: int = HISTORY_RUNS) -> list[dict[str, Any]]:
+        """
+        :param test: the id of the test
+        :param runs: the number of most recent runs
+        :return: the outcomes of the test in those runs which passed or failed, most recent first
+        """
+        rows = self._connection.execute(
+            "SELECT outcome, attempts, failures FROM outcomes "
+            "WHERE test = ? AND outcome IN ('passed', 'failed') ORDER BY finished DESC LIMIT ?",
+            (test, runs),
+        )
+        return [
+            {"outcome": outcome, "attempts": attempts, "failures": json.loads(failures)}
+            for outcome, attempts, failures in rows
+        ]
+
+    def retry_budget(self, test: str, signature: str, max_retries: int) -> int:
+        """
+        :param test: the id of the test which has failed
+        :param signature: the signature of the failure
+        :param max_retries: the most retries allowed
+        :return: the number of times to retry the test
+        """
+        history = self.history(test)
+        if len(history) < MIN_RUNS_FOR_ADAPTIVE_RETRIES:
+            return max_retries
+
+        flake_signatures = {
+            failure for run in history if run["outcome"] == "passed" for failure in run["failures"]
+        }
+        if signature not in flake_signatures:
+            regression_runs = sum(
+                1
+                for run in history
+                if run["outcome"] == "failed"
+                and run["failures"]
+                and all(failure == signature for failure in run["failures"])
+            )
+            # A failure not yet known to be a regression is retried once, so that if it is a flake
+            # the pass after it is recorded
+            return 0 if regression_runs >= REGRESSION_RUNS else min(1, max_retries)
+
+        attempts = sum(run["attempts"] for run in history)
+        failed_attempts = sum(len(run["failures"]) for run in history)
+        failure_rate = failed_attempts / attempts
+        if failure_rate >= 1:
+            return max_retries
+        # Fewest retries for all the attempts of a flaky test to be unlikely to fail
+        retries = math.ceil(math.log(TARGET_FLAKY_FAILURE_PROBABILITY) / math.log(failure_rate) - 1)
+        return min(max(1, retries), max_retries)
+
+    def flakiest(self, number: int) -> list[dict[str, Any]]:
+        """
+        :param number: how many tests to return
+        :return: the tests which have spent longest on failed attempts which were retried, with the
+            number of runs, the number of runs which needed retries and the time spent
+        """
+        rows = self._connection.execute(
+            "SELECT test, COUNT(*), SUM(attempts > 1), SUM(retry_time) FROM outcomes "
+            "GROUP BY test HAVING SUM(retry_time) > 0 ORDER BY SUM(retry_time) DESC LIMIT ?",
+            (number,),
+        )
+        return [
+            {"test": test, "runs": runs, "runs_retried": runs_retried, "retry_time": retry_time}
+            for test, runs, runs_retried, retry_time in rows
+        ]
+
+    def close(self) -> None:
+        """
+        Close the database.
+        """
+        self._connection.close()
+
+
+class FlakinessRegister:
+    """
+    The store for the run, and the attempts at the tests running now.
+    """
+
+    Store: ClassVar[FlakinessStore | None] = None
+    Run: ClassVar[str] = ""
+    Attempts: ClassVar[dict[str, TestAttempts]] = {}
+
+    @classmethod
+    def open(cls, path: str) -> None:
+        """
+        Start recording the outcomes of tests.
+
+        :param path: the database file
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        cls.Store = FlakinessStore(path)
+        cls.Run = str(time())
+
+    @classmethod
+    def close(cls) -> None:
+        """
+        Stop recording the outcomes of tests.
+        """
+        if cls.Store is not None:
+            cls.Store.close()
+            cls.Store = None
+
+    @classmethod
+    def attempts(cls, test: str) -> TestAttempts:
+        """
+        :param test: the id of a test which is running
+        :return: its attempts so far
+        """
+        return cls.Attempts.setdefault(test, TestAttempts())
+
+    @classmethod
+    def retry_budget(cls, test: str, signature: str, max_retries: int) -> int:
+        """
+        :param test: the id of the test which has failed
+        :param signature: the signature of the failure
+        :param max_retries: the most retries allowed
+        :return: the number of times to retry the test; max_retries if outcomes are not recorded
+        """
+        if cls.Store is None:
+            return max_retries
+        return cls.Store.retry_budget(test, signature, max_retries)
+
+    @classmethod
+    def finish_test(cls, test: str, outcome: str, duration: float) -> None:
+        """
+        Record the outcome of a test.
+
+        :param test: the id of the test
+        :param outcome: how the test went, e.g. "passed" or "failed"
+        :param duration: time in seconds the test took, including retries
+        """
+        attempts = cls.Attempts.pop(test, TestAttempts())
+        if cls.Store is not None:
+            cls.Store.record(test, cls.Run, outcome, attempts, duration)
@@ -1,24 +1,249 @@
+"""
+Ports for the IOCs, emulators and the things between them.
+
+Ports are leased from blocks of a range below the ephemeral ports of Windows and Linux, so a port
+handed out is not also handed out by the OS to some other socket. Each process running tests claims
+whole blocks, and hands out the ports of its blocks one at a time until they are released, so a
+port is never given to two launchers at once. If the lease directory is shared, a block is claimed
+by creating a lease file in it, so that test runs in parallel on the same machine get disjoint
+blocks; a lease file left by a process which has exited is taken over.
+"""
+
+import os
 import socket
+import threading
+from collections import deque
+from collections.abc import Generator
+from contextlib import contextmanager
+from typing import ClassVar
+
+import psutil
+
+# Range of ports leased, below the ephemeral ports of Windows (49152-) and Linux (32768-)
+PORT_RANGE_START = 20000
+PORT_RANGE_END = 32000
+
+# Number of ports in each block claimed by a process
+PORT_BLOCK_SIZE = 100
+
+# Directory in the temporary directory the blocks claimed by test runs are shared through
+PORT_LEASE_DIRECTORY = "ioc_test_framework_port_leases"
+
+
+def _bind_socket(port: int) -> socket.socket:
+    """
+    :param port: the port to bind; 0 for any free port
+    :return: a socket bound to the port, which nothing else can bind to while it is open
+    :raises OSError: if the port can not be bound
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if hasattr(socket, "SO_EXCLUSIVEADDRUSE"):
+            # Windows lets other sockets bind to a port already bound unless this is set
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        s.bind(("", port))
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def _port_is_free(port: int) -> bool:
+    """
+    :param port: the port
+    :return: True if nothing is bound to the port
+    """
+    try:
+        _bind_socket(port).close()
+    except OSError:
+        return False
+    return True
+
+
+class PortLeaseRegister:
+    """
+    The ports leased by this process, from the blocks it has claimed.
+    """
+
+    # Ports of the claimed blocks which are not leased, least recently released first
+    Free: ClassVar[deque[int]] = deque()
+    Leased: ClassVar[set[int]] = set()
+    # First ports of the claimed blocks
+    Blocks: ClassVar[list[int]] = []
+    # Directory of the lease files of the blocks; None if blocks are not shared between processes
+    LeaseDirectory: ClassVar[str | None] = None
+    # Ports leased in each open scope, innermost last
+    Scopes: ClassVar[list[set[int]]] = []
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def share(cls, directory: str) -> None:
+        """
+        Claim blocks through lease files, so that other processes sharing the directory claim
+        different blocks.
+
+        :param directory: the directory of the lease files
+        """
+        os.makedirs(directory, exist_ok=True)
+        cls.LeaseDirectory = directory
+
+    @classmethod
+    def lease(cls, n: int) -> tuple[int, ...]:
+        """
+        :param n: the number of ports required
+        :return: n ports which nothing is bound to, held until released
+        :raises OSError: if every block of ports has been claimed
+        """
+        with cls._lock:
+            ports = []
+            busy = []
+            try:
+                while len(ports) < n:
+                    if not cls.Free:
+                        cls._claim_block()
+                    port = cls.Free.popleft()
+                    # Something outside the test framework, or a closed socket which has not yet
+                    # finished closing, may have the port
+                    if _port_is_free(port):
+                        ports.append(port)
+                    else:
+                        busy.append(port)
+            finally:
+                # Busy ports are tried again after the other free ports, they may be free by then
+                cls.Free.extend(busy)
+                if len(ports) < n:
+                    # No block could be claimed, so the ports found are not leased either
+                    cls.Free.extendleft(reversed(ports))
+            cls.Leased.update(ports)
+            for scope in cls.Scopes:
+                scope.update(ports)
+            return tuple(ports)
+
+    @classmethod
+    def release(cls, *ports: int) -> None:
+        """
+        Return ports for leasing again. Ports which are not leased are ignored.
+
+        :param ports: the ports
+        """
+        with cls._lock:
+            for port in ports:
+                if port in cls.Leased:
+                    cls.Leased.remove(port)
+                    cls.Free.append(port)
+
+    @classmethod
+    @contextmanager
+    def scope(cls) -> Generator[None, None, None]:
+        """
+        Context manager which releases the ports leased in it which have not already been
+        released, e.g. the ports of the devices of a test module.
+        """
+        ports: set[int] = set()
+        cls.Scopes.append(ports)
+        try:
+            yield
+        finally:
+            cls.Scopes.remove(ports)
+            cls.release(*ports)
+
+    @classmethod
+    def release_all(cls) -> None:
+        """
+        Release every port and give up the claimed blocks.
+        """
+        with cls._lock:
+            if cls.LeaseDirectory is not None:
+                for block in cls.Blocks:
+                    try:
+                        os.remove(cls._lease_file(block))
+                    except FileNotFoundError:
+                        pass
+            cls.Free.clear()
+            cls.Leased.clear()
+            cls.Blocks.clear()
+
+    @classmethod
+    def _lease_file(cls, block: int) -> str:
+        assert cls.LeaseDirectory is not None
+        return os.path.join(cls.LeaseDirectory, f"{block}.lease")
+
+    @classmethod
+    def _claim_block(cls) -> None:
+        """
+        Claim a block of ports, starting the search at a block chosen by process so that
+        processes sharing leases rarely try the same blocks.
+
+        :raises OSError: if every block has been claimed
+        """
+        blocks = list(
+            range(PORT_RANGE_START, PORT_RANGE_END - PORT_BLOCK_SIZE + 1, PORT_BLOCK_SIZE)
+        )
+        first = os.getpid() % len(blocks)
+        for block in blocks[first:] + blocks[:first]:
+            if block not in cls.Blocks and cls._claim_lease_file(block):
+                cls.Blocks.append(block)
+                cls.Free.extend(range(block, block + PORT_BLOCK_SIZE))
+                return
+        raise OSError(f"No free block of ports between {PORT_RANGE_START} and {PORT_RANGE_END}")
+
+    @classmethod
+    def _claim_lease_file(cls, block: int) -> bool:
+        """
+        :param block: the first port of the block
+        :return: True if the block was claimed; always True if blocks are not shared
+        """
+        if cls.LeaseDirectory is None:
+            return True
+        lease_file = cls._lease_file(block)
+        for _ in range(2):
+            try:
+                fd = os.open(lease_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not cls._lease_file_is_stale(lease_file):
+                    return False
+                try:
+                    os.remove(lease_file)
+                except FileNotFoundError:
+                    pass
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    @staticmethod
+    def _lease_file_is_stale(lease_file: str) -> bool:
+        """
+        :param lease_file: the lease file of a block
+        :return: True if the process which claimed the block has exited
+        """
+        try:
+            with open(lease_file) as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            # Being written by the process claiming it
+            return False
+        return pid != os.getpid() and not psutil.pid_exists(pid)
 
 
 def get_free_ports(n: int) -> tuple[int, ...]:
     """
-    Returns n free port numbers on the current machine.
+    Returns n free port numbers on the current machine, leased until released.
 
     :param n: the number of ports required
     :return:  a tuple containing n free port numbers
     """
-    socks = []
-    ports = []
-    for i in range(n):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
-        s.bind(("", 0))
-        ports.append(s.getsockname()[1])
-        socks.append(s)
-    for s in socks:
-        s.close()
-    return tuple(ports)
+    return PortLeaseRegister.lease(n)
+
+
+def release_ports(*ports: int) -> None:
+    """
+    Release ports from get_free_ports once they are no longer in use.
+
+    :param ports: the ports
+    """
+    PortLeaseRegister.release(*ports)
 
 
 def get_free_ports_from_list(n: int, port_low: int, port_high: int) -> tuple[int, ...]:
@@ -32,18 +257,15 @@ def get_free_ports_from_list(n: int, port_low: int, port_high: int) -> tuple[int
     """
     socks = []
     ports = []
-    for i in range(n):
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
-        for j in range(port_low, port_high):
-            try:
-                s.bind(("", j))
-                ports.append(s.getsockname()[1])
-                socks.append(s)
-                break
-            except OSError:
-                # Port is unavailable or cannot be bound; try next candidate port.
-                continue
+    for port in range(port_low, port_high):
+        if len(ports) == n:
+            break
+        try:
+            socks.append(_bind_socket(port))
+            ports.append(port)
+        except OSError:
+            # Port is unavailable or cannot be bound; try next candidate port.
+            continue
     for s in socks:
         s.close()
     return tuple(ports)
@@ -3,25 +3,46 @@ Code that launches an IOC/application under test
 """
 
 import abc
+import concurrent.futures
 import datetime
 import os
 import pathlib
+import re
 import subprocess
-import time
 from abc import ABCMeta
 from collections.abc import Callable, Generator
 from contextlib import contextmanager
-from signal import SIGTERM
 from time import sleep
 from types import TracebackType
 from typing import Any, ClassVar, Self
 
 import psutil
-import telnetlib3
 
+from utils.boot_scanner import (
+    DEFAULT_BOOT_FAILURE_PATTERNS,
+    DEFAULT_BOOT_WARNING_PATTERNS,
+    BootScanner,
+    BootScanResult,
+)
 from utils.channel_access import ChannelAccess
 from utils.free_ports import get_free_ports
+from utils.ioc_readiness import DEFAULT_READY_TIMEOUT, IocBoot, log_size, wait_until_ready
+from utils.launch_timing import LaunchTimingRegister, PhaseTimer
 from utils.log_file import LogFileManager, log_filename
+from utils.process_tree import (
+    NEW_CONSOLE_CREATION_FLAGS,
+    kill_processes,
+    process_tree,
+    terminate_processes,
+    wait_for_exit,
+)
+from utils.procserv_client import (
+    AUTORESTART_TOGGLED,
+    CHILD_EXITED,
+    RESTARTED,
+    ProcServControlClient,
+    ProcServEvent,
+)
 from utils.test_modes import TestModes
 
 APPS_BASE = pathlib.Path("C:\\", "Instrument", "Apps")
@@ -34,6 +55,25 @@ DEFAULT_IOC_START_TEXT = "epics>"
 
 MAX_TIME_TO_WAIT_FOR_IOC_TO_START = 120
 
+# File in the var tmp directory the IOCs read their test macros from
+MACROS_FILE = "test_macros.txt"
+
+# Times to try replacing the macros file while an IOC has it open
+MACROS_FILE_REPLACE_ATTEMPTS = 20
+
+# Time in seconds for the IOC shell to finish a manual save
+MANUAL_SAVE_TIMEOUT = 10
+
+# Time in seconds for an IOC to exit after `exit` in iocsh before it is terminated
+MAX_TIME_TO_WAIT_FOR_IOC_TO_EXIT = 10
+
+# Time in seconds to search for the existence PVs of IOCs which should not yet be running. IOCs
+# which are running answer a search on the local network well within this.
+NOT_RUNNING_PROBE_TIMEOUT = 0.5
+
+# Directory procServ writes its pid files to
+PROCSERV_PID_DIR = "C:\\instrument\\var\\run"
+
 EPICS_CASE_ENVIRONMENT_VARS = {
     "EPICS_CAS_INTF_ADDR_LIST": "127.0.0.1",
     "EPICS_CAS_BEACON_ADDR_LIST": "127.255.255.255",
@@ -63,21 +103,37 @@ class CheckExistencePv:
         ca: channel access
         device: the device
         test_pv: the name of the test pv, defaults to the DISABLE PV
+        timer: times the checks as phases, if given
+        check_not_running: False to skip the check on entry, e.g. because IocsNotRunningCheck has
+            already done it
     """
 
-    def __init__(self, ca: ChannelAccess, device: str, test_pv: str = "DISABLE") -> None:
+    def __init__(
+        self,
+        ca: ChannelAccess,
+        device: str,
+        test_pv: str = "DISABLE",
+        timer: PhaseTimer | None = None,
+        check_not_running: bool = True,
+    ) -> None:
         self.ca = ca
         self.device = device
         self.test_pv = test_pv
+        self.timer = timer if timer is not None else PhaseTimer("existence check")
+        self.check_not_running = check_not_running
 
     def __enter__(self) -> None:
         if self.test_pv is None:
             print("No existence PV specified.")
             return
 
+        if not self.check_not_running:
+            return
+
         try:
             print("Check that IOC is not running")
-            self.ca.assert_that_pv_does_not_exist(self.test_pv)
+            with self.timer.phase("check not running"):
+                self.ca.assert_that_pv_does_not_exist(self.test_pv)
         except AssertionError as ex:
             raise AssertionError(f"IOC '{self.device}' appears to already be running: {ex}")
 
@@ -91,12 +147,58 @@ class CheckExistencePv:
             return
 
         try:
-            self.ca.assert_that_pv_exists(self.test_pv, timeout=30)
+            with self.timer.phase("wait for existence pv"):
+                self.ca.assert_that_pv_exists(self.test_pv, timeout=30)
         except AssertionError as ex:
             full_pv = self.ca.create_pv_with_prefix(self.test_pv)
             raise AssertionError(f"PV '{full_pv}' still does not exist after IOC start: {ex}")
 
 
+class IocsNotRunningCheck:
+    """
+    Checks that none of a module's IOCs are already running before any of them are launched, by
+    searching for all of their existence PVs at once with a short timeout. Each IOC then skips
+    its own, slower, check on open.
+
+    Args:
+        iocs: the launchers of the IOCs
+        timeout: time in seconds to search for each existence PV
+    """
+
+    def __init__(
+        self, iocs: list["BaseLauncher"], timeout: float = NOT_RUNNING_PROBE_TIMEOUT
+    ) -> None:
+        self.iocs = iocs
+        self.timeout = timeout
+
+    def __enter__(self) -> None:
+        iocs = [ioc for ioc in self.iocs if ioc.existence_pv is not None]
+        if not iocs:
+            return
+
+        print("Check that IOCs are not running")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(iocs)) as executor:
+            running = list(executor.map(lambda ioc: ioc.is_running(self.timeout), iocs))
+
+        stale = [ioc for ioc, is_running in zip(iocs, running) if is_running]
+        if stale:
+            raise AssertionError(
+                "IOCs appear to already be running: {}".format(
+                    ", ".join(f"'{ioc.device}' (PV {ioc.existence_pv} exists)" for ioc in stale)
+                )
+            )
+        for ioc in iocs:
+            ioc.checked_not_running = True
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        pass
+
+
 class IOCRegister:
     """
     A way of registering running iocs.
@@ -152,7 +254,21 @@ class BaseLauncher(metaclass=ABCMeta):
                     DEFAULT_IOC_START_TEXT
                  pv_for_existence: String, the PV to check for whether the IOC is running, default
                     of DISABLE
+                 boot_success_patterns: List of regular expressions, output showing the IOC has
+                    started, default of the started_text
+                 boot_failure_patterns: List of regular expressions, output showing the IOC has
+                    failed to boot, which stops the launch at once, default of
+                    DEFAULT_BOOT_FAILURE_PATTERNS
+                 boot_warning_patterns: List of regular expressions, output showing possible
+                    problems, which is counted and reported, default of
+                    DEFAULT_BOOT_WARNING_PATTERNS
                  macros: Dict, the macros that should be passed to this IOC
+                 ready_when: List of ReadinessCondition, conditions which must all hold after the
+                    IOC has started before it is ready to test, see ioc_readiness
+                 ready_timeout: Number, seconds for the ready_when conditions to hold, default of
+                    DEFAULT_READY_TIMEOUT
+                 delay_after_startup: Number, seconds to wait once the IOC is ready, default 0;
+                    prefer ready_when
             var_dir: The directory into which the launcher will save log files.
         """
         self._device = ioc_config["name"]
@@ -161,10 +277,19 @@ class BaseLauncher(metaclass=ABCMeta):
         self._prefix = ioc_config.get("custom_prefix", self._device)
         self._ioc_started_text = ioc_config.get("started_text", DEFAULT_IOC_START_TEXT)
         self._pv_for_existence = ioc_config.get("pv_for_existence", "DISABLE")
+        self._boot_scanner = BootScanner(
+            ioc_config.get("boot_success_patterns", [re.escape(self._ioc_started_text)]),
+            ioc_config.get("boot_failure_patterns", DEFAULT_BOOT_FAILURE_PATTERNS),
+            ioc_config.get("boot_warning_patterns", DEFAULT_BOOT_WARNING_PATTERNS),
+        )
+        # What was found in the output of the last boot
+        self.boot_result: BootScanResult | None = None
         self.macros = ioc_config.get("macros", {})
         self.emulator_port = int(self.macros["EMULATOR_PORT"])
         self._extra_environment_vars = ioc_config.get("environment_vars", {})
         self._init_values = ioc_config.get("inits", {})
+        self._ready_when = ioc_config.get("ready_when", [])
+        self._ready_timeout = ioc_config.get("ready_timeout", DEFAULT_READY_TIMEOUT)
         self._delay_after_startup = ioc_config.get("delay_after_startup", 0)
         self._var_dir = var_dir
         self._test_name = test_name
@@ -173,6 +298,12 @@ class BaseLauncher(metaclass=ABCMeta):
         self.log_file_manager = None
         self._process = None
         self._test_mode = test_mode
+        # True if IocsNotRunningCheck has found the IOC is not running, so that the next open need
+        # not check again
+        self.checked_not_running = False
+        # Timings of the phases of the last open and close
+        self.open_timings = PhaseTimer("open")
+        self.close_timings = PhaseTimer("close")
 
         if test_mode not in [TestModes.RECSIM, TestModes.DEVSIM, TestModes.NOSIM]:
             raise ValueError("Invalid test mode provided")
@@ -197,14 +328,19 @@ class BaseLauncher(metaclass=ABCMeta):
             print(f"St.cmd path not found: '{st_cmd_path}'")
 
         ca = self._get_channel_access()
+        timer = self.open_timings
 
-        with CheckExistencePv(ca, self._device, self._pv_for_existence):
+        check_not_running = not self.checked_not_running
+        self.checked_not_running = False
+        with CheckExistencePv(ca, self._device, self._pv_for_existence, timer, check_not_running):
             print(f"Starting IOC ({self._device}), IOC log file is {self.log_file_name}")
 
             settings = self.get_environment_vars()
 
-            self.create_macros_file()
+            with timer.phase("create macros file"):
+                self.create_macros_file()
 
+            log_start = log_size(self.log_file_name)
             self.log_file_manager = LogFileManager(self.log_file_name, "a")
             self.log_file_manager.log_file_w.write(
                 "Started IOC with '{}'".format(" ".join(self.command_line))
@@ -214,32 +350,78 @@ class BaseLauncher(metaclass=ABCMeta):
             # stdout and stderr.
             # This does mean that the IOC will need to be closed manually after the tests.
             # Make sure to revert before checking code in
-            self._process = subprocess.Popen(
-                " ".join(self.command_line),
-                creationflags=subprocess.CREATE_NEW_CONSOLE,
-                cwd=self._directory,
-                stdin=subprocess.PIPE,
-                stdout=self.log_file_manager.log_file_w,
-                stderr=subprocess.STDOUT,
-                env=settings,
-            )
+            with timer.phase("start process"):
+                self._process = subprocess.Popen(
+                    " ".join(self.command_line),
+                    creationflags=NEW_CONSOLE_CREATION_FLAGS,
+                    cwd=self._directory,
+                    stdin=subprocess.PIPE,
+                    stdout=self.log_file_manager.log_file_w,
+                    stderr=subprocess.STDOUT,
+                    env=settings,
+                )
 
             # Write a return so that an epics terminal will appear after boot
             stdin = self._process.stdin
             assert stdin is not None
             stdin.write(b"\n")
             stdin.flush()
-            self.log_file_manager.wait_for_console(
-                MAX_TIME_TO_WAIT_FOR_IOC_TO_START, self._ioc_started_text
-            )
+            with timer.phase("wait for console"):
+                self.boot_result = self.log_file_manager.wait_for_boot(
+                    MAX_TIME_TO_WAIT_FOR_IOC_TO_START, self._boot_scanner
+                )
+            self._check_boot_result(self.boot_result)
 
-            for key, value in self._init_values.items():
-                print(f"Initialising PV {key} to {value}")
-                ca.set_pv_value(key, value)
+            with timer.phase("inits"):
+                for key, value in self._init_values.items():
+                    print(f"Initialising PV {key} to {value}")
+                    ca.set_pv_value(key, value)
 
         IOCRegister.add_ioc(self._device, self)
 
-        sleep(self._delay_after_startup)
+        if self._ready_when:
+            with timer.phase("wait until ready"):
+                self._wait_until_ready(log_start)
+
+        if self._delay_after_startup:
+            with timer.phase("delay after startup"):
+                sleep(self._delay_after_startup)
+
+    def _check_boot_result(self, result: BootScanResult) -> None:
+        """
+        Args:
+            result: what was found in the output of the boot
+        Raises:
+            AssertionError: if the IOC failed to boot or did not start in time
+        """
+        if result.failure_line is not None:
+            raise AssertionError(
+                f"IOC ({self._device}) failed to boot: '{result.failure_line}'. "
+                f"IOC log file is {self.log_file_name}"
+            )
+        if not result.succeeded:
+            raise AssertionError(
+                f"IOC ({self._device}) appears not to have started after "
+                f"{MAX_TIME_TO_WAIT_FOR_IOC_TO_START} seconds. Looking for "
+                f"'{self._ioc_started_text}'"
+            )
+        if result.warning_count:
+            print(f"IOC ({self._device}) started with {result.warning_count} possible problems:")
+            for line in result.warning_lines[:5]:
+                print(f"    {line}")
+
+    def _wait_until_ready(self, log_start: int) -> None:
+        """
+        Wait for the ready_when conditions of the IOC to hold.
+
+        Args:
+            log_start: the position in the log file at which this boot of the IOC started
+        """
+        boot = IocBoot(self._get_channel_access(), self.log_file_name, log_start)
+        try:
+            wait_until_ready(self._ready_when, boot, self._ready_timeout)
+        finally:
+            boot.close()
 
     @abc.abstractmethod
     def _command_line(self) -> list[str]:
@@ -253,7 +435,16 @@ class BaseLauncher(metaclass=ABCMeta):
         """
 
     def __enter__(self) -> Self:
-        self.open()
+        self.open_timings = PhaseTimer("open")
+        self.boot_result = None
+        try:
+            with self.open_timings.measure_total():
+                self.open()
+        finally:
+            details = {"boot": self.boot_result.to_dict()} if self.boot_result else None
+            LaunchTimingRegister.add_record(
+                self._test_name, "ioc", self._device, self.open_timings, details
+            )
         return self
 
     def __exit__(
@@ -262,7 +453,45 @@ class BaseLauncher(metaclass=ABCMeta):
         exc_value: BaseException | None,
         traceback: TracebackType | None,
     ) -> None:
-        self.close()
+        self.close_timings = PhaseTimer("close")
+        try:
+            with self.close_timings.measure_total():
+                self.close()
+        finally:
+            LaunchTimingRegister.add_record(
+                self._test_name, "ioc", self._device, self.close_timings
+            )
+
+    @property
+    def device(self) -> str:
+        """
+        :return: the device name
+        """
+        return self._device
+
+    @property
+    def existence_pv(self) -> str | None:
+        """
+        :return: the PV, with the IOC prefix, which exists when the IOC is running; None if there
+            is none
+        """
+        if self._pv_for_existence is None:
+            return None
+        return self._get_channel_access().create_pv_with_prefix(self._pv_for_existence)
+
+    def is_running(self, timeout: float) -> bool:
+        """
+        Search once for the existence PV.
+
+        Args:
+            timeout: time in seconds to search for
+        Returns:
+            True if the existence PV was found
+        """
+        existence_pv = self.existence_pv
+        if existence_pv is None:
+            return False
+        return self._get_channel_access().ca.pv_exists(existence_pv, timeout=timeout)
 
     def _get_channel_access(self) -> ChannelAccess:
         """
@@ -282,11 +511,24 @@ class BaseLauncher(metaclass=ABCMeta):
         if not os.path.exists(full_dir):
             os.makedirs(full_dir)
 
-        with open(os.path.join(full_dir, "test_macros.txt"), mode="w") as f:
+        # Write the whole file before it replaces the old one, so that an IOC starting meanwhile
+        # never reads it half written
+        macros_file = os.path.join(full_dir, MACROS_FILE)
+        temporary_file = f"{macros_file}.{self._device}.tmp"
+        with open(temporary_file, mode="w") as f:
             f.writelines(
                 f'{self._device_icp_config_name}__{macro}="{value}"\n'
                 for macro, value in self.macros.items()
             )
+        for attempt in range(MACROS_FILE_REPLACE_ATTEMPTS):
+            try:
+                os.replace(temporary_file, macros_file)
+                break
+            except PermissionError:
+                # Windows does not allow replacing a file another process has open
+                if attempt == MACROS_FILE_REPLACE_ATTEMPTS - 1:
+                    raise
+                sleep(0.05)
 
     def get_environment_vars(self) -> dict[str, str]:
         """
@@ -359,15 +601,17 @@ class ProcServLauncher(BaseLauncher):
 
         self.procserv_port = get_free_ports(1)[0]
 
-        self._telnet: telnetlib3.Telnet | None = None
+        self._connected_to_procserv = False
+        self._pid_file = f"{PROCSERV_PID_DIR}\\EPICS_{self._device}.pid"
+        # The procServ processes started by this launcher, found on open
+        self._procserv_processes: list[psutil.Process] = []
         self.autorestart = True
         self.original_macros = ioc.get("macros", {})
 
-    def _get_telnet(self) -> telnetlib3.Telnet:
-        tn = self._telnet
-        if tn is None:
-            raise ValueError("Attempted to use telnet before it was set up")
-        return tn
+    def _get_control_client(self) -> ProcServControlClient:
+        if not self._connected_to_procserv:
+            raise ValueError("Attempted to use procServ before connecting to it")
+        return ProcServControlClient.shared()
 
     def get_environment_vars(self) -> dict[str, str]:
         settings = super().get_environment_vars()
@@ -412,7 +656,7 @@ class ProcServLauncher(BaseLauncher):
             "--autorestart",
             "--wait",
             f"--name={self._device.upper()}",
-            f'--pidfile="/cygdrive/c/instrument/var/run/EPICS_{self._device}.pid"',
+            f'--pidfile="{self.to_cygwin_address(self._pid_file)}"',
             f"--logport={self.logport:d}",
             f'--chdir="{cygwin_dir}"',
             f"{self.procserv_port:d}",
@@ -431,24 +675,24 @@ class ProcServLauncher(BaseLauncher):
 
         """
         super().open()
-        pids = ",".join([str(s) for s in self._find_processes()])
+        with self.open_timings.phase("track processes"):
+            self._procserv_processes = self._started_procserv_processes()
+            pids = ",".join(str(process.pid) for process in self._procserv_processes)
         print(
             f"IOC started, connecting to procserv pids {pids} at telnet port {self.procserv_port}"
         )
 
-        timeout = 20
-
-        self._telnet = telnetlib3.Telnet("localhost", self.procserv_port, timeout=timeout)
-
-        # Wait for procServ to become responsive by checking for the IOC started text
-        init_output = (
-            self._get_telnet()
-            .read_until(self._ioc_started_text.encode("ascii"), timeout)
-            .decode("ascii")
-        )
+        with self.open_timings.phase("connect to procserv"):
+            client = ProcServControlClient.shared()
+            try:
+                client.connect(self._device, self.procserv_port, timeout=20)
+            except TimeoutError:
+                raise OSError("Cannot connect to procServ over telnet")
+            self._connected_to_procserv = True
 
-        if "Welcome to procServ" not in init_output:
-            raise OSError("Cannot connect to procServ over telnet")
+        for event in client.events(self._device):
+            if event.autorestart is not None:
+                self.autorestart = event.autorestart != "OFF"
 
     def send_telnet_command_and_retry_if_not_detected_condition_for_success(
         self, command: str, condition_for_success: Callable[[], bool], retry_limit: int
@@ -471,9 +715,6 @@ class ProcServLauncher(BaseLauncher):
             self.send_telnet_command(command)
             if condition_for_success():
                 break
-            else:
-                self._get_telnet().close()
-                self._get_telnet().open("localhost", self.procserv_port, timeout=20)
         else:  # If condition for success not detected, raise an assertion error
             raise AssertionError(f"Sending telnet command {command} failed {retry_limit} times")
 
@@ -483,42 +724,81 @@ class ProcServLauncher(BaseLauncher):
         Args:
             command: command to set
         """
-        self._get_telnet().write(f"{command}\n".encode("ascii"))
+        self._get_control_client().send(self._device, f"{command}\n")
+
+    def procserv_events(self) -> list[ProcServEvent]:
+        """
+        Returns:
+            the events procServ has reported since the launcher connected, e.g. the IOC restarting
+        """
+        return self._get_control_client().events(self._device)
 
     def force_manual_save(self) -> None:
         """
-        Force a manual save by sending requests to save the settings and positions files
+        Force a manual save by sending requests to save the settings and positions files, waiting
+        for the IOC shell to finish each request
         """
-        self.send_telnet_command(f"manual_save({self._device}_info_settings.req)")
-        self.send_telnet_command(f"manual_save({self._device}_info_positions.req)")
+        for request_file in (
+            f"{self._device}_info_settings.req",
+            f"{self._device}_info_positions.req",
+        ):
+            self._get_control_client().command(
+                self._device,
+                f"manual_save({request_file})\n",
+                expect=re.escape(DEFAULT_IOC_START_TEXT),
+                timeout=MANUAL_SAVE_TIMEOUT,
+            )
 
     def start_ioc(self, wait: bool = False) -> None:
         """
         Start/restart IOC over telnet. (^X)
 
         Args:
-            wait (bool): If this is true send the command and wait for the ioc started text to
-                appear in the log, if the text doesn't appear retry (retries at most 3 times). If
-                false just send the command and don't wait or retry.
+            wait (bool): If this is true send the command and wait for procServ to report the IOC
+                restarted and for the ioc started text to appear, if they don't, retry (retries at
+                most 3 times). If false just send the command and don't wait or retry.
         """
         start_command = "\x18"
-        if wait:
-
-            def condition_for_success() -> bool:
-                try:
-                    lfm = self.log_file_manager
-                    assert lfm is not None
-                    lfm.wait_for_console(MAX_TIME_TO_WAIT_FOR_IOC_TO_START, self._ioc_started_text)
-                except AssertionError:
-                    return False
-                else:
-                    return True
-
-            self.send_telnet_command_and_retry_if_not_detected_condition_for_success(
-                start_command, condition_for_success, 3
-            )
-        else:
+        if not wait:
             self.send_telnet_command(start_command)
+            return
+
+        client = self._get_control_client()
+        for _ in range(3):
+            try:
+                event = client.command(
+                    self._device,
+                    start_command,
+                    event=(RESTARTED, CHILD_EXITED),
+                    timeout=MAX_TIME_TO_WAIT_FOR_IOC_TO_START,
+                )
+                if event.kind == CHILD_EXITED:
+                    # ^X killed a running IOC; procServ restarts it only in auto restart mode
+                    if not self.autorestart:
+                        event = client.command(self._device, start_command, event=RESTARTED)
+                    else:
+                        event = client.wait_for_event(
+                            self._device,
+                            RESTARTED,
+                            MAX_TIME_TO_WAIT_FOR_IOC_TO_START,
+                            start=event.position,
+                        )
+                client.wait_for_text(
+                    self._device,
+                    re.escape(self._ioc_started_text),
+                    MAX_TIME_TO_WAIT_FOR_IOC_TO_START,
+                    start=event.position,
+                )
+            except TimeoutError as ex:
+                print(f"IOC {self._device} did not restart: {ex}")
+            else:
+                break
+        else:
+            raise AssertionError(f"Sending telnet command {start_command} failed 3 times")
+
+        # Skip the restart in the log, as waiting for it there would have done
+        if self.log_file_manager is not None:
+            self.log_file_manager.read_log()
 
     def quit_ioc(self) -> None:
         """
@@ -533,18 +813,14 @@ class ProcServLauncher(BaseLauncher):
         Toggles whether the IOC is auto-restarts or not.
 
         """
-        self._get_telnet().read_very_eager()
-
         autorestart_command = "-"
-        self.send_telnet_command(autorestart_command)
-        response = self._get_telnet().read_very_eager().decode("ascii")
-
-        if "OFF" in response:
-            self.autorestart = False
-        elif "ON" in response:
-            self.autorestart = True
-        else:
+        try:
+            event = self._get_control_client().command(
+                self._device, f"{autorestart_command}\n", event=AUTORESTART_TOGGLED, timeout=5
+            )
+        except TimeoutError:
             raise OSError("No response from procserv")
+        self.autorestart = event.autorestart != "OFF"
 
     def close(self) -> None:
         """
@@ -553,33 +829,103 @@ class ProcServLauncher(BaseLauncher):
         """
         print(f"\nTerminating IOC ({self._device})")
 
-        if self._telnet is not None:
-            self._get_telnet().close()
+        if self._connected_to_procserv:
+            ProcServControlClient.shared().disconnect(self._device)
+            self._connected_to_procserv = False
+
+        tracked = bool(self._procserv_processes)
+        processes = []
+        with self.close_timings.phase("find processes"):
+            for procserv in self._procserv_processes:
+                processes.extend(process_tree(procserv))
+            self._procserv_processes = []
+
+        with self.close_timings.phase("kill processes"):
+            processes = terminate_processes(processes)
+            if processes:
+                processes = kill_processes(processes)
+        if processes:
+            print(f"Processes {[process.pid for process in processes]} were still up after killing")
+
+        # Only search all processes if tracking failed or procServ has been started again by
+        # something else, e.g. after a crash
+        if tracked and self._pid_file_process() is None:
+            return
+        with self.close_timings.phase("kill orphaned processes"):
+            orphans = []
+            for pid in self._find_processes():
+                orphans.extend(process_tree(pid))
+            if orphans:
+                print(f"Killing untracked procServ processes {[p.pid for p in orphans]}")
+                kill_processes(terminate_processes(orphans))
+            elif not tracked:
+                print(
+                    "No process with name procServ.exe found that "
+                    f"matched command line {self.command_line}"
+                )
 
-        at_least_one_killed = False
-        while True:
-            pids = self._find_processes()
-            if not pids:
-                break
+    def _started_procserv_processes(self) -> list[psutil.Process]:
+        """
+        The procServ processes of this IOC, found from the pid file procServ writes and the
+        process this launcher started, falling back to searching all processes for a procServ
+        with this IOC's arguments.
 
-            at_least_one_killed = True
+        Returns:
+            the processes
+        """
+        processes = []
+        for process in (self._pid_file_process(), self._launched_process()):
+            if process is not None and process not in processes:
+                processes.append(process)
+        if processes:
+            return processes
+
+        processes = []
+        for pid in self._find_processes():
+            try:
+                processes.append(psutil.Process(pid))
+            except psutil.NoSuchProcess:
+                pass
+        return processes
+
+    def _pid_file_process(self) -> psutil.Process | None:
+        """
+        Returns:
+            the procServ process in the pid file, if it is running and is for this IOC
+        """
+        try:
+            with open(self._pid_file) as f:
+                pid = int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+        return self._procserv_process(pid)
 
-            for pid in pids:
-                try:
-                    os.kill(pid, SIGTERM)
-                except ProcessLookupError:
-                    # Process might have already been terminated
-                    # we get two cygwin processes ids and killing one
-                    # may have removed both processes
-                    pass
+    def _launched_process(self) -> psutil.Process | None:
+        """
+        Returns:
+            the procServ process this launcher started, if it is still running
+        """
+        if self._process is None:
+            return None
+        return self._procserv_process(self._process.pid)
 
-            time.sleep(1)
+    def _procserv_process(self, pid: int) -> psutil.Process | None:
+        """
+        Args:
+            pid: a process id
 
-        if not at_least_one_killed:
-            print(
-                "No process with name procServ.exe found that "
-                f"matched command line {self.command_line}"
-            )
+        Returns:
+            the process, if it is a procServ for this IOC
+        """
+        try:
+            process = psutil.Process(pid)
+            if process.name() == "procServ.exe" and self.process_arguments_match_this_ioc(
+                process.cmdline()
+            ):
+                return process
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+        return None
 
     def _find_processes(self) -> list[int]:
         pid_list = []
@@ -629,15 +975,40 @@ class ProcServLauncher(BaseLauncher):
              macros (dict): A dictionary of macros to restart the ioc with.
              pv_to_wait_for (str): A pv to wait for 60 seconds to appear after starting the ioc.
         """
-        ca = self.ca
-        assert ca is not None
-        try:
-            self._start_with_macros(macros)
-            ca.assert_that_pv_exists(pv_to_wait_for, timeout=60)
+        with self.macro_variants(pv_to_wait_for) as restart_with:
+            restart_with(macros)
             yield
+
+    @contextmanager
+    def macro_variants(
+        self, pv_to_wait_for: str
+    ) -> Generator[Callable[[dict[str, str]], None], None, None]:
+        """
+        A context manager to restart the ioc with several sets of macros in turn, and at the end
+        start it again with the original macros. Use it to test several sets of macros at the
+        cost of one restart each plus one at the end, e.g.
+
+            with self._ioc.macro_variants(pv_to_wait_for="FREQ") as restart_with:
+                for macros in variants:
+                    restart_with(macros)
+                    ...
+
+        Args:
+             pv_to_wait_for (str): A pv to wait for 60 seconds to appear after each restart.
+
+        Returns:
+            a function to restart the ioc with a dictionary of macros
+        """
+
+        def _restart_with(macros: dict[str, str]) -> None:
+            self._start_with_macros(macros)
+            self._get_channel_access().assert_that_pv_exists(pv_to_wait_for, timeout=60)
+
+        try:
+            yield _restart_with
         finally:
             self._start_with_original_macros()
-            ca.assert_that_pv_exists(pv_to_wait_for, timeout=60)
+            self._get_channel_access().assert_that_pv_exists(pv_to_wait_for, timeout=60)
 
     def _start_with_macros(self, macros: dict[str, str], wait: bool = True) -> None:
         """
@@ -645,11 +1016,11 @@ class ProcServLauncher(BaseLauncher):
 
         Args
             macros (dict): A dictionary of macros to restart the ioc with.
+            wait (bool): Wait for the ioc to restart and be ready
         """
         self.macros = macros
         self.create_macros_file()
-        time.sleep(1)
-        self.start_ioc(wait)
+        self._restart(wait)
 
     def _start_with_original_macros(self, wait: bool = True) -> None:
         """
@@ -657,8 +1028,23 @@ class ProcServLauncher(BaseLauncher):
         """
         self.macros = self.original_macros
         self.create_macros_file()
-        time.sleep(1)
+        self._restart(wait)
+
+    def _restart(self, wait: bool) -> None:
+        """
+        Restart the ioc and, if waiting, wait for it to be started and ready.
+
+        Args:
+            wait (bool): Wait for the ioc to restart and be ready
+        """
+        log_start = log_size(self.log_file_name)
         self.start_ioc(wait)
+        if not wait:
+            return
+        if self._pv_for_existence is not None:
+            self._get_channel_access().assert_that_pv_exists(self._pv_for_existence, timeout=30)
+        if self._ready_when:
+            self._wait_until_ready(log_start)
 
 
 class IocLauncher(BaseLauncher):
@@ -703,40 +1089,38 @@ class IocLauncher(BaseLauncher):
         print(f"\nTerminating IOC ({self._device})")
 
         if self._process is not None:
+            processes = process_tree(self._process.pid)
+
             #  use write not communicate so that we don't wait for exit before continuing
             stdin = self._process.stdin
             assert stdin is not None
-            stdin.write(b"exit\n")
-            stdin.flush()
+            try:
+                stdin.write(b"exit\n")
+                stdin.flush()
+            except OSError:
+                # The IOC has already gone
+                pass
 
-            max_wait_for_ioc_to_die = 60
-            wait_per_loop = 0.1
-
-            for loop_count in range(int(max_wait_for_ioc_to_die / wait_per_loop)):
-                try:
-                    self._get_channel_access().assert_that_pv_does_not_exist(self._pv_for_existence)
-                    break
-                except AssertionError:
-                    sleep(wait_per_loop)
-                    if loop_count % 100 == 99:
-                        print(f"   waited {loop_count * wait_per_loop}")
-            else:
+            with self.close_timings.phase("wait for exit"):
+                processes = wait_for_exit(processes, MAX_TIME_TO_WAIT_FOR_IOC_TO_EXIT)
+            if processes:
+                print(
+                    f"IOC process did not exit {MAX_TIME_TO_WAIT_FOR_IOC_TO_EXIT} seconds after "
+                    "`exit` in iocsh. Terminating it."
+                )
+                with self.close_timings.phase("terminate"):
+                    processes = terminate_processes(processes)
+            if processes:
+                print("IOC process did not terminate. Killing it.")
+                with self.close_timings.phase("kill"):
+                    processes = kill_processes(processes)
+            if processes:
                 print(
-                    f"IOC process did not die after {max_wait_for_ioc_to_die} "
-                    "seconds after killing with `exit` in iocsh. "
-                    f"Killing process and waiting another {max_wait_for_ioc_to_die} seconds"
+                    "After killing processes {} forcibly, they were still up. Will continue "
+                    "anyway, but the next set of tests to use this IOC are likely to "
+                    "fail".format(", ".join(str(process.pid) for process in processes))
                 )
-                self._process.kill()
-                sleep(max_wait_for_ioc_to_die)
-                try:
-                    self._get_channel_access().assert_that_pv_does_not_exist(self._pv_for_existence)
-                    print("After killing process forcibly and waiting, IOC died correctly.")
-                except AssertionError:
-                    print(
-                        "After killing process forcibly and waiting, IOC was still up. Will "
-                        "continue anyway, but  the next set of tests to use this IOC are likely to "
-                        "fail"
-                    )
+            self._process.poll()
 
         self._print_log_file_location()
 
@@ -773,6 +1157,10 @@ class PythonIOCLauncher(IocLauncher):
 
         if self._process is not None:
             # just kill a process if this is the only way to stop it
-            self._process.kill()
+            with self.close_timings.phase("kill"):
+                processes = kill_processes(process_tree(self._process.pid))
+            if processes:
+                print(f"Python IOC ({self._device}) was still up after killing it.")
+            self._process.poll()
 
         self._print_log_file_location()
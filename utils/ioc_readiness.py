@@ -0,0 +1,231 @@
+"""
+Conditions for an IOC being ready to test, used instead of sleeping for a fixed time after boot.
+
+An IOC config entry lists its conditions under ready_when, e.g.::
+
+    {
+        "name": "GALIL_01",
+        ...
+        "ready_when": [
+            PvsValid([f"MTR01{axis:02d}" for axis in range(1, 9)]),
+            PvIs("MTR0101.DMOV", 1),
+            LogContains("Galil controller connected"),
+        ],
+        "ready_timeout": 60,
+    }
+
+After the IOC has started the launcher checks all the conditions at the same time and carries on
+as soon as every one of them holds, failing if they do not all hold within the timeout.
+"""
+
+import os
+import threading
+from abc import ABCMeta, abstractmethod
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+
+from genie_python.genie import PVValue
+
+from utils.channel_access import ChannelAccess
+from utils.log_tail import LogTailService
+
+# Default time in seconds for all the readiness conditions of an IOC to hold
+DEFAULT_READY_TIMEOUT = 60
+
+# Time in seconds between checks of a condition
+READY_POLL_INTERVAL = 0.2
+
+# Time in seconds to wait for a PV to connect on each check
+_PV_CONNECT_TIMEOUT = 1.0
+
+
+class IocBoot:
+    """
+    What readiness conditions can look at: the IOC's PVs and what it has logged since it started.
+    """
+
+    def __init__(self, ca: ChannelAccess, log_file_name: str, log_start: int = 0) -> None:
+        """
+        :param ca: channel access with the IOC's prefix
+        :param log_file_name: the IOC's log file, which must exist
+        :param log_start: the position in the log file at which this boot started
+        """
+        self.ca = ca
+        self._log = LogTailService.shared().subscribe(log_file_name, start=log_start)
+        self._log_text = ""
+        # Conditions are checked from several threads, and reading the lines drains them
+        self._log_lock = threading.Lock()
+
+    def pv_exists(self, pv: str) -> bool:
+        """
+        :param pv: the PV, without the prefix
+        :return: True if the PV can be connected to
+        """
+        return self.ca.ca.pv_exists(self.ca.create_pv_with_prefix(pv), timeout=_PV_CONNECT_TIMEOUT)
+
+    def log_text(self) -> str:
+        """
+        :return: everything the IOC has logged since it started
+        """
+        with self._log_lock:
+            self._log_text += "".join(self._log.read_lines())
+            return self._log_text + self._log.partial_line
+
+    def close(self) -> None:
+        """
+        Stop following the log.
+        """
+        self._log.close()
+
+
+class ReadinessCondition(metaclass=ABCMeta):
+    """
+    Something which must hold before an IOC is ready to test.
+    """
+
+    @abstractmethod
+    def is_met(self, boot: IocBoot) -> bool:
+        """
+        Check the condition once.
+
+        :param boot: the IOC being started
+        :return: True if the condition holds
+        """
+
+    @abstractmethod
+    def describe(self) -> str:
+        """
+        :return: a description of the condition for error messages
+        """
+
+
+class PvsValid(ReadinessCondition):
+    """
+    PVs exist and are not in INVALID alarm.
+    """
+
+    def __init__(self, pvs: Iterable[str]) -> None:
+        """
+        :param pvs: the PVs, without the prefix
+        """
+        self.pvs = list(pvs)
+
+    def is_met(self, boot: IocBoot) -> bool:
+        for pv in self.pvs:
+            if not boot.pv_exists(pv):
+                return False
+            pv_no_field = pv.rsplit(".", 1)[0]
+            if boot.ca.get_pv_value(f"{pv_no_field}.SEVR") == ChannelAccess.Alarms.INVALID:
+                return False
+        return True
+
+    def describe(self) -> str:
+        return "PVs exist and are not INVALID: {}".format(", ".join(self.pvs))
+
+
+class PvIs(ReadinessCondition):
+    """
+    A PV has a value.
+    """
+
+    def __init__(self, pv: str, value: PVValue) -> None:
+        """
+        :param pv: the PV, without the prefix
+        :param value: the value it must have
+        """
+        self.pv = pv
+        self.value = value
+
+    def is_met(self, boot: IocBoot) -> bool:
+        return boot.pv_exists(self.pv) and boot.ca.get_pv_value(self.pv) == self.value
+
+    def describe(self) -> str:
+        return f"PV {self.pv} is {self.value!r}"
+
+
+class LogContains(ReadinessCondition):
+    """
+    The IOC has logged some text since it started.
+    """
+
+    def __init__(self, text: str) -> None:
+        """
+        :param text: the text
+        """
+        self.text = text
+
+    def is_met(self, boot: IocBoot) -> bool:
+        return self.text in boot.log_text()
+
+    def describe(self) -> str:
+        return f"log contains {self.text!r}"
+
+
+def _wait_for_condition(
+    condition: ReadinessCondition, boot: IocBoot, deadline: float
+) -> tuple[bool, Exception | None]:
+    """
+    :param condition: the condition
+    :param boot: the IOC being started
+    :param deadline: the monotonic() time by which the condition must hold
+    :return: whether the condition held by the deadline, and the last error raised checking it
+    """
+    last_error = None
+    while True:
+        try:
+            if condition.is_met(boot):
+                return True, None
+        except Exception as e:  # noqa: BLE001
+            # e.g. a PV disconnecting between checks; try again until the deadline
+            last_error = e
+        if monotonic() >= deadline:
+            return False, last_error
+        sleep(READY_POLL_INTERVAL)
+
+
+def wait_until_ready(
+    conditions: list[ReadinessCondition],
+    boot: IocBoot,
+    timeout: float = DEFAULT_READY_TIMEOUT,
+) -> None:
+    """
+    Wait for all the conditions to hold, checking them at the same time.
+
+    :param conditions: the conditions
+    :param boot: the IOC being started
+    :param timeout: the most time in seconds to wait for all of them
+    :raises AssertionError: if any condition does not hold within the timeout, giving the last
+        error raised checking each condition which did not hold
+    """
+    if not conditions:
+        return
+    deadline = monotonic() + timeout
+    with ThreadPoolExecutor(max_workers=len(conditions)) as executor:
+        results = list(
+            executor.map(
+                lambda condition: _wait_for_condition(condition, boot, deadline), conditions
+            )
+        )
+    not_met = [
+        condition.describe() if error is None else f"{condition.describe()} (last error: {error!r})"
+        for condition, (met, error) in zip(conditions, results)
+        if not met
+    ]
+    if not_met:
+        raise AssertionError(
+            "IOC not ready after {} seconds, still waiting for: {}".format(
+                timeout, "; ".join(not_met)
+            )
+        )
+
+
+def log_size(log_file_name: str) -> int:
+    """
+    :param log_file_name: the log file
+    :return: the size of the log file, 0 if it does not exist
+    """
+    try:
+        return os.path.getsize(log_file_name)
+    except OSError:
+        return 0
@@ -0,0 +1,142 @@
+"""
+Timing of the phases of starting and stopping IOCs and emulators.
+
+Launchers time their phases with a PhaseTimer and add them to the LaunchTimingRegister once they
+have opened or closed. At the end of a run the register is written out as JSON, see run_tests, to
+show which devices and phases the run spends its time on.
+"""
+
+import json
+import os
+from collections.abc import Generator
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any, ClassVar
+
+
+class PhaseTimer:
+    """
+    Times the phases of an operation, such as opening a launcher, with a monotonic clock.
+    """
+
+    def __init__(self, operation: str) -> None:
+        """
+        :param operation: what is being timed, e.g. "open"
+        """
+        self.operation = operation
+        # Time spent in each phase in seconds, in the order the phases started
+        self.phases: dict[str, float] = {}
+        # Time for the whole operation in seconds; None until it has finished
+        self.total: float | None = None
+        self.failed = False
+
+    @contextmanager
+    def measure_total(self) -> Generator[None, None, None]:
+        """
+        Time the whole operation, including anything not in a phase.
+        """
+        start = monotonic()
+        try:
+            yield
+        except BaseException:
+            self.failed = True
+            raise
+        finally:
+            self.total = monotonic() - start
+
+    @contextmanager
+    def phase(self, name: str) -> Generator[None, None, None]:
+        """
+        Time a phase of the operation. Time spent in a phase entered more than once is added up.
+
+        :param name: name of the phase
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + monotonic() - start
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        :return: the timings as a JSON serialisable dictionary
+        """
+        return {
+            "total": self.total,
+            "failed": self.failed,
+            "phases": dict(self.phases),
+        }
+
+
+class LaunchTimingRegister:
+    """
+    A way of collecting the launch timings of a run.
+    """
+
+    # Static list of the timings of each open and close
+    Records: ClassVar[list[dict[str, Any]]] = []
+
+    @classmethod
+    def add_record(
+        cls,
+        test_module: str,
+        kind: str,
+        device: str,
+        timer: PhaseTimer,
+        details: dict[str, Any] | None = None,
+    ) -> None:
+        """
+        Add the timings of an open or close.
+
+        :param test_module: the module being tested
+        :param kind: what was launched, e.g. "ioc" or "emulator"
+        :param device: the device name
+        :param timer: the timings
+        :param details: anything else to report about the open or close, e.g. boot warnings
+        """
+        cls.Records.append(
+            {
+                "module": test_module,
+                "kind": kind,
+                "device": device,
+                "operation": timer.operation,
+                **timer.to_dict(),
+                **(details or {}),
+            }
+        )
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Forget all the timings.
+        """
+        cls.Records.clear()
+
+    @classmethod
+    def summary(cls) -> dict[str, Any]:
+        """
+        :return: total time spent in each phase and by each device, slowest first
+        """
+        by_phase: dict[str, float] = {}
+        by_device: dict[str, float] = {}
+        for record in cls.Records:
+            device = f"{record['kind']} {record['device']}"
+            by_device[device] = by_device.get(device, 0.0) + (record["total"] or 0.0)
+            for phase, duration in record["phases"].items():
+                key = f"{record['kind']} {record['operation']}: {phase}"
+                by_phase[key] = by_phase.get(key, 0.0) + duration
+        return {
+            "by_phase": dict(sorted(by_phase.items(), key=lambda item: -item[1])),
+            "by_device": dict(sorted(by_device.items(), key=lambda item: -item[1])),
+        }
+
+    @classmethod
+    def write_report(cls, filename: str) -> None:
+        """
+        Write all the timings and a summary as JSON.
+
+        :param filename: the file to write
+        """
+        os.makedirs(os.path.dirname(filename) or os.curdir, exist_ok=True)
+        with open(filename, "w") as f:
+            json.dump({"summary": cls.summary(), "launches": cls.Records}, f, indent=1)
@@ -0,0 +1,214 @@
+"""
+Direct connection to the Lewis control server, returning native python values.
+
+Lewis exposes the device and simulation over JSON-RPC on a ZMQ socket. Talking to it directly avoids
+starting lewis-control for every backdoor command and keeps values as ints, floats, bools, lists
+etc. rather than their printed representation. ZMQ is optional; if it is not installed callers
+should fall back to lewis-control, see parse_backdoor_value.
+"""
+
+import ast
+import json
+import threading
+import uuid
+from enum import Enum
+from typing import Any
+
+import numpy as np
+
+from utils.emulator_exceptions import EmulatorBackdoorException, UnableToConnectToEmulatorException
+
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+# JSON-RPC error code for an unknown method
+_METHOD_NOT_FOUND = -32601
+
+
+def parse_backdoor_value(text: str) -> Any:  # noqa: ANN401
+    """
+    Convert a value printed by lewis-control back into a python value.
+
+    Values which are python literals (numbers, bools, None, lists, dicts, quoted strings) are
+    evaluated, numpy style arrays such as "[1. 2. 3.]" become numpy arrays and anything else is
+    returned as the original string. Note that this can not tell a string property which happens to
+    look like a number from a number; the control server connection does not have this problem.
+
+    Args:
+        text: the text printed by lewis-control
+    Returns:
+        the value
+    """
+    stripped = text.strip()
+    if stripped == "":
+        return None
+    try:
+        return ast.literal_eval(stripped)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        pass
+    if stripped.startswith("[") and stripped.endswith("]"):
+        try:
+            return np.array(stripped[1:-1].split(), dtype=float)
+        except ValueError:
+            pass
+    return text
+
+
+def _to_json(value: Any) -> Any:  # noqa: ANN401
+    """
+    Convert a value json can not serialise itself, for use as json.dumps(default=...).
+
+    Args:
+        value: the value, e.g. a numpy scalar or array or an Enum member
+    Returns:
+        the equivalent value json can serialise
+    Raises:
+        TypeError: if there is no equivalent
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"{type(value).__name__} can not be sent to the lewis control server")
+
+
+class LewisControlConnection:
+    """
+    A persistent connection to a Lewis control server.
+    """
+
+    def __init__(self, emulator_name: str, host: str, port: int | str, timeout: float = 3) -> None:
+        """
+        Args:
+            emulator_name: name of the emulator, used in error messages
+            host: host the control server is listening on
+            port: port the control server is listening on
+            timeout: time to wait for a reply in seconds
+        """
+        if zmq is None:
+            raise ImportError("pyzmq is needed to connect to the lewis control server directly")
+        self._emulator_name = emulator_name
+        self._connection_string = f"tcp://{host}:{port}"
+        self._timeout_ms = int(timeout * 1000)
+        self._context = zmq.Context.instance()
+        self._socket = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Returns: True if a direct connection can be made, i.e. pyzmq is installed
+        """
+        return zmq is not None
+
+    def _get_socket(self) -> "zmq.Socket":
+        if self._socket is None:
+            self._socket = self._context.socket(zmq.REQ)
+            self._socket.setsockopt(zmq.SNDTIMEO, self._timeout_ms)
+            self._socket.setsockopt(zmq.RCVTIMEO, self._timeout_ms)
+            self._socket.setsockopt(zmq.LINGER, 0)
+            self._socket.connect(self._connection_string)
+        return self._socket
+
+    def _reset_socket(self) -> None:
+        # A REQ socket which did not get a reply can not send again, so start a new one
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def request(self, method: str, *args: Any) -> Any:  # noqa: ANN401
+        """
+        Make a JSON-RPC request.
+
+        Args:
+            method: the remote method, e.g. "device.temperature:get"
+            args: arguments to the method
+        Returns:
+            the result of the call
+        Raises:
+            UnableToConnectToEmulatorException: if there was no reply in time
+            EmulatorBackdoorException: if the arguments can not be sent or the call failed on the
+                server
+        """
+        request_id = str(uuid.uuid4())
+        message = {"method": method, "params": args, "jsonrpc": "2.0", "id": request_id}
+        try:
+            request = json.dumps(message, default=_to_json)
+        except (TypeError, ValueError) as e:
+            raise EmulatorBackdoorException(self._emulator_name, f"{method} not sent: {e}")
+        with self._lock:
+            try:
+                socket = self._get_socket()
+                socket.send_string(request)
+                response = json.loads(socket.recv_string())
+            except zmq.error.ZMQError as e:
+                self._reset_socket()
+                raise UnableToConnectToEmulatorException(self._emulator_name, e)
+
+        if response.get("id") != request_id:
+            raise EmulatorBackdoorException(
+                self._emulator_name, f"reply to {method} did not match the request"
+            )
+        if "error" in response:
+            error = response["error"]
+            data = error.get("data", {})
+            reason = data.get("message", error.get("message"))
+            raise EmulatorBackdoorException(
+                self._emulator_name,
+                f"{method} failed: {data.get('type', '')} {reason}",
+                code=error.get("code"),
+            )
+        return response.get("result")
+
+    def get(self, obj: str, member: str) -> Any:  # noqa: ANN401
+        """
+        Get a member of a remote object, as `lewis-control obj member` would. If the member is a
+        method it is called.
+
+        Args:
+            obj: the object name, e.g. "device"
+            member: the property or method name
+        Returns:
+            the value
+        """
+        try:
+            return self.request(f"{obj}.{member}:get")
+        except EmulatorBackdoorException as e:
+            if e.code != _METHOD_NOT_FOUND:
+                raise
+        return self.request(f"{obj}.{member}")
+
+    def set(self, obj: str, member: str, value: Any) -> None:  # noqa: ANN401
+        """
+        Set a property of a remote object.
+
+        Args:
+            obj: the object name, e.g. "device"
+            member: the property name
+            value: the value to set
+        """
+        self.request(f"{obj}.{member}:set", value)
+
+    def call(self, obj: str, function: str, *args: Any) -> Any:  # noqa: ANN401
+        """
+        Call a method of a remote object.
+
+        Args:
+            obj: the object name, e.g. "device"
+            function: the method name
+            args: arguments to the method
+        Returns:
+            the value returned by the method
+        """
+        return self.request(f"{obj}.{function}", *args)
+
+    def close(self) -> None:
+        """
+        Close the connection.
+        """
+        with self._lock:
+            self._reset_socket()
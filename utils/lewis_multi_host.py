@@ -0,0 +1,88 @@
+"""
+Host several Lewis emulated devices in a single process (see SharedProcessMultiLewisLauncher).
+
+This script is run with the Lewis python, not the test framework python, so it must only depend on
+the standard library and Lewis. Each device gets its own simulation, running in its own thread and
+listening on its own port, and all of them are exposed through one control server. For a device
+added with address ADDRESS the control server objects are called ``device_ADDRESS``,
+``simulation_ADDRESS`` and ``interface_ADDRESS``, e.g.::
+
+    lewis-control -r 127.0.0.1:10000 device_2 temperature
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host several Lewis devices in one process")
+    parser.add_argument("-r", "--rpc-host", required=True, help="HOST:PORT for the control server")
+    parser.add_argument("-a", "--add-path", default=None, help="Path to add to sys.path")
+    parser.add_argument("-k", "--device-package", default="lewis_emulators")
+    parser.add_argument("-p", "--protocol", default="stream", help="Protocol for all devices")
+    parser.add_argument("-e", "--speed", type=float, default=1.0, help="Simulation speed")
+    parser.add_argument(
+        "-d",
+        "--device",
+        nargs=3,
+        action="append",
+        required=True,
+        metavar=("ADDRESS", "DEVICE", "PORT"),
+        help="A device to host: its address, the lewis device name and the port to listen on",
+    )
+    arguments = parser.parse_args()
+
+    if arguments.add_path:
+        sys.path.append(os.path.abspath(arguments.add_path))
+
+    from lewis.core.control_server import ControlServer, ExposedObject
+    from lewis.core.simulation import SimulationFactory
+
+    factory = SimulationFactory(arguments.device_package)
+
+    simulations = []
+    object_map = {}
+    for address, device, port in arguments.device:
+        simulation = factory.create(
+            device,
+            protocols={arguments.protocol: {"bind_address": "127.0.0.1", "port": int(port)}},
+        )
+        simulation.speed = arguments.speed
+        simulations.append(simulation)
+
+        object_map[f"device_{address}"] = ExposedObject(
+            simulation._device, exclude_inherited=True, lock=simulation._adapters.device_lock
+        )
+        object_map[f"simulation_{address}"] = ExposedObject(
+            simulation, exclude=("start", "control_server", "log"), exclude_inherited=True
+        )
+        object_map[f"interface_{address}"] = ExposedObject(
+            simulation._adapters,
+            exclude=("device_lock", "add_adapter", "remove_adapter", "handle", "log"),
+            exclude_inherited=True,
+        )
+        print(f"Hosting device {device} with address {address} on port {port}", flush=True)
+
+    threads = [
+        threading.Thread(target=simulation.start, name=f"simulation {address}", daemon=True)
+        for simulation, (address, _, _) in zip(simulations, arguments.device)
+    ]
+    for thread in threads:
+        thread.start()
+
+    control_server = ControlServer(object_map, arguments.rpc_host)
+    control_server.start_server()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            control_server.process(blocking=True)
+    except KeyboardInterrupt:
+        print("Interrupt received; shutting down.", flush=True)
+    finally:
+        for simulation in simulations:
+            simulation.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Worker process for the Lewis interpreter pool (see utils/emulator_pool.py).
+
+This script is run with the Lewis python, not the test framework python, so it must only depend on
+the standard library and Lewis. On start up it imports Lewis and the whole emulator package and then
+waits, idle, for a single JSON request on stdin of the form::
+
+    {"arguments": ["-r", "127.0.0.1:1234", "-p", "stream: {...}", ..., "device"],
+     "log_file": "path/to/lewis.log"}
+
+It then redirects its output to the log file and runs the simulation exactly as `python -m lewis`
+would with the given arguments.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+READY_MESSAGE = "LEWIS POOL WORKER READY"
+
+
+def _redirect_output(log_file_name: str) -> None:
+    """
+    Send everything written to stdout and stderr, including from C extensions, to the log file.
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    log_file = open(log_file_name, "a")  # noqa: SIM115
+    os.dup2(log_file.fileno(), sys.stdout.fileno())
+    os.dup2(log_file.fileno(), sys.stderr.fileno())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-started Lewis interpreter for the test pool")
+    parser.add_argument("-a", "--add-path", default=None, help="Path to add to sys.path")
+    parser.add_argument("-k", "--device-package", default="lewis_emulators")
+    arguments = parser.parse_args()
+
+    if arguments.add_path is not None:
+        sys.path.append(os.path.abspath(arguments.add_path))
+
+    from lewis.core.simulation import SimulationFactory
+    from lewis.scripts.run import run_simulation
+
+    # Creating the factory imports every device in the package, which is the slow part of startup
+    SimulationFactory(arguments.device_package)
+
+    print(READY_MESSAGE, flush=True)
+
+    request_line = sys.stdin.readline()
+    if not request_line:
+        return  # pool was closed without the worker being claimed
+
+    request = json.loads(request_line)
+    _redirect_output(request["log_file"])
+    print("Lewis pool worker running with '{}'".format(" ".join(request["arguments"])), flush=True)
+    run_simulation(request["arguments"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+"""
+Archiving the logs of a run, compressed and indexed so that what was logged during a test can be
+found without decompressing whole logs.
+
+At the end of a run with --archive-logs, see run_tests, the IOC and emulator logs written by the run
+are compressed into a directory for the run under archive/ in the log directory, and emptied. Each
+log is compressed in blocks of lines, written one after another as gzip members of one file, so the
+file is still an ordinary gzip file. The run's index.json gives for each block where it is in the
+file, its line numbers and the times it covers, and the start and end of every test. To print what
+every device logged during a test, in time order::
+
+    python -m utils.log_archive query --test test_WHEN_disconnected logs/IOCTestFramework/archive
+
+The time of a line is from a timestamp at its start if it has one, otherwise when the log tail
+service read it during the run, otherwise the time of the line before.
+"""
+
+import argparse
+import bisect
+import gzip
+import heapq
+import json
+import os
+import re
+import sys
+from collections.abc import Iterator
+from datetime import datetime
+from time import time
+from typing import Any, ClassVar
+
+from utils.log_tail import LogArrivalRegister
+
+# Directory in the log directory for the archives of runs
+ARCHIVE_DIRECTORY = "archive"
+
+# File in the archive of a run indexing it
+INDEX_FILE = "index.json"
+
+# File in the archive directory recording how much of each log has been archived, if it could
+# not be emptied
+ARCHIVED_OFFSETS_FILE = "archived_offsets.json"
+
+# Uncompressed bytes of a log in each compressed block
+ARCHIVE_BLOCK_SIZE = 256 * 1024
+
+# Most time in seconds between the times kept in the index for the lines of a block
+INDEX_TIME_RESOLUTION = 1.0
+
+# Logs written by a run which are archived, see log_filename; other files in the log directory,
+# such as stream recordings, are needed by later runs and left alone
+ARCHIVED_LOG = re.compile(
+    r"^log_(?P<test_module>.+?)_(?P<sim>recsim|devsim|nosim)_(?P<device>.+)_"
+    r"(?P<what>ioc|lewis|cmdemulator)\.log$"
+)
+
+# A timestamp near the start of a line, e.g. 2024/01/31 12:00:00.123 or 2024-01-31T12:00:00,123
+_TIMESTAMP = re.compile(
+    r"(\d{4})[-/](\d{2})[-/](\d{2})[ T](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?"
+)
+
+# Characters at the start of a line to look for a timestamp in
+_TIMESTAMP_SEARCH_LENGTH = 64
+
+
+class TestTimeline:
+    """
+    The start and end times of the tests in the run, to find the lines logged during a test.
+    """
+
+    Tests: ClassVar[list[dict[str, Any]]] = []
+
+    @classmethod
+    def start_test(cls, test_id: str) -> None:
+        """
+        :param test_id: the id of the test which is starting
+        """
+        cls.Tests.append({"test": test_id, "start": time(), "end": None})
+
+    @classmethod
+    def stop_test(cls, test_id: str) -> None:
+        """
+        :param test_id: the id of the test which has finished
+        """
+        for test in reversed(cls.Tests):
+            if test["test"] == test_id and test["end"] is None:
+                test["end"] = time()
+                return
+
+    @classmethod
+    def clear(cls) -> None:
+        """
+        Forget the tests.
+        """
+        cls.Tests.clear()
+
+
+def line_time(line: str) -> float | None:
+    """
+    :param line: a line of a log
+    :return: the time of the timestamp near the start of the line, in seconds since the epoch; None
+        if it has none
+    """
+    match = _TIMESTAMP.search(line, 0, _TIMESTAMP_SEARCH_LENGTH)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        stamp = datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            int((fraction or "0").ljust(6, "0")),
+        )
+    except ValueError:
+        return None
+    return stamp.timestamp()
+
+
+class _ArrivalTimes:
+    """
+    When the bytes of a log arrived, from the marks of the log tail service.
+    """
+
+    def __init__(self, marks: list[tuple[int, float]]) -> None:
+        self._offsets = [offset for offset, _ in marks]
+        self._times = [when for _, when in marks]
+
+    def time_at(self, offset: int) -> float | None:
+        """
+        :param offset: a byte offset in the log
+        :return: the time by which the log had been written up to the offset; None if not known
+        """
+        index = bisect.bisect_left(self._offsets, offset)
+        return self._times[index] if index < len(self._times) else None
+
+
+class _BlockWriter:
+    """
+    Writes the lines of a log to a compressed archive in blocks, indexing them.
+    """
+
+    def __init__(self, archive: Any) -> None:  # noqa: ANN401
+        self._archive = archive
+        self.blocks: list[dict[str, Any]] = []
+        self._lines: list[bytes] = []
+        self._size = 0
+        self._times: list[list[float]] = []
+        self._first_line = 0
+        self._start: float | None = None
+        self._end: float | None = None
+
+    def add(self, line: bytes, when: float | None) -> None:
+        index = len(self._lines)
+        self._lines.append(line)
+        self._size += len(line)
+        if when is not None:
+            if self._start is None or when < self._start:
+                self._start = when
+            if self._end is None or when > self._end:
+                self._end = when
+            if not self._times or abs(when - self._times[-1][1]) >= INDEX_TIME_RESOLUTION:
+                self._times.append([index, when])
+        if self._size >= ARCHIVE_BLOCK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._lines:
+            return
+        data = gzip.compress(b"".join(self._lines))
+        self.blocks.append(
+            {
+                "offset": self._archive.tell(),
+                "length": len(data),
+                "first_line": self._first_line,
+                "lines": len(self._lines),
+                "start": self._start,
+                "end": self._end,
+                "times": self._times,
+            }
+        )
+        self._archive.write(data)
+        self._first_line += len(self._lines)
+        self._lines = []
+        self._size = 0
+        self._times = []
+        self._start = None
+        self._end = None
+
+
+def _archive_log(path: str, start: int, archive_path: str) -> tuple[list[dict[str, Any]], int]:
+    """
+    :param path: the log
+    :param start: the byte offset to archive from
+    :param archive_path: the compressed file to write
+    :return: the index of the blocks written, and the byte offset archived up to
+    """
+    arrival = _ArrivalTimes(LogArrivalRegister.marks(os.path.abspath(path)))
+    with open(path, "rb") as log, open(archive_path, "wb") as archive:
+        log.seek(start)
+        writer = _BlockWriter(archive)
+        offset = start
+        previous_time = None
+        for line in log:
+            offset += len(line)
+            when = line_time(line[:_TIMESTAMP_SEARCH_LENGTH].decode("utf-8", errors="replace"))
+            if when is None:
+                when = arrival.time_at(offset)
+            if when is None:
+                when = previous_time
+            previous_time = when
+            writer.add(line, when)
+        writer.flush()
+    return writer.blocks, offset
+
+
+def _empty_log(path: str) -> bool:
+    """
+    :param path: the log
+    :return: True if the log was emptied; it can not be while another process has it open on
+        Windows
+    """
+    try:
+        with open(path, "r+b") as log:
+            log.truncate(0)
+    except OSError:
+        return False
+    return True
+
+
+def _run_directory(archive_dir: str, when: float) -> str:
+    name = datetime.fromtimestamp(when).strftime("run_%Y%m%d_%H%M%S")
+    run_dir = os.path.join(archive_dir, name)
+    suffix = 1
+    while os.path.exists(run_dir):
+        suffix += 1
+        run_dir = os.path.join(archive_dir, f"{name}_{suffix}")
+    return run_dir
+
+
+def archive_logs(log_dir: str, tests: list[dict[str, Any]]) -> str | None:
+    """
+    Archive what the IOCs and emulators have written to their logs since the last archive, and
+    empty the logs.
+
+    :param log_dir: the directory of the logs
+    :param tests: the start and end times of the tests in the run, see TestTimeline
+    :return: the directory of the archive of the run; None if nothing had been logged
+    """
+    archive_dir = os.path.join(log_dir, ARCHIVE_DIRECTORY)
+    offsets_file = os.path.join(archive_dir, ARCHIVED_OFFSETS_FILE)
+    try:
+        with open(offsets_file) as f:
+            archived_offsets: dict[str, int] = json.load(f)
+    except (OSError, ValueError):
+        archived_offsets = {}
+
+    now = time()
+    run_dir = _run_directory(archive_dir, now)
+    logs = []
+    for name in sorted(os.listdir(log_dir)):
+        match = ARCHIVED_LOG.match(name)
+        path = os.path.join(log_dir, name)
+        if match is None or not os.path.isfile(path):
+            continue
+        start = archived_offsets.pop(name, 0)
+        if start > os.path.getsize(path):
+            start = 0
+        if start == os.path.getsize(path):
+            archived_offsets[name] = start
+            continue
+
+        os.makedirs(run_dir, exist_ok=True)
+        archive_name = f"{name}.gz"
+        blocks, end = _archive_log(path, start, os.path.join(run_dir, archive_name))
+        LogArrivalRegister.clear(os.path.abspath(path))
+        if not _empty_log(path):
+            archived_offsets[name] = end
+        logs.append({"log": name, "archive": archive_name, **match.groupdict(), "blocks": blocks})
+
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(offsets_file, "w") as f:
+        json.dump(archived_offsets, f, indent=2)
+    if not logs:
+        return None
+
+    index = {"archived": now, "tests": tests, "logs": logs}
+    with open(os.path.join(run_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    return run_dir
+
+
+def archived_runs(archive_dir: str) -> list[str]:
+    """
+    :param archive_dir: the archive directory
+    :return: the directories of the archived runs, oldest first
+    """
+    runs = [
+        os.path.join(archive_dir, name)
+        for name in os.listdir(archive_dir)
+        if os.path.isfile(os.path.join(archive_dir, name, INDEX_FILE))
+    ]
+    return sorted(runs, key=os.path.getmtime)
+
+
+def load_index(run_dir: str) -> dict[str, Any]:
+    """
+    :param run_dir: the directory of an archived run
+    :return: its index
+    """
+    with open(os.path.join(run_dir, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def _block_lines(run_dir: str, log: dict[str, Any], block: dict[str, Any]) -> list[bytes]:
+    with open(os.path.join(run_dir, log["archive"]), "rb") as archive:
+        archive.seek(block["offset"])
+        data = gzip.decompress(archive.read(block["length"]))
+    return data.splitlines(keepends=True)
+
+
+def _lines_between(
+    run_dir: str, log: dict[str, Any], start: float, end: float
+) -> Iterator[tuple[float, str]]:
+    """
+    :return: the time and text of each line of a log between two times, without decompressing
+        blocks outside them
+    """
+    for block in log["blocks"]:
+        if block["start"] is None or block["end"] < start or block["start"] > end:
+            continue
+        times = block["times"]
+        next_time = 0
+        when = block["start"]
+        for index, line in enumerate(_block_lines(run_dir, log, block)):
+            if next_time < len(times) and times[next_time][0] == index:
+                when = times[next_time][1]
+                next_time += 1
+            if start <= when <= end:
+                yield when, line.decode("utf-8", errors="replace").rstrip("\r\n")
+
+
+def _labelled_lines_between(
+    run_dir: str, log: dict[str, Any], start: float, end: float
+) -> Iterator[tuple[float, str, str]]:
+    source = f"{log['device']} {log['what']}"
+    for when, line in _lines_between(run_dir, log, start, end):
+        yield when, source, line
+
+
+def query(
+    run_dir: str, test: str, devices: list[str] | None = None, margin: float = 1.0
+) -> Iterator[tuple[dict[str, Any], Iterator[tuple[float, str, str]]]]:
+    """
+    Find the lines logged during tests.
+
+    :param run_dir: the directory of an archived run
+    :param test: part of the id of the tests
+    :param devices: the devices whose logs to search; None for all of them
+    :param margin: seconds before and after each test to include
+    :return: for each test, the test and its lines from all the logs in time order, as the time,
+        the device and kind of log, and the line
+    """
+    index = load_index(run_dir)
+    logs = [log for log in index["logs"] if devices is None or log["device"] in devices]
+    for found in index["tests"]:
+        if test not in found["test"]:
+            continue
+        start = found["start"] - margin
+        end = (found["end"] if found["end"] is not None else index["archived"]) + margin
+        streams = [_labelled_lines_between(run_dir, log, start, end) for log in logs]
+        yield found, heapq.merge(*streams, key=lambda entry: entry[0])
+
+
+def _format_time(when: float) -> str:
+    return datetime.fromtimestamp(when).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Command line for the log archive.
+
+    :param argv: the arguments; None for those of the process
+    :return: the exit code
+    """
+    parser = argparse.ArgumentParser(description="Look at the archived logs of test runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    runs_parser = subparsers.add_parser("runs", help="List the archived runs")
+    runs_parser.add_argument("archive_dir", help="The archive directory")
+
+    tests_parser = subparsers.add_parser("tests", help="List the tests of an archived run")
+    tests_parser.add_argument("archive_dir", help="The archive directory")
+    tests_parser.add_argument("--run", help="Name of the run (default: the latest)")
+
+    query_parser = subparsers.add_parser(
+        "query", help="Print what every device logged during tests, in time order"
+    )
+    query_parser.add_argument("archive_dir", help="The archive directory")
+    query_parser.add_argument("--run", help="Name of the run (default: the latest)")
+    query_parser.add_argument("--test", required=True, help="Part of the id of the tests")
+    query_parser.add_argument(
+        "--device", action="append", help="Only logs of this device (can be repeated)"
+    )
+    query_parser.add_argument(
+        "--margin",
+        type=float,
+        default=1.0,
+        help="Seconds before and after each test to include (default: 1)",
+    )
+
+    arguments = parser.parse_args(argv)
+    runs = archived_runs(arguments.archive_dir)
+    if arguments.command == "runs":
+        for run_dir in runs:
+            index = load_index(run_dir)
+            print(
+                f"{os.path.basename(run_dir)}: {len(index['tests'])} tests, "
+                f"{len(index['logs'])} logs"
+            )
+        return 0
+
+    if arguments.run is not None:
+        run_dir = os.path.join(arguments.archive_dir, arguments.run)
+    elif runs:
+        run_dir = runs[-1]
+    else:
+        print(f"No archived runs in {arguments.archive_dir}", file=sys.stderr)
+        return 1
+
+    if arguments.command == "tests":
+        for found in load_index(run_dir)["tests"]:
+            end = _format_time(found["end"]) if found["end"] is not None else "not finished"
+            print(f"{_format_time(found['start'])} - {end}  {found['test']}")
+        return 0
+
+    found_any = False
+    for found, lines in query(run_dir, arguments.test, arguments.device, arguments.margin):
+        found_any = True
+        print(f"=== {found['test']}")
+        for when, source, line in lines:
+            print(f"{_format_time(when)} {source}: {line}")
+    if not found_any:
+        print(f"No tests matching '{arguments.test}' in {run_dir}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
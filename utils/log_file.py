@@ -1,6 +1,8 @@
 import os
-from time import sleep
+from time import monotonic
 
+from utils.boot_scanner import BootScanner, BootScanResult
+from utils.log_tail import LogTailService
 from utils.test_modes import TestModes
 
 # Directory for log files
@@ -36,14 +38,56 @@ def log_filename(test_name: str, what: str, device: str, test_mode: TestModes, v
     )
 
 
+def tail_log_file(filename: str, max_lines: int = 20, max_bytes: int = 8192) -> list[str]:
+    """
+    Reads the last few lines of a log file, e.g. to report why a process died.
+
+    :param filename: the log file to read
+    :param max_lines: the maximum number of lines to return
+    :param max_bytes: the maximum number of bytes to read from the end of the file
+    :return: the last lines of the file; empty if the file can not be read
+    """
+    try:
+        with open(filename, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read()
+    except OSError:
+        return []
+
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    if size > max_bytes and lines:
+        # The first line is probably partial
+        lines = lines[1:]
+    return lines[-max_lines:]
+
+
 class LogFileManager:
     """
     Class to manage the access of log files
     """
 
     def __init__(self, filename: str, write_mode: str = "w") -> None:
+        """
+        Args:
+            filename (str): The log file
+            write_mode (str): The mode to open the log for writing in; only what is written after
+                opening it is read back
+        """
+        self.filename = filename
         self.log_file_w = open(filename, write_mode, 1)  # noqa: SIM115
-        self.log_file_r = open(filename, "r")  # noqa: SIM115
+        # Lines are read by the service tailing all logs of the run
+        self._log = LogTailService.shared().subscribe(filename)
+
+    @property
+    def partial_line(self) -> str:
+        """
+        Returns:
+            the text after the last complete line read, e.g. a prompt; it is returned by read_log
+                once the line is complete
+        """
+        return self._log.partial_line
 
     def read_log(self) -> list[str]:
         """
@@ -52,16 +96,19 @@ class LogFileManager:
         Returns:
             new_messages (list): list of any new messages that have been received
         """
-        new_messages = []
-        while True:
-            where = self.log_file_r.tell()
-            mess = self.log_file_r.readline()
-            if not mess:
-                self.log_file_r.seek(where)
-                break
-            new_messages.append(mess)
+        return self._log.read_lines()
+
+    def wait_for_output(self, timeout: float) -> bool:
+        """
+        Waits for anything new to be written to the log, including part of a line.
 
-        return new_messages
+        Args:
+            timeout (float): The most time to wait. (seconds)
+
+        Returns:
+            bool: True if there is new output to read
+        """
+        return self._log.wait_for_output(timeout)
 
     def wait_for_console(self, timeout: int, ioc_started_text: str) -> None:
         """
@@ -71,26 +118,42 @@ class LogFileManager:
             timeout (int): How long to wait before we assume the ioc has not started. (seconds)
             ioc_started_text (str): Text to look for in ioc log to indicate that the ioc has started
         """
-        for i in range(timeout):
-            new_messages = self.read_log()
-
-            # uncomment for extra diagnostics
-            # message_with_newline = [new_message.rstrip("\r\n") for new_message in new_messages]
-            # print("    {}s: '{}'".format(i, "'\n       '".join(message_with_newline)))
-
-            if any(ioc_started_text in line for line in new_messages):
-                break
-
-            sleep(1)
-        else:
+        result = self.wait_for_boot(timeout, BootScanner.for_started_text(ioc_started_text))
+        if not result.succeeded:
             raise AssertionError(
                 f"IOC appears not to have started after {timeout} "
                 f"seconds. Looking for '{ioc_started_text}'"
             )
 
+    def wait_for_boot(self, timeout: float, scanner: BootScanner) -> BootScanResult:
+        """
+        Scans new lines of the log until the ioc has either started or failed to boot.
+
+        Args:
+            timeout (float): How long to wait before we assume the ioc has not started. (seconds)
+            scanner (BootScanner): The patterns to look for
+
+        Returns:
+            BootScanResult: what was found; neither succeeded nor failed if the timeout passed
+        """
+        result = BootScanResult()
+        deadline = monotonic() + timeout
+        while True:
+            scanner.scan(self.read_log(), result)
+            partial_line = self.partial_line
+            if not result.finished and partial_line:
+                # e.g. a prompt waiting for input, which will not be a complete line until then
+                waiting = scanner.scan([partial_line], BootScanResult())
+                result.success_line = waiting.success_line
+                result.failure_line = waiting.failure_line
+            remaining = deadline - monotonic()
+            if result.finished or remaining <= 0:
+                return result
+            self.wait_for_output(remaining)
+
     def close(self) -> None:
         """
         Returns: close the log file
         """
-        self.log_file_r.close()
+        self._log.close()
         self.log_file_w.close()
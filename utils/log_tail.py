@@ -0,0 +1,407 @@
+"""
+A single service tailing all the log files of a run, e.g. those of the IOCs.
+
+One background thread reads every watched log as it grows, splitting it into lines once and
+publishing them to each subscriber to that log, e.g.::
+
+    log = LogTailService.shared().subscribe(log_file_name)
+    log.wait_for_output(timeout=5)
+    for line in log.read_lines():
+        ...
+    log.close()
+
+The thread is woken by file system notifications (inotify on Linux, ReadDirectoryChangesW on
+Windows) if watchdog is installed, and otherwise polls the logs. Either way reading a subscription
+first catches up with the log, so it returns everything written before it was called.
+"""
+
+import os
+import threading
+from collections import deque
+from time import time
+from typing import ClassVar
+
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# Bytes to read from a log at a time
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Time in seconds between checks of the logs for new output without file system notifications
+LOG_TAIL_POLL_INTERVAL = 0.1
+
+# Time in seconds between checks of the logs with file system notifications, in case one is missed
+NOTIFIED_LOG_TAIL_POLL_INTERVAL = 1.0
+
+# Most time in seconds covered by one mark of when output arrived in a log
+ARRIVAL_MARK_INTERVAL = 1.0
+
+
+class LogArrivalRegister:
+    """
+    When output was read from each log, as marks of (byte offset, time) meaning the file up to the
+    offset had been written by the time. The marks are kept after the log stops being watched, so
+    that lines without timestamps can be placed in time when the logs are archived at the end of
+    the run, see log_archive.
+    """
+
+    Marks: ClassVar[dict[str, list[tuple[int, float]]]] = {}
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def record(cls, filename: str, offset: int, when: float) -> None:
+        """
+        :param filename: the absolute path of the log
+        :param offset: the byte offset in the file read up to
+        :param when: the time it was read
+        """
+        with cls._lock:
+            marks = cls.Marks.setdefault(filename, [])
+            if marks and offset < marks[-1][0]:
+                # Truncated or replaced; the earlier offsets are in a different file
+                marks.clear()
+            if marks and when - marks[-1][1] < ARRIVAL_MARK_INTERVAL:
+                marks[-1] = (offset, marks[-1][1])
+            else:
+                marks.append((offset, when))
+
+    @classmethod
+    def marks(cls, filename: str) -> list[tuple[int, float]]:
+        """
+        :param filename: the absolute path of the log
+        :return: the marks for the log, in order
+        """
+        with cls._lock:
+            return list(cls.Marks.get(filename, []))
+
+    @classmethod
+    def clear(cls, filename: str | None = None) -> None:
+        """
+        :param filename: the absolute path of the log to forget; None for all logs
+        """
+        with cls._lock:
+            if filename is None:
+                cls.Marks.clear()
+            else:
+                cls.Marks.pop(filename, None)
+
+
+class LogReader:
+    """
+    Reads the lines added to a log file, following it if it is truncated or replaced.
+    """
+
+    def __init__(self, filename: str, offset: int = 0) -> None:
+        """
+        :param filename: the log file, which must exist
+        :param offset: the byte offset in the file to start reading from
+        """
+        self.filename = filename
+        self._file = open(filename, "rb")  # noqa: SIM115
+        # Byte offset in the file up to which it has been read
+        self.offset = offset
+        # The end of the file read so far which is not yet a complete line
+        self._partial = b""
+
+    @property
+    def partial_line(self) -> str:
+        """
+        :return: the text after the last complete line read, e.g. a prompt
+        """
+        return self._partial.decode("utf-8", errors="replace")
+
+    def read_lines(self, end: int | None = None) -> tuple[list[str], bool]:
+        """
+        Read the complete lines added to the file since the last read.
+
+        :param end: the byte offset to stop reading at; None to read to the end of the file
+        :return: the lines, and whether anything at all was read
+        """
+        self._follow_truncation_and_rotation()
+        self._file.seek(self.offset)
+        chunks = []
+        while end is None or self.offset < end:
+            size = READ_CHUNK_SIZE if end is None else min(READ_CHUNK_SIZE, end - self.offset)
+            chunk = self._file.read(size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.offset += len(chunk)
+        if not chunks:
+            return [], False
+
+        *lines, self._partial = (self._partial + b"".join(chunks)).split(b"\n")
+        return [line.rstrip(b"\r").decode("utf-8", errors="replace") + "\n" for line in lines], True
+
+    def _follow_truncation_and_rotation(self) -> None:
+        """
+        Start reading from the beginning again if the log has been truncated, or replaced by a new
+        file of the same name.
+        """
+        try:
+            on_disk = os.stat(self.filename)
+        except OSError:
+            # Moved away and not yet replaced; carry on with the file we have
+            return
+        reading = os.fstat(self._file.fileno())
+        if (on_disk.st_dev, on_disk.st_ino) != (reading.st_dev, reading.st_ino):
+            self._file.close()
+            self._file = open(self.filename, "rb")  # noqa: SIM115
+            self.offset = 0
+            self._partial = b""
+        elif reading.st_size < self.offset:
+            self.offset = 0
+            self._partial = b""
+
+    def close(self) -> None:
+        """
+        Close the file.
+        """
+        self._file.close()
+
+
+class LogSubscription:
+    """
+    The lines of a log published to one subscriber since it subscribed.
+    """
+
+    def __init__(self, service: "LogTailService", filename: str) -> None:
+        """
+        :param service: the service publishing the lines
+        :param filename: the log file
+        """
+        self.filename = filename
+        self._service = service
+        self._lines: deque[str] = deque()
+        self._new_output = False
+        self._condition = threading.Condition()
+
+    def _publish(self, lines: list[str]) -> None:
+        with self._condition:
+            self._lines.extend(lines)
+            self._new_output = True
+            self._condition.notify_all()
+
+    @property
+    def partial_line(self) -> str:
+        """
+        :return: the text after the last complete line of the log, e.g. a prompt
+        """
+        return self._service.partial_line(self.filename)
+
+    def read_lines(self) -> list[str]:
+        """
+        :return: the lines written to the log since the last read
+        """
+        self._service.refresh(self.filename)
+        with self._condition:
+            lines = list(self._lines)
+            self._lines.clear()
+            self._new_output = False
+        return lines
+
+    def wait_for_output(self, timeout: float) -> bool:
+        """
+        Wait for anything to be written to the log since the last read, including part of a line.
+
+        :param timeout: the most time in seconds to wait
+        :return: True if there is new output
+        """
+        with self._condition:
+            found = self._condition.wait_for(lambda: self._new_output, timeout)
+            self._new_output = False
+            return found
+
+    def close(self) -> None:
+        """
+        Stop receiving lines.
+        """
+        self._service.unsubscribe(self)
+
+
+class _WatchedLog:
+    def __init__(self, reader: LogReader) -> None:
+        self.reader = reader
+        self.subscriptions: list[LogSubscription] = []
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        with self.lock:
+            if self.subscriptions:
+                self.publish_new_lines()
+
+    def publish_new_lines(self) -> None:
+        # Call with the lock held
+        try:
+            lines, read = self.reader.read_lines()
+        except OSError:
+            return
+        if read:
+            LogArrivalRegister.record(self.reader.filename, self.reader.offset, time())
+            for subscription in self.subscriptions:
+                subscription._publish(lines)
+
+
+class _LogChangeHandler(FileSystemEventHandler):
+    def __init__(self, service: "LogTailService") -> None:
+        self._service = service
+
+    def on_any_event(self, event: "FileSystemEvent") -> None:
+        paths = {event.src_path, getattr(event, "dest_path", "")}
+        if any(os.path.abspath(path) in self._service.watched() for path in paths if path):
+            self._service.wake()
+
+
+class LogTailService:
+    """
+    Tails the logs which have subscribers on a single background thread.
+    """
+
+    _shared: ClassVar["LogTailService | None"] = None
+    _shared_lock: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, use_notifications: bool = True) -> None:
+        """
+        :param use_notifications: whether to use file system notifications, if watchdog is
+            installed, rather than only polling
+        """
+        self._logs: dict[str, _WatchedLog] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._observer = None
+        self._observed_directories: set[str] = set()
+        self._poll_interval = LOG_TAIL_POLL_INTERVAL
+        if use_notifications and Observer is not None:
+            self._observer = Observer()
+            self._observer.start()
+            self._poll_interval = NOTIFIED_LOG_TAIL_POLL_INTERVAL
+        self._thread = threading.Thread(target=self._run, name="log tail", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def shared(cls) -> "LogTailService":
+        """
+        :return: the service shared by everything reading logs during the run
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = LogTailService()
+            return cls._shared
+
+    def subscribe(self, filename: str, start: int | None = None) -> LogSubscription:
+        """
+        Start receiving the lines of a log.
+
+        :param filename: the log file, which must exist
+        :param start: the byte offset in the file of the first line to receive; None for lines
+            written from now on
+        :return: the subscription, which should be closed when finished with
+        """
+        key = os.path.abspath(filename)
+        subscription = LogSubscription(self, key)
+        with self._lock:
+            log = self._logs.get(key)
+            if log is None:
+                offset = os.path.getsize(key) if start is None else start
+                log = self._logs[key] = _WatchedLog(LogReader(key, offset))
+                self._observe(os.path.dirname(key))
+        with log.lock:
+            # Bring the other subscribers up to date, so that the new one only gets later lines
+            log.publish_new_lines()
+            if start is not None and start < log.reader.offset:
+                # Catch up with what has already been read for the other subscribers. A partial
+                # last line is left to be published when complete.
+                catch_up = LogReader(key, start)
+                try:
+                    lines, _ = catch_up.read_lines(end=log.reader.offset)
+                finally:
+                    catch_up.close()
+                subscription._publish(lines)
+            log.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: LogSubscription) -> None:
+        """
+        Stop publishing lines to a subscription, and stop watching its log if nothing else is.
+
+        :param subscription: the subscription
+        """
+        with self._lock:
+            log = self._logs.get(subscription.filename)
+            if log is None:
+                return
+            with log.lock:
+                if subscription in log.subscriptions:
+                    log.subscriptions.remove(subscription)
+                if not log.subscriptions:
+                    log.reader.close()
+                    del self._logs[subscription.filename]
+
+    def watched(self) -> set[str]:
+        """
+        :return: the absolute paths of the logs being watched
+        """
+        with self._lock:
+            return set(self._logs)
+
+    def partial_line(self, filename: str) -> str:
+        """
+        :param filename: a watched log file
+        :return: the text after the last complete line of the log
+        """
+        log = self._logs.get(os.path.abspath(filename))
+        if log is None:
+            return ""
+        with log.lock:
+            return log.reader.partial_line
+
+    def refresh(self, filename: str) -> None:
+        """
+        Read a log now, publishing its new lines to all its subscribers.
+
+        :param filename: the log file
+        """
+        log = self._logs.get(os.path.abspath(filename))
+        if log is not None:
+            log.refresh()
+
+    def wake(self) -> None:
+        """
+        Check the logs for new output now rather than at the next poll.
+        """
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """
+        Stop the service.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        with self._lock:
+            for log in self._logs.values():
+                log.reader.close()
+            self._logs.clear()
+
+    def _observe(self, directory: str) -> None:
+        if self._observer is None or directory in self._observed_directories:
+            return
+        self._observer.schedule(_LogChangeHandler(self), directory, recursive=False)
+        self._observed_directories.add(directory)
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self._poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                logs = list(self._logs.values())
+            for log in logs:
+                log.refresh()
@@ -0,0 +1,81 @@
+"""
+Stopping a process and everything it started, e.g. runIOC.bat and the IOC it runs.
+"""
+
+import subprocess
+from collections.abc import Callable
+
+import psutil
+
+# Default time in seconds to wait at each step of stopping processes
+DEFAULT_STEP_TIMEOUT = 5
+
+# Creation flags giving a started process its own console on Windows; CREATE_NEW_CONSOLE only
+# exists on Windows, so there are no flags elsewhere
+NEW_CONSOLE_CREATION_FLAGS = getattr(subprocess, "CREATE_NEW_CONSOLE", 0)
+
+
+def process_tree(process: int | psutil.Process) -> list[psutil.Process]:
+    """
+    The process and all its descendants. Take this before asking the process to stop; once a
+    parent has exited its children can no longer be found from it.
+
+    :param process: the process or its id
+    :return: the processes which are running; empty if the process has gone
+    """
+    try:
+        parent = process if isinstance(process, psutil.Process) else psutil.Process(process)
+        return [parent, *parent.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return []
+
+
+def wait_for_exit(processes: list[psutil.Process], timeout: float) -> list[psutil.Process]:
+    """
+    Wait for processes to exit.
+
+    :param processes: the processes
+    :param timeout: the most time in seconds to wait
+    :return: the processes still running after the timeout
+    """
+    _, alive = psutil.wait_procs(processes, timeout=timeout)
+    return alive
+
+
+def _signal_and_wait(
+    processes: list[psutil.Process],
+    signal: Callable[[psutil.Process], None],
+    timeout: float,
+) -> list[psutil.Process]:
+    for process in processes:
+        try:
+            signal(process)
+        except psutil.NoSuchProcess:
+            pass
+    return wait_for_exit(processes, timeout)
+
+
+def terminate_processes(
+    processes: list[psutil.Process], timeout: float = DEFAULT_STEP_TIMEOUT
+) -> list[psutil.Process]:
+    """
+    Ask processes to terminate and wait for them to exit.
+
+    :param processes: the processes
+    :param timeout: the most time in seconds to wait
+    :return: the processes still running after the timeout
+    """
+    return _signal_and_wait(processes, psutil.Process.terminate, timeout)
+
+
+def kill_processes(
+    processes: list[psutil.Process], timeout: float = DEFAULT_STEP_TIMEOUT
+) -> list[psutil.Process]:
+    """
+    Kill processes and wait for them to exit.
+
+    :param processes: the processes
+    :param timeout: the most time in seconds to wait
+    :return: the processes still running after the timeout
+    """
+    return _signal_and_wait(processes, psutil.Process.kill, timeout)
@@ -0,0 +1,476 @@
+"""
+A client for the control ports of procServ, the process server IOCs run in.
+
+One ProcServControlClient keeps a connection open to each IOC's procServ, all served by a single
+asyncio event loop on a background thread. Output from procServ is kept and its status lines, those
+starting @@@, are turned into ProcServEvents. Commands wait for what confirms them, e.g.::
+
+    client = ProcServControlClient.shared()
+    client.connect("SIMPLE", procserv_port)
+    event = client.command("SIMPLE", "\\x18", event=RESTARTED)
+    client.wait_for_text("SIMPLE", "epics>", start=event.position)
+
+The asynchronous interface is ProcServConnection, whose methods can be awaited directly.
+"""
+
+import asyncio
+import re
+import threading
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any, ClassVar, TypeVar
+
+T = TypeVar("T")
+
+# Kinds of event
+CONNECTED = "connected"
+AUTORESTART_MODE = "autorestart mode"
+CHILD_EXITED = "child exited"
+RESTARTED = "restarted"
+AUTORESTART_TOGGLED = "autorestart toggled"
+
+# Default time in seconds to wait for procServ to respond
+DEFAULT_TIMEOUT = 20
+
+# Most characters of output to keep for each connection
+MAX_OUTPUT = 1000000
+
+_IAC = 255
+_SB = 250
+_SE = 240
+_WILL = 251
+_DONT = 254
+
+_STATUS_LINES = (
+    (CONNECTED, re.compile(r"Welcome to procServ")),
+    (AUTORESTART_MODE, re.compile(r"auto restart( mode)? is (?P<autorestart>\w+)")),
+    (CHILD_EXITED, re.compile(r"Received a sigChild for process (?P<pid>\d+)")),
+    (RESTARTED, re.compile(r'The PID of new child "?[^"]*"? is: (?P<pid>\d+)')),
+    (AUTORESTART_TOGGLED, re.compile(r"Toggled auto restart( mode)? to (?P<autorestart>\w+)")),
+)
+
+
+@dataclass
+class ProcServEvent:
+    """
+    Something procServ reported in a status line.
+    """
+
+    # What happened, e.g. RESTARTED
+    kind: str
+    # Name of the connection it was reported on
+    name: str
+    # The status line
+    line: str
+    # Position in the connection's output just after the line
+    position: int
+    # Process id of the child, if reported
+    pid: int | None = None
+    # Auto restart mode, e.g. ON or OFF, if reported
+    autorestart: str | None = None
+
+
+def parse_status_line(name: str, line: str, position: int) -> ProcServEvent | None:
+    """
+    :param name: name of the connection the line came from
+    :param line: a line of procServ output
+    :param position: position in the connection's output just after the line
+    :return: the event the line reports; None if it is not a status line procServ events come from
+    """
+    if not line.startswith("@@@"):
+        return None
+    for kind, pattern in _STATUS_LINES:
+        match = pattern.search(line)
+        if match is not None:
+            groups = match.groupdict()
+            pid = groups.get("pid")
+            return ProcServEvent(
+                kind,
+                name,
+                line,
+                position,
+                pid=int(pid) if pid is not None else None,
+                autorestart=groups.get("autorestart"),
+            )
+    return None
+
+
+def strip_telnet_commands(data: bytes) -> tuple[bytes, bytes]:
+    """
+    Remove telnet negotiation from data received from procServ.
+
+    :param data: the data
+    :return: the data without telnet commands, and any incomplete command at the end of the data
+        to prepend to the next data received
+    """
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        if data[i] != _IAC:
+            out.append(data[i])
+            i += 1
+            continue
+        if i + 1 >= len(data):
+            return bytes(out), data[i:]
+        command = data[i + 1]
+        if command == _IAC:
+            out.append(_IAC)
+            i += 2
+        elif command == _SB:
+            end = data.find(bytes([_IAC, _SE]), i + 2)
+            if end < 0:
+                return bytes(out), data[i:]
+            i = end + 2
+        elif _WILL <= command <= _DONT:
+            if i + 2 >= len(data):
+                return bytes(out), data[i:]
+            i += 3
+        else:
+            i += 2
+    return bytes(out), b""
+
+
+class ProcServConnection:
+    """
+    A connection to the control port of a procServ. All methods must be called from the event
+    loop the connection was opened in.
+    """
+
+    def __init__(self, name: str, port: int, host: str = "localhost") -> None:
+        """
+        :param name: name for the connection, e.g. the IOC name
+        :param port: the procServ control port
+        :param host: the host procServ runs on
+        """
+        self.name = name
+        self.port = port
+        self.host = host
+        self.events: list[ProcServEvent] = []
+        self._output = ""
+        # Position of the start of _output in all the output received
+        self._output_offset = 0
+        self._line = ""
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._changed: asyncio.Condition | None = None
+        self.closed = True
+
+    @property
+    def position(self) -> int:
+        """
+        :return: the position in the output after everything received so far
+        """
+        return self._output_offset + len(self._output)
+
+    def output(self, start: int = 0) -> str:
+        """
+        :param start: position in the output to start from
+        :return: the output kept from the position
+        """
+        return self._output[max(start - self._output_offset, 0) :]
+
+    async def open(self, timeout: float = DEFAULT_TIMEOUT) -> ProcServEvent:
+        """
+        Connect to procServ and wait for its welcome.
+
+        :param timeout: time in seconds to wait
+        :return: the welcome event
+        :raises OSError: if procServ can not be connected to or does not welcome the client
+        """
+        first_event = len(self.events)
+        self._changed = asyncio.Condition()
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout
+        )
+        self.closed = False
+        self._read_task = asyncio.create_task(self._read())
+        return await self.wait_for_event(CONNECTED, timeout, first_event=first_event)
+
+    async def close(self) -> None:
+        """
+        Disconnect from procServ.
+        """
+        if self._writer is not None:
+            self._writer.close()
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self.closed = True
+
+    async def send(self, text: str) -> None:
+        """
+        Send text to procServ, and so to the IOC unless it is a procServ command.
+
+        :param text: the text, e.g. "dbl\\n" or "\\x18"
+        :raises ConnectionError: if the connection has closed
+        """
+        if self.closed or self._writer is None:
+            raise ConnectionError(f"Connection to procServ for {self.name} is closed")
+        self._writer.write(text.encode("ascii"))
+        await self._writer.drain()
+
+    async def command(
+        self,
+        text: str,
+        expect: str | None = None,
+        event: str | tuple[str, ...] | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> str | ProcServEvent | None:
+        """
+        Send text and wait for what confirms it.
+
+        :param text: the text to send
+        :param expect: regular expression the output after sending must match
+        :param event: kind or kinds of event which must follow sending
+        :param timeout: time in seconds to wait
+        :return: the output up to the match if expect is given, else the event if event is given,
+            else None
+        :raises TimeoutError: if not confirmed in time
+        """
+        start = self.position
+        first_event = len(self.events)
+        await self.send(text)
+        if expect is not None:
+            return await self.wait_for_text(expect, timeout, start)
+        if event is not None:
+            return await self.wait_for_event(event, timeout, first_event=first_event)
+        return None
+
+    async def wait_for_text(
+        self, expect: str, timeout: float = DEFAULT_TIMEOUT, start: int | None = None
+    ) -> str:
+        """
+        Wait for output to match a regular expression.
+
+        :param expect: the regular expression
+        :param timeout: time in seconds to wait
+        :param start: position in the output to match from; None for from now
+        :return: the output from the start up to the end of the match
+        :raises TimeoutError: if the output does not match in time
+        """
+        start = self.position if start is None else start
+        pattern = re.compile(expect)
+        found: list[re.Match] = []
+
+        def _matched() -> bool:
+            match = pattern.search(self.output(start))
+            if match is not None:
+                found.append(match)
+            return match is not None
+
+        await self._wait(_matched, timeout, f"output matching {expect!r}")
+        return self.output(start)[: found[0].end()]
+
+    async def wait_for_event(
+        self,
+        kind: str | tuple[str, ...],
+        timeout: float = DEFAULT_TIMEOUT,
+        start: int | None = None,
+        first_event: int | None = None,
+    ) -> ProcServEvent:
+        """
+        Wait for procServ to report an event.
+
+        :param kind: the kind or kinds of event
+        :param timeout: time in seconds to wait
+        :param start: position in the output the event must be after; None for from now
+        :param first_event: index in events to look from; overrides start
+        :return: the first such event
+        :raises TimeoutError: if there is no such event in time
+        """
+        kinds = (kind,) if isinstance(kind, str) else kind
+        if first_event is None:
+            first_event = len(self.events)
+            if start is not None:
+                first_event = next(
+                    (i for i, event in enumerate(self.events) if event.position > start),
+                    len(self.events),
+                )
+        found: list[ProcServEvent] = []
+
+        def _reported() -> bool:
+            found.extend(event for event in self.events[first_event:] if event.kind in kinds)
+            return bool(found)
+
+        await self._wait(_reported, timeout, "procServ to report {}".format(" or ".join(kinds)))
+        return found[0]
+
+    async def _wait(self, predicate: Callable[[], bool], timeout: float, waiting_for: str) -> None:
+        assert self._changed is not None
+
+        def _done() -> bool:
+            return predicate() or self.closed
+
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(_done), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(
+                    f"Timed out after {timeout} seconds waiting for {waiting_for} from {self.name}"
+                )
+        if not predicate():
+            raise ConnectionError(
+                f"Connection to procServ for {self.name} closed waiting for {waiting_for}"
+            )
+
+    async def _read(self) -> None:
+        assert self._reader is not None and self._changed is not None
+        pending = b""
+        try:
+            while data := await self._reader.read(4096):
+                text, pending = strip_telnet_commands(pending + data)
+                self._received(text.decode("latin-1"))
+                async with self._changed:
+                    self._changed.notify_all()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.closed = True
+            async with self._changed:
+                self._changed.notify_all()
+
+    def _received(self, text: str) -> None:
+        line_start = self.position - len(self._line)
+        self._output += text
+        *lines, self._line = (self._line + text).split("\n")
+        for line in lines:
+            line_start += len(line) + 1
+            event = parse_status_line(self.name, line.strip("\r"), line_start)
+            if event is not None:
+                self.events.append(event)
+        if len(self._output) > MAX_OUTPUT:
+            dropped = len(self._output) - MAX_OUTPUT
+            self._output = self._output[dropped:]
+            self._output_offset += dropped
+
+
+class ProcServControlClient:
+    """
+    Keeps connections open to the control ports of many procServs, by name, and offers blocking
+    versions of the ProcServConnection methods for them. Connections which have closed are opened
+    again before sending.
+    """
+
+    _shared: ClassVar["ProcServControlClient | None"] = None
+
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="procServ control client", daemon=True
+        )
+        self._thread.start()
+        self._connections: dict[str, ProcServConnection] = {}
+
+    @classmethod
+    def shared(cls) -> "ProcServControlClient":
+        """
+        :return: the client shared by all launchers
+        """
+        if cls._shared is None:
+            cls._shared = ProcServControlClient()
+        return cls._shared
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def _connection(self, name: str) -> ProcServConnection:
+        try:
+            return self._connections[name]
+        except KeyError:
+            raise ValueError(f"Not connected to procServ for {name}")
+
+    def connect(
+        self, name: str, port: int, host: str = "localhost", timeout: float = DEFAULT_TIMEOUT
+    ) -> ProcServEvent:
+        """
+        Connect to a procServ, replacing any connection with the same name.
+
+        :param name: name for the connection, e.g. the IOC name
+        :param port: the procServ control port
+        :param host: the host procServ runs on
+        :param timeout: time in seconds to wait for procServ to welcome the client
+        :return: the welcome event
+        """
+        self.disconnect(name)
+        connection = ProcServConnection(name, port, host)
+        self._connections[name] = connection
+        return self._run(connection.open(timeout))
+
+    def disconnect(self, name: str) -> None:
+        """
+        Close a connection, if it is open.
+
+        :param name: name of the connection
+        """
+        connection = self._connections.pop(name, None)
+        if connection is not None:
+            self._run(connection.close())
+
+    def close(self) -> None:
+        """
+        Close all the connections and stop the event loop.
+        """
+        for name in list(self._connections):
+            self.disconnect(name)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def _open_connection(self, name: str) -> ProcServConnection:
+        connection = self._connection(name)
+        if connection.closed:
+            self._run(connection.open())
+        return connection
+
+    def send(self, name: str, text: str) -> None:
+        """
+        See ProcServConnection.send.
+        """
+        self._run(self._open_connection(name).send(text))
+
+    def command(
+        self,
+        name: str,
+        text: str,
+        expect: str | None = None,
+        event: str | tuple[str, ...] | None = None,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> Any:  # noqa: ANN401
+        """
+        See ProcServConnection.command.
+        """
+        return self._run(self._open_connection(name).command(text, expect, event, timeout))
+
+    def wait_for_text(
+        self, name: str, expect: str, timeout: float = DEFAULT_TIMEOUT, start: int | None = None
+    ) -> str:
+        """
+        See ProcServConnection.wait_for_text.
+        """
+        return self._run(self._connection(name).wait_for_text(expect, timeout, start))
+
+    def wait_for_event(
+        self,
+        name: str,
+        kind: str | tuple[str, ...],
+        timeout: float = DEFAULT_TIMEOUT,
+        start: int | None = None,
+    ) -> ProcServEvent:
+        """
+        See ProcServConnection.wait_for_event.
+        """
+        return self._run(self._connection(name).wait_for_event(kind, timeout, start))
+
+    def position(self, name: str) -> int:
+        """
+        :param name: name of the connection
+        :return: the position in the connection's output after everything received so far
+        """
+        return self._connection(name).position
+
+    def events(self, name: str) -> list[ProcServEvent]:
+        """
+        :param name: name of the connection
+        :return: the events reported on the connection so far
+        """
+        return list(self._connection(name).events)
@@ -0,0 +1,208 @@
+"""
+Make the link between an IOC and its device slow or unreliable.
+
+A LinkConditioner sits between the IOC and its emulator (see the link_conditions IOC option in
+run_tests) and passes traffic straight through until a test asks for something worse, e.g.::
+
+    link = get_running_link_conditioner("my_emulator")
+    with link.conditions(latency=0.5, jitter=0.2, bandwidth=960):
+        self.ca.assert_that_pv_is("TEMP", 10.0, timeout=10)
+    with link.conditions(drop_probability=1.0):
+        self.ca.assert_that_pv_alarm_is("TEMP", self.ca.Alarms.INVALID)
+
+Latency, jitter, dropping and truncating apply to replies from the device; bandwidth and stalling
+apply in both directions. Data is never reordered.
+"""
+
+import random
+import threading
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from time import monotonic, sleep
+from types import TracebackType
+from typing import Any, ClassVar, Self
+
+from utils.stream_proxy import RESPONSE, ProxyConnection, StreamProxy
+
+# Bandwidth limited data is sent in pieces taking about this long, in seconds
+_THROTTLE_INTERVAL = 0.02
+
+
+@dataclass(frozen=True)
+class LinkConditions:
+    """
+    Conditions on the link between an IOC and its device.
+    """
+
+    # Seconds to delay each reply by
+    latency: float = 0.0
+    # Up to this many seconds more are added to the latency at random
+    jitter: float = 0.0
+    # Bytes per second in each direction; None for unlimited
+    bandwidth: float | None = None
+    # Probability of a reply being thrown away
+    drop_probability: float = 0.0
+    # Probability of a reply being cut short
+    truncate_probability: float = 0.0
+    # True to hold all traffic until the stall ends
+    stall: bool = False
+
+
+class LinkConditionerRegister:
+    """
+    A way of registering running link conditioners.
+    """
+
+    # Static dictionary of running conditioners, by emulator id
+    RunningConditioners: ClassVar[dict[str, "LinkConditioner"]] = {}
+
+    @classmethod
+    def get_running(cls, name: str | None) -> "LinkConditioner | None":
+        """
+        Get a running conditioner by the name of the emulator it is in front of, return None if not
+        running.
+
+        :param name: name of the emulator
+        :return: the conditioner
+        """
+        return cls.RunningConditioners.get(name)
+
+    @classmethod
+    def add_conditioner(cls, name: str, conditioner: "LinkConditioner") -> None:
+        """
+        Add a conditioner to the running list.
+
+        :param name: name of the emulator
+        :param conditioner: the conditioner
+        """
+        cls.RunningConditioners[name] = conditioner
+
+    @classmethod
+    def remove_conditioner(cls, name: str) -> None:
+        """
+        Removes a conditioner from the running list.
+
+        :param name: name of the emulator
+        """
+        del cls.RunningConditioners[name]
+
+
+class LinkConditioner(StreamProxy):
+    """
+    A proxy applying LinkConditions to the traffic between the IOC and the device. Use it as a
+    context manager to start and register it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_port: int,
+        listen_port: int | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """
+        :param name: name of the emulator the link goes to
+        :param target_port: the port of the emulator
+        :param listen_port: the port for the IOC to connect to; None for any free port
+        :param seed: seed for the random choices, to make them repeatable; None for a random seed
+        """
+        super().__init__(f"{name} link conditioner", target_port, listen_port)
+        self.emulator_name = name
+        self._conditions = LinkConditions()
+        self._random = random.Random(seed)
+        self._not_stalled = threading.Event()
+        self._not_stalled.set()
+        self.dropped_replies = 0
+        self.truncated_replies = 0
+
+    def __enter__(self) -> Self:
+        self.start()
+        LinkConditionerRegister.add_conditioner(self.emulator_name, self)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._not_stalled.set()
+        self.stop()
+        LinkConditionerRegister.remove_conditioner(self.emulator_name)
+
+    @property
+    def current_conditions(self) -> LinkConditions:
+        """
+        :return: the conditions currently applied
+        """
+        return self._conditions
+
+    def set_conditions(self, conditions: LinkConditions) -> None:
+        """
+        Apply new conditions to the link.
+
+        :param conditions: the conditions
+        """
+        self._conditions = conditions
+        if conditions.stall:
+            self._not_stalled.clear()
+        else:
+            self._not_stalled.set()
+
+    @contextmanager
+    def conditions(self, **changes: Any) -> Generator[LinkConditions, None, None]:  # noqa: ANN401
+        """
+        Change the conditions on the link while the context is open, then put them back.
+
+        :param changes: the LinkConditions fields to change, e.g. latency=0.5
+        :return: the conditions applied
+        """
+        previous = self._conditions
+        new_conditions = replace(previous, **changes)
+        self.set_conditions(new_conditions)
+        try:
+            yield new_conditions
+        finally:
+            self.set_conditions(previous)
+
+    @contextmanager
+    def stalled(self) -> Generator[None, None, None]:
+        """
+        Hold all traffic while the context is open; it is delivered when the context closes.
+        """
+        with self.conditions(stall=True):
+            yield
+
+    def forward(self, connection: ProxyConnection, direction: str, data: bytes) -> None:
+        self._not_stalled.wait()
+        conditions = self._conditions
+        if direction == RESPONSE:
+            if conditions.latency or conditions.jitter:
+                sleep(conditions.latency + self._random.uniform(0, conditions.jitter))
+            if self._random.random() < conditions.drop_probability:
+                self.dropped_replies += 1
+                return
+            if len(data) > 1 and self._random.random() < conditions.truncate_probability:
+                self.truncated_replies += 1
+                data = data[: self._random.randrange(1, len(data))]
+            # Conditions may have changed while waiting
+            self._not_stalled.wait()
+        if conditions.bandwidth:
+            self._send_throttled(connection, direction, data, conditions.bandwidth)
+        else:
+            connection.send(direction, data)
+
+    @staticmethod
+    def _send_throttled(
+        connection: ProxyConnection, direction: str, data: bytes, bandwidth: float
+    ) -> None:
+        piece_size = max(1, int(bandwidth * _THROTTLE_INTERVAL))
+        start = monotonic()
+        for sent in range(0, len(data), piece_size):
+            piece = data[sent : sent + piece_size]
+            connection.send(direction, piece)
+            # Wait until the bytes sent so far would have taken this long at the bandwidth
+            remaining = (sent + len(piece)) / bandwidth - (monotonic() - start)
+            if remaining > 0:
+                sleep(remaining)
@@ -0,0 +1,440 @@
+"""
+TCP plumbing for putting something between an IOC and the device it talks to.
+
+The IOC connects to the port given by the EMULATOR_PORT macro. A StreamProxy listens on that port
+and forwards everything to the real emulator, giving subclasses the chance to look at or change the
+traffic in each direction. ExchangeProxy goes further and pairs up each request from the IOC with
+the device's response, e.g. to record it (see stream_recording).
+"""
+
+import itertools
+import re
+import socket
+import threading
+from time import monotonic, sleep
+from typing import Any
+
+# Directions of traffic through a proxy
+REQUEST = "request"  # from the IOC to the device
+RESPONSE = "response"  # from the device to the IOC
+
+BUFFER_SIZE = 65536
+
+# Ends a request when no request terminator is given: the end of a line in any of the usual styles
+_END_OF_LINE = re.compile(rb"\r\n|\r|\n")
+
+
+def request_terminator_option(options: dict[str, Any]) -> bytes | None:
+    """
+    Args:
+        options: the IOC entry
+    Returns:
+        the request terminator given by its stream_request_terminator option, e.g. "\\r"; None if
+        it has none
+    """
+    terminator = options.get("stream_request_terminator")
+    return None if terminator is None else terminator.encode("latin-1")
+
+
+def _shutdown_socket(sock: socket.socket) -> None:
+    # shutdown wakes any thread blocked in recv on the socket, close on its own does not
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+class StreamServer:
+    """
+    A TCP server handling each client connection in its own thread.
+    """
+
+    def __init__(self, name: str, listen_port: int | None = None, host: str = "127.0.0.1") -> None:
+        """
+        Args:
+            name: name of the server, used for thread names and messages
+            listen_port: the port to listen on; None for any free port
+            host: the host to listen on
+        """
+        self.name = name
+        self._listen_socket = socket.create_server((host, listen_port or 0))
+        self._listen_socket.settimeout(0.2)
+        self.listen_port: int = self._listen_socket.getsockname()[1]
+        self._stop_event = threading.Event()
+        self._sockets_lock = threading.Lock()
+        self._client_sockets: set[socket.socket] = set()
+        self._accept_thread = threading.Thread(
+            target=self._accept_loop, name=f"{name} accept", daemon=True
+        )
+
+    def start(self) -> None:
+        """
+        Start accepting connections.
+        """
+        self._accept_thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop accepting connections and close all open connections.
+        """
+        self._stop_event.set()
+        if self._accept_thread.is_alive():
+            self._accept_thread.join()
+        self._listen_socket.close()
+        self.drop_connections()
+
+    def drop_connections(self) -> None:
+        """
+        Close all open connections, as if the device had gone away.
+        """
+        with self._sockets_lock:
+            sockets = list(self._client_sockets)
+        for sock in sockets:
+            _shutdown_socket(sock)
+
+    def _accept_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                client, _ = self._listen_socket.accept()
+            except TimeoutError:
+                continue
+            except OSError:
+                break
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._track_socket(client)
+            threading.Thread(
+                target=self._serve_client, args=(client,), name=f"{self.name} client", daemon=True
+            ).start()
+
+    def _track_socket(self, sock: socket.socket) -> None:
+        with self._sockets_lock:
+            self._client_sockets.add(sock)
+
+    def _untrack_socket(self, sock: socket.socket) -> None:
+        with self._sockets_lock:
+            self._client_sockets.discard(sock)
+        _shutdown_socket(sock)
+
+    def _serve_client(self, client: socket.socket) -> None:
+        try:
+            self.handle_connection(client)
+        except OSError:
+            pass  # the connection was closed under us
+        finally:
+            self._untrack_socket(client)
+
+    def handle_connection(self, client: socket.socket) -> None:
+        """
+        Serve a client until it disconnects. Called in a thread for each connection.
+
+        Args:
+            client: the connected client socket
+        """
+        raise NotImplementedError("StreamServer subclasses must override handle_connection")
+
+
+class ProxyConnection:
+    """
+    A connection from the IOC through a proxy to the device.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, client: socket.socket, device: socket.socket) -> None:
+        """
+        Args:
+            client: socket connected to the IOC
+            device: socket connected to the device
+        """
+        self.id = next(ProxyConnection._ids)
+        self.client = client
+        self.device = device
+
+    def send(self, direction: str, data: bytes) -> None:
+        """
+        Send data on towards its destination.
+
+        Args:
+            direction: REQUEST to send to the device, RESPONSE to send to the IOC
+            data: the data to send
+        """
+        destination = self.device if direction == REQUEST else self.client
+        destination.sendall(data)
+
+    def close(self) -> None:
+        """
+        Close both sides of the connection.
+        """
+        _shutdown_socket(self.client)
+        _shutdown_socket(self.device)
+
+
+class StreamProxy(StreamServer):
+    """
+    Forwards connections from the listening port to a target port.
+
+    Subclasses can override forward to observe or change traffic, and connection_opened and
+    connection_closed to track connections. forward is called from one thread per direction of
+    each connection.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_port: int,
+        listen_port: int | None = None,
+        host: str = "127.0.0.1",
+        connect_timeout: float = 10.0,
+    ) -> None:
+        """
+        Args:
+            name: name of the proxy, used for thread names and messages
+            target_port: the port of the device to forward connections to
+            listen_port: the port to listen on; None for any free port
+            host: the host to listen on and connect to
+            connect_timeout: how long to keep trying to connect to the device, which may still be
+                starting up, before giving up on a connection
+        """
+        super().__init__(name, listen_port, host)
+        self._host = host
+        self.target_port = target_port
+        self._connect_timeout = connect_timeout
+
+    def _connect_to_target(self) -> socket.socket | None:
+        deadline = monotonic() + self._connect_timeout
+        while not self._stop_event.is_set():
+            try:
+                device = socket.create_connection((self._host, self.target_port), timeout=1)
+            except OSError:
+                if monotonic() > deadline:
+                    print(f"{self.name}: unable to connect to device port {self.target_port}")
+                    return None
+                sleep(0.1)
+                continue
+            device.settimeout(None)
+            device.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            return device
+        return None
+
+    def handle_connection(self, client: socket.socket) -> None:
+        device = self._connect_to_target()
+        if device is None:
+            return
+        self._track_socket(device)
+        connection = ProxyConnection(client, device)
+        self.connection_opened(connection)
+        responses = threading.Thread(
+            target=self._pump, args=(connection, RESPONSE), name=f"{self.name} responses"
+        )
+        responses.start()
+        try:
+            self._pump(connection, REQUEST)
+        finally:
+            responses.join()
+            self._untrack_socket(device)
+            self.connection_closed(connection)
+
+    def _pump(self, connection: ProxyConnection, direction: str) -> None:
+        source = connection.client if direction == REQUEST else connection.device
+        while True:
+            try:
+                data = source.recv(BUFFER_SIZE)
+            except OSError:
+                break
+            if not data:
+                break
+            try:
+                self.forward(connection, direction, data)
+            except OSError:
+                break
+        connection.close()
+
+    def forward(self, connection: ProxyConnection, direction: str, data: bytes) -> None:
+        """
+        Pass data on through the proxy.
+
+        Args:
+            connection: the connection the data arrived on
+            direction: REQUEST for data from the IOC, RESPONSE for data from the device
+            data: the data
+        """
+        connection.send(direction, data)
+
+    def connection_opened(self, connection: ProxyConnection) -> None:
+        """
+        Called when the IOC connects and the connection to the device has been made.
+
+        Args:
+            connection: the new connection
+        """
+
+    def connection_closed(self, connection: ProxyConnection) -> None:
+        """
+        Called when either side has closed the connection.
+
+        Args:
+            connection: the closed connection
+        """
+
+
+class Exchange:
+    """
+    A request from the IOC and the device's response to it.
+    """
+
+    def __init__(self, connection_id: int, time: float, request: bytes) -> None:
+        """
+        Args:
+            connection_id: id of the connection the request was made on
+            time: monotonic time of the request
+            request: what the IOC sent; empty for output the device sent without a request
+        """
+        self.connection_id = connection_id
+        self.time = time
+        self.request = request
+        self.response = b""
+        # Time from the request to the start of the response; None until the device responds
+        self.delay: float | None = None
+        # For subclasses to record what the exchange belongs to, e.g. the test running at the time
+        self.label: str | None = None
+
+
+class ExchangeProxy(StreamProxy):
+    """
+    A proxy which splits the traffic into exchanges.
+
+    The data the IOC sends is split into requests at the request terminator, however it is split
+    into chunks by TCP, and everything the device sends before the next request as the response to
+    the last one. Requests sent together without waiting for a response get empty responses except
+    for the last. Subclasses override exchange_finished to use the exchanges.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_port: int,
+        listen_port: int | None = None,
+        host: str = "127.0.0.1",
+        connect_timeout: float = 10.0,
+        request_terminator: bytes | None = None,
+    ) -> None:
+        """
+        Args:
+            name: name of the proxy, used for thread names and messages
+            target_port: the port of the device to forward connections to
+            listen_port: the port to listen on; None for any free port
+            host: the host to listen on and connect to
+            connect_timeout: how long to keep trying to connect to the device
+            request_terminator: the end of each request from the IOC, i.e. the out terminator of
+                its protocol; None for the end of a line, whether CR, LF or CR LF
+        """
+        super().__init__(name, target_port, listen_port, host, connect_timeout)
+        self._request_end = (
+            _END_OF_LINE
+            if request_terminator is None
+            else re.compile(re.escape(request_terminator))
+        )
+        self._in_progress: dict[int, Exchange] = {}
+        # The start of a request from each connection whose terminator has not arrived yet
+        self._partial_requests: dict[int, bytes] = {}
+        self._exchange_lock = threading.Lock()
+
+    def new_exchange(self, connection_id: int, time: float, request: bytes) -> Exchange:
+        """
+        Create the exchange for a new request.
+
+        Args:
+            connection_id: id of the connection the request was made on
+            time: monotonic time of the request
+            request: the request
+        Returns:
+            the exchange
+        """
+        return Exchange(connection_id, time, request)
+
+    def exchange_finished(self, exchange: Exchange) -> None:
+        """
+        Called when an exchange is complete, i.e. the IOC sent its next request or disconnected.
+
+        Args:
+            exchange: the exchange
+        """
+
+    def exchanges_in_progress(self) -> list[Exchange]:
+        """
+        Returns:
+            the exchanges which have not finished yet, one at most for each connection
+        """
+        with self._exchange_lock:
+            return list(self._in_progress.values())
+
+    def _finish_exchange(self, connection_id: int) -> None:
+        exchange = self._in_progress.pop(connection_id, None)
+        if exchange is not None:
+            self.exchange_finished(exchange)
+
+    def _split_requests(self, connection_id: int, data: bytes) -> list[bytes]:
+        """
+        Args:
+            connection_id: id of the connection the data arrived on
+            data: data from the IOC
+        Returns:
+            the requests the data completes; the rest is kept until its terminator arrives
+        """
+        buffer = self._partial_requests.pop(connection_id, b"") + data
+        exchange = self._in_progress.get(connection_id)
+        if (
+            self._request_end is _END_OF_LINE
+            and buffer.startswith(b"\n")
+            and exchange is not None
+            and exchange.request.endswith(b"\r")
+        ):
+            # The LF of a CR LF which arrived after the CR
+            exchange.request += b"\n"
+            buffer = buffer[1:]
+        requests = []
+        while match := self._request_end.search(buffer):
+            requests.append(buffer[: match.end()])
+            buffer = buffer[match.end() :]
+        if buffer:
+            self._partial_requests[connection_id] = buffer
+        return requests
+
+    def _start_exchange(self, connection_id: int, time: float, request: bytes) -> None:
+        self._finish_exchange(connection_id)
+        self._in_progress[connection_id] = self.new_exchange(connection_id, time, request)
+
+    def forward(self, connection: ProxyConnection, direction: str, data: bytes) -> None:
+        now = monotonic()
+        with self._exchange_lock:
+            if direction == REQUEST:
+                for request in self._split_requests(connection.id, data):
+                    self._start_exchange(connection.id, now, request)
+            else:
+                exchange = self._in_progress.get(connection.id)
+                if exchange is None:
+                    # Unprompted output from the device; it goes against an empty request
+                    exchange = self.new_exchange(connection.id, now, b"")
+                    self._in_progress[connection.id] = exchange
+                if exchange.delay is None:
+                    exchange.delay = now - exchange.time
+                exchange.response += data
+        super().forward(connection, direction, data)
+
+    def _finish_connection(self, connection_id: int) -> None:
+        # A request cut off by the connection closing is still an exchange, with no response
+        partial_request = self._partial_requests.pop(connection_id, None)
+        if partial_request is not None:
+            self._start_exchange(connection_id, monotonic(), partial_request)
+        self._finish_exchange(connection_id)
+
+    def connection_closed(self, connection: ProxyConnection) -> None:
+        with self._exchange_lock:
+            self._finish_connection(connection.id)
+
+    def stop(self) -> None:
+        super().stop()
+        with self._exchange_lock:
+            for connection_id in {*self._in_progress, *self._partial_requests}:
+                self._finish_connection(connection_id)
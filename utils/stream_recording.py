@@ -0,0 +1,337 @@
+"""
+Record the stream traffic between an IOC and its emulator, and replay it without the emulator.
+
+A StreamRecorder sits between the IOC and a running emulator and stores each request the IOC sends
+with the response the device gave and how long it took, split up by the test which was running.
+A StreamReplayServer answers the IOC from such a recording. Requests are matched on their exact
+bytes; when a request was made several times the responses are given in the order they were
+recorded, repeating the last one once they run out, which suits IOCs polling the device.
+
+Recordings are saved as JSON. Data is stored as latin-1 text so that any bytes survive the round
+trip.
+"""
+
+import json
+import os
+import socket
+import threading
+from time import monotonic, sleep
+from typing import Any
+
+from utils.log_file import log_filename
+from utils.stream_proxy import BUFFER_SIZE, Exchange, ExchangeProxy, StreamServer
+from utils.test_modes import TestModes
+
+# Test id for traffic before the first test starts, e.g. while the IOC boots
+STARTUP_TEST_ID = "<startup>"
+
+RECORDING_FORMAT_VERSION = 1
+
+
+def stream_recording_filename(test_name: str, emulator_id: str, var_dir: str) -> str:
+    """
+    Default recording file for an emulator; it sits next to the emulator's log files.
+
+    :param test_name: name of test module being run
+    :param emulator_id: the emulator the recording is for
+    :param var_dir: location of directory to write log file
+    :return: path
+    """
+    log_file = log_filename(test_name, "stream_recording", emulator_id, TestModes.DEVSIM, var_dir)
+    return os.path.splitext(log_file)[0] + ".json"
+
+
+def _to_text(data: bytes) -> str:
+    return data.decode("latin-1")
+
+
+def _to_bytes(text: str) -> bytes:
+    return text.encode("latin-1")
+
+
+class StreamRecording:
+    """
+    The stream traffic and backdoor values recorded for each test.
+    """
+
+    def __init__(self, device: str) -> None:
+        """
+        :param device: the device which was recorded
+        """
+        self.device = device
+        self._tests: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _test(self, test_id: str) -> dict[str, Any]:
+        return self._tests.setdefault(
+            test_id, {"exchanges": [], "backdoor": {}, "backdoor_values": {}}
+        )
+
+    @property
+    def test_ids(self) -> list[str]:
+        """
+        :return: the tests in the recording, in the order they were recorded
+        """
+        return list(self._tests)
+
+    def add_exchange(
+        self, test_id: str, time: float, request: bytes, response: bytes, delay: float | None
+    ) -> None:
+        """
+        Add a request and the response to it.
+
+        :param test_id: the test which was running
+        :param time: time of the request in seconds since the start of the recording
+        :param request: what the IOC sent
+        :param response: what the device replied; empty if it did not reply
+        :param delay: time between the request and the start of the response; None if no response
+        """
+        with self._lock:
+            self._test(test_id)["exchanges"].append(
+                {
+                    "time": round(time, 6),
+                    "request": _to_text(request),
+                    "response": _to_text(response),
+                    "delay": None if delay is None else round(delay, 6),
+                }
+            )
+
+    def add_backdoor_value(
+        self,
+        test_id: str,
+        variable: str,
+        value: Any,  # noqa: ANN401
+        typed: bool = False,
+    ) -> None:
+        """
+        Add a value read from the device through the backdoor.
+
+        :param test_id: the test which was running
+        :param variable: the variable read
+        :param value: the value; must be JSON serialisable
+        :param typed: True if the value was read as a python value rather than a string
+        """
+        section = "backdoor_values" if typed else "backdoor"
+        with self._lock:
+            self._test(test_id)[section].setdefault(variable, []).append(value)
+
+    def exchanges(self, test_id: str) -> list[tuple[bytes, bytes, float | None]]:
+        """
+        :param test_id: the test
+        :return: (request, response, delay) for each exchange recorded during the test
+        """
+        with self._lock:
+            recorded = list(self._tests.get(test_id, {}).get("exchanges", []))
+        return [(_to_bytes(e["request"]), _to_bytes(e["response"]), e["delay"]) for e in recorded]
+
+    def backdoor_values(self, test_id: str, variable: str, typed: bool = False) -> list[Any]:
+        """
+        :param test_id: the test
+        :param variable: the variable
+        :param typed: True for the python values read, False for the strings
+        :return: the values read for the variable during the test, in order
+        """
+        section = "backdoor_values" if typed else "backdoor"
+        with self._lock:
+            return list(self._tests.get(test_id, {}).get(section, {}).get(variable, []))
+
+    def save(self, filename: str) -> None:
+        """
+        Write the recording to a file.
+
+        :param filename: the file to write
+        """
+        with self._lock:
+            content = {
+                "version": RECORDING_FORMAT_VERSION,
+                "device": self.device,
+                "tests": self._tests,
+            }
+            with open(filename, "w") as f:
+                json.dump(content, f, indent=1)
+
+    @classmethod
+    def load(cls, filename: str) -> "StreamRecording":
+        """
+        Read a recording from a file.
+
+        :param filename: the file to read
+        :return: the recording
+        """
+        with open(filename) as f:
+            content = json.load(f)
+        if content.get("version") != RECORDING_FORMAT_VERSION:
+            raise ValueError(
+                f"Stream recording {filename} has version {content.get('version')}, "
+                f"expected {RECORDING_FORMAT_VERSION}"
+            )
+        recording = cls(content["device"])
+        recording._tests = content["tests"]
+        return recording
+
+
+class StreamRecorder(ExchangeProxy):
+    """
+    A proxy recording the traffic between the IOC and the device.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_port: int,
+        listen_port: int | None = None,
+        device: str = "",
+        request_terminator: bytes | None = None,
+    ) -> None:
+        """
+        :param name: name of the recorder, used for thread names and messages
+        :param target_port: the port of the device
+        :param listen_port: the port for the IOC to connect to; None for any free port
+        :param device: the device being recorded
+        :param request_terminator: the end of each request from the IOC; None for the end of a line
+        """
+        super().__init__(name, target_port, listen_port, request_terminator=request_terminator)
+        self.recording = StreamRecording(device)
+        self._test_id = STARTUP_TEST_ID
+        self._start_time = monotonic()
+
+    @property
+    def test_id(self) -> str:
+        """
+        :return: the test traffic is currently recorded against
+        """
+        return self._test_id
+
+    def start_test(self, test_id: str) -> None:
+        """
+        Record traffic from now on against the given test.
+
+        :param test_id: the test, e.g. from TestCase.id()
+        """
+        self._test_id = test_id
+
+    def new_exchange(self, connection_id: int, time: float, request: bytes) -> Exchange:
+        exchange = super().new_exchange(connection_id, time, request)
+        exchange.label = self._test_id
+        return exchange
+
+    def exchange_finished(self, exchange: Exchange) -> None:
+        self.recording.add_exchange(
+            exchange.label or STARTUP_TEST_ID,
+            exchange.time - self._start_time,
+            exchange.request,
+            exchange.response,
+            exchange.delay,
+        )
+
+
+class StreamReplayServer(StreamServer):
+    """
+    Answers an IOC from a recording, in place of the device.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        recording: StreamRecording,
+        listen_port: int | None = None,
+        use_recorded_delays: bool = True,
+    ) -> None:
+        """
+        :param name: name of the server, used for thread names and messages
+        :param recording: the recording to answer from
+        :param listen_port: the port for the IOC to connect to; None for any free port
+        :param use_recorded_delays: True to wait as long before responding as the device did, False
+            to respond immediately
+        """
+        super().__init__(name, listen_port)
+        self.recording = recording
+        self._use_recorded_delays = use_recorded_delays
+        self._lock = threading.Lock()
+        self._connected = True
+        self._responses: dict[bytes, list[tuple[bytes, float | None]]] = {}
+        self._positions: dict[bytes, int] = {}
+        self.unmatched_requests: list[bytes] = []
+        self.start_test(STARTUP_TEST_ID)
+
+    def start_test(self, test_id: str) -> None:
+        """
+        Answer from the traffic recorded for the given test from now on. Requests which were not
+        made during that test are answered from the rest of the recording.
+
+        :param test_id: the test, e.g. from TestCase.id()
+        """
+        responses: dict[bytes, list[tuple[bytes, float | None]]] = {}
+        other_tests = [other for other in self.recording.test_ids if other != test_id]
+        for recorded_test in [test_id, *other_tests]:
+            from_this_test: dict[bytes, list[tuple[bytes, float | None]]] = {}
+            for request, response, delay in self.recording.exchanges(recorded_test):
+                if request and request not in responses:
+                    from_this_test.setdefault(request, []).append((response, delay))
+            responses.update(from_this_test)
+        with self._lock:
+            self._responses = responses
+            self._positions = {}
+
+    def set_connected(self, connected: bool) -> None:
+        """
+        Simulate the device being disconnected or reconnected. While disconnected connections are
+        refused.
+
+        :param connected: True for connected
+        """
+        self._connected = connected
+        if not connected:
+            self.drop_connections()
+
+    def _find_request(self, buffer: bytes) -> bytes | bool | None:
+        """
+        :return: the longest recorded request the buffer starts with; True if the buffer could be
+            the start of a recorded request; None otherwise
+        """
+        matched = max(
+            (request for request in self._responses if buffer.startswith(request)),
+            key=len,
+            default=None,
+        )
+        if matched is None and any(request.startswith(buffer) for request in self._responses):
+            return True
+        return matched
+
+    def _next_response(self, request: bytes) -> tuple[bytes, float | None]:
+        responses = self._responses[request]
+        position = self._positions.get(request, 0)
+        self._positions[request] = position + 1
+        return responses[min(position, len(responses) - 1)]
+
+    def handle_connection(self, client: socket.socket) -> None:
+        buffer = b""
+        while self._connected:
+            data = client.recv(BUFFER_SIZE)
+            if not data:
+                return
+            buffer += data
+            while buffer:
+                with self._lock:
+                    request = self._find_request(buffer)
+                    if request is None:
+                        # Skip to where a recorded request starts, or drop everything
+                        skip = next(
+                            (
+                                i
+                                for i in range(1, len(buffer))
+                                if self._find_request(buffer[i:]) is not None
+                            ),
+                            len(buffer),
+                        )
+                        self.unmatched_requests.append(buffer[:skip])
+                        buffer = buffer[skip:]
+                        continue
+                    if request is True:
+                        break  # wait for the rest of the request
+                    response, delay = self._next_response(request)
+                buffer = buffer[len(request) :]
+                if self._use_recorded_delays and delay:
+                    sleep(delay)
+                if response:
+                    client.sendall(response)
@@ -0,0 +1,303 @@
+"""
+Measure how hard an IOC drives its device.
+
+A TrafficTap sits between the IOC and its emulator (see the traffic_tap IOC option in run_tests)
+and keeps every request the IOC sends along with the size of the response and how long the device
+took to start replying. Tests can then look at the traffic over a period, e.g.::
+
+    tap = get_running_traffic_tap("my_emulator")
+    with tap.measure() as traffic:
+        with self._lewis.backdoor_simulate_disconnected_device():
+            sleep(5)
+    assert_that(traffic.stats.peak_commands_per_second(), less_than_or_equal_to(5))
+
+When the tap closes a summary of all the traffic is written as JSON for trend tracking.
+"""
+
+import json
+import os
+import re
+from collections import Counter, deque
+from collections.abc import Generator
+from contextlib import contextmanager
+from time import monotonic
+from types import TracebackType
+from typing import Any, ClassVar, Self
+
+from utils.stream_proxy import Exchange, ExchangeProxy
+
+# Upper edges of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_NUMBER = re.compile(r"[-+]?\d+(\.\d*)?([eE][-+]?\d+)?")
+
+
+def command_key(request: bytes) -> str:
+    """
+    The command a request is counted under: the request without surrounding whitespace and with
+    numbers replaced by #, so that e.g. setting different setpoints counts as the same command.
+
+    :param request: the request
+    :return: the command, e.g. "SETP #" for b"SETP 12.5\\r\\n"
+    """
+    return _NUMBER.sub("#", request.strip().decode("latin-1"))
+
+
+class TrafficStats:
+    """
+    Statistics for the traffic through a TrafficTap over a period of time.
+    """
+
+    def __init__(self, exchanges: list[Exchange], start: float, end: float) -> None:
+        """
+        :param exchanges: the exchanges started in the period
+        :param start: monotonic time of the start of the period
+        :param end: monotonic time of the end of the period
+        """
+        requests = [exchange for exchange in exchanges if exchange.request]
+        self.duration = max(end - start, 1e-9)
+        self.commands = len(requests)
+        self.command_counts = Counter(command_key(exchange.request) for exchange in requests)
+        self.unanswered = sum(1 for exchange in requests if exchange.delay is None)
+        self.bytes_to_device = sum(len(exchange.request) for exchange in exchanges)
+        self.bytes_from_device = sum(len(exchange.response) for exchange in exchanges)
+        self._request_times = sorted(exchange.time for exchange in requests)
+        self._latencies: dict[str, list[float]] = {}
+        for exchange in requests:
+            if exchange.delay is not None:
+                self._latencies.setdefault(command_key(exchange.request), []).append(exchange.delay)
+
+    def commands_per_second(self) -> float:
+        """
+        :return: the mean number of commands sent per second over the period
+        """
+        return self.commands / self.duration
+
+    def peak_commands_per_second(self, window: float = 1.0) -> float:
+        """
+        :param window: length of the sliding window in seconds
+        :return: the most commands sent in any window of the period, per second
+        """
+        peak = 0
+        first = 0
+        for last, time in enumerate(self._request_times):
+            while time - self._request_times[first] >= window:
+                first += 1
+            peak = max(peak, last - first + 1)
+        return peak / window
+
+    def bytes_per_second(self) -> tuple[float, float]:
+        """
+        :return: the mean bytes per second sent to the device and received from it
+        """
+        return self.bytes_to_device / self.duration, self.bytes_from_device / self.duration
+
+    def latencies(self, command: str | None = None) -> list[float]:
+        """
+        :param command: the command (see command_key); None for all commands
+        :return: times in seconds from request to the start of the response
+        """
+        if command is not None:
+            return list(self._latencies.get(command, []))
+        return [latency for latencies in self._latencies.values() for latency in latencies]
+
+    def latency_percentile(self, percentile: float, command: str | None = None) -> float | None:
+        """
+        :param percentile: the percentile, from 0 to 100
+        :param command: the command (see command_key); None for all commands
+        :return: the latency in seconds; None if there were no responses
+        """
+        latencies = sorted(self.latencies(command))
+        if not latencies:
+            return None
+        index = round(percentile / 100 * (len(latencies) - 1))
+        return latencies[min(max(index, 0), len(latencies) - 1)]
+
+    def latency_histogram(self, command: str | None = None) -> dict[str, int]:
+        """
+        :param command: the command (see command_key); None for all commands
+        :return: number of responses in each latency bucket, e.g. {"<=1ms": 3, ...}
+        """
+        histogram = {f"<={edge}ms": 0 for edge in LATENCY_BUCKETS_MS}
+        histogram[f">{LATENCY_BUCKETS_MS[-1]}ms"] = 0
+        for latency in self.latencies(command):
+            milliseconds = latency * 1000
+            bucket = next(
+                (f"<={edge}ms" for edge in LATENCY_BUCKETS_MS if milliseconds <= edge),
+                f">{LATENCY_BUCKETS_MS[-1]}ms",
+            )
+            histogram[bucket] += 1
+        return histogram
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        :return: the statistics as a JSON serialisable dictionary
+        """
+        to_device, from_device = self.bytes_per_second()
+        commands = {}
+        for command, count in self.command_counts.most_common():
+            latencies = self._latencies.get(command, [])
+            commands[command] = {
+                "count": count,
+                "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+                "max_latency": max(latencies, default=None),
+            }
+        return {
+            "duration": self.duration,
+            "commands": self.commands,
+            "unanswered": self.unanswered,
+            "commands_per_second": self.commands_per_second(),
+            "peak_commands_per_second": self.peak_commands_per_second(),
+            "bytes_to_device_per_second": to_device,
+            "bytes_from_device_per_second": from_device,
+            "latency_p50": self.latency_percentile(50),
+            "latency_p99": self.latency_percentile(99),
+            "latency_histogram": self.latency_histogram(),
+            "by_command": commands,
+        }
+
+
+class TrafficWindow:
+    """
+    A period over which traffic is measured, see TrafficTap.measure.
+    """
+
+    def __init__(self, tap: "TrafficTap") -> None:
+        self._tap = tap
+        self.start = monotonic()
+        self.end: float | None = None
+
+    @property
+    def stats(self) -> TrafficStats:
+        """
+        :return: statistics for the traffic in the window, so far if it is still open
+        """
+        return self._tap.stats(self.start, self.end)
+
+
+class TrafficTapRegister:
+    """
+    A way of registering running traffic taps.
+    """
+
+    # Static dictionary of running taps, by emulator id
+    RunningTaps: ClassVar[dict[str, "TrafficTap"]] = {}
+
+    @classmethod
+    def get_running(cls, name: str | None) -> "TrafficTap | None":
+        """
+        Get a running tap by the name of the emulator it taps, return None if not running.
+
+        :param name: name of the emulator
+        :return: the tap
+        """
+        return cls.RunningTaps.get(name)
+
+    @classmethod
+    def add_tap(cls, name: str, tap: "TrafficTap") -> None:
+        """
+        Add a tap to the running list.
+
+        :param name: name of the emulator
+        :param tap: the tap
+        """
+        cls.RunningTaps[name] = tap
+
+    @classmethod
+    def remove_tap(cls, name: str) -> None:
+        """
+        Removes a tap from the running list.
+
+        :param name: name of the emulator
+        """
+        del cls.RunningTaps[name]
+
+
+class TrafficTap(ExchangeProxy):
+    """
+    A proxy keeping statistics on the traffic between the IOC and the device. Use it as a context
+    manager to start it, register it and write the report when it closes.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target_port: int,
+        listen_port: int | None = None,
+        report_file: str | None = None,
+        max_exchanges: int = 1000000,
+        request_terminator: bytes | None = None,
+    ) -> None:
+        """
+        :param name: name of the emulator being tapped
+        :param target_port: the port of the emulator
+        :param listen_port: the port for the IOC to connect to; None for any free port
+        :param report_file: where to write the report on close; None for no report
+        :param max_exchanges: the most exchanges to keep; older ones are forgotten
+        :param request_terminator: the end of each request from the IOC; None for the end of a line
+        """
+        super().__init__(
+            f"{name} traffic tap", target_port, listen_port, request_terminator=request_terminator
+        )
+        self.emulator_name = name
+        self._report_file = report_file
+        self._finished: deque[Exchange] = deque(maxlen=max_exchanges)
+        self._started = monotonic()
+
+    def __enter__(self) -> Self:
+        self.start()
+        TrafficTapRegister.add_tap(self.emulator_name, self)
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.stop()
+        TrafficTapRegister.remove_tap(self.emulator_name)
+        if self._report_file is not None:
+            self.write_report(self._report_file)
+
+    def exchange_finished(self, exchange: Exchange) -> None:
+        self._finished.append(exchange)
+
+    def stats(self, start: float | None = None, end: float | None = None) -> TrafficStats:
+        """
+        Statistics for the traffic between two times.
+
+        :param start: monotonic start time; None for when the tap started
+        :param end: monotonic end time; None for now
+        :return: the statistics
+        """
+        start = self._started if start is None else start
+        end = monotonic() if end is None else end
+        with self._exchange_lock:
+            exchanges = [*self._finished, *self._in_progress.values()]
+        return TrafficStats([e for e in exchanges if start <= e.time <= end], start, end)
+
+    @contextmanager
+    def measure(self) -> Generator[TrafficWindow, None, None]:
+        """
+        Measure the traffic while the context is open.
+
+        :return: the window; its stats cover the traffic while the context was open
+        """
+        window = TrafficWindow(self)
+        try:
+            yield window
+        finally:
+            window.end = monotonic()
+
+    def write_report(self, filename: str) -> None:
+        """
+        Write statistics for all the traffic through the tap as JSON.
+
+        :param filename: the file to write
+        """
+        report = {"emulator": self.emulator_name, **self.stats().to_dict()}
+        os.makedirs(os.path.dirname(filename) or os.curdir, exist_ok=True)
+        with open(filename, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"Traffic report for {self.emulator_name} written to {filename}")
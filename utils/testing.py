@@ -1,12 +1,15 @@
 import functools
 import unittest
 from collections.abc import Callable
-from time import sleep
+from time import monotonic, sleep
 from types import TracebackType
 from typing import TYPE_CHECKING, ClassVar, Concatenate, ParamSpec, Self, TypeVar, overload
 
 from utils.emulator_launcher import EmulatorRegister
+from utils.flakiness import FlakinessRegister, failure_signature
 from utils.ioc_launcher import IOCRegister
+from utils.stream_conditions import LinkConditioner, LinkConditionerRegister
+from utils.stream_tap import TrafficTap, TrafficTapRegister
 from utils.test_modes import TestModes
 
 P = ParamSpec("P")
@@ -63,7 +66,7 @@ class _AssertLogContext:
             log_manager: A reference to the IOC log object
             number_of_messages: A number of log messages to expect (None to not check number of
                 messages)
-            in_time: The amount of time to wait for messages to be generated
+            in_time: The most time to wait for messages to be generated
             must_contain: A string which must appear in the generated log messages (None to not
                 check contents)
             ignore_log_client_failures (bool): Whether to ignore messages about not being able to
@@ -87,19 +90,43 @@ class _AssertLogContext:
         exc_value: BaseException | None,
         traceback: TracebackType | None,
     ) -> bool:
-        sleep(self.in_time)
-        self.messages = self.log_manager.read_log()
+        # Finish as soon as the outcome is known: when must_contain is seen, unless the number of
+        # messages still has to be checked over the whole window, or when there are too many
+        # messages. Without either check the caller wants every message in the window.
+        stop_when_contained = self.must_contain is not None and self.exp_num_of_messages is None
+        deadline = monotonic() + self.in_time
+        self.messages = []
+        while True:
+            self.messages += self._filter(self.log_manager.read_log())
+            self._check_number_of_messages()
+            if stop_when_contained and self._contains_expected():
+                return True
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            self.log_manager.wait_for_output(remaining)
+
+        if self.must_contain is not None and not self._contains_expected():
+            raise AssertionError(
+                "Expected the generated log messages to contain the string '{}' but they didn't.\n"
+                "The log messages were: \n{}".format(self.must_contain, "\n".join(self.messages))
+            )
 
+        return True
+
+    def _filter(self, messages: list[str]) -> list[str]:
         if self.ignore_log_client_failures:
-            self.messages = [message for message in self.messages if "log client: " not in message]
+            messages = [message for message in messages if "log client: " not in message]
 
         if self.ignore_autosave:
-            self.messages = [
+            messages = [
                 message
-                for message in self.messages
+                for message in messages
                 if "autosave" not in message and "save_restore" not in message
             ]
+        return messages
 
+    def _check_number_of_messages(self) -> None:
         actual_num_of_messages = len(self.messages)
 
         if (
@@ -113,15 +140,8 @@ class _AssertLogContext:
                 )
             )
 
-        if self.must_contain is not None and not any(
-            self.must_contain in message for message in self.messages
-        ):
-            raise AssertionError(
-                "Expected the generated log messages to contain the string '{}' but they didn't.\n"
-                "The log messages were: \n{}".format(self.must_contain, "\n".join(self.messages))
-            )
-
-        return True
+    def _contains_expected(self) -> bool:
+        return any(self.must_contain in message for message in self.messages)
 
 
 @overload
@@ -145,6 +165,7 @@ def get_running_lewis_and_ioc(
     :param emulator_name: the name of the lewis emulator; None for don't check the emulator
     :param ioc_name: the name of the IOC
     :return: lewis launcher and ioc launcher tuple
+    :raises EmulatorDiedException: if the emulator has been detected as dead
     """
     lewis = EmulatorRegister.get_running(emulator_name)
     ioc = IOCRegister.get_running(ioc_name)
@@ -155,10 +176,45 @@ def get_running_lewis_and_ioc(
         raise AssertionError(f"IOC ({ioc_name}) is not running")
     if lewis is None and emulator_name is not None:
         raise AssertionError(f"Emulator ({emulator_name}) is not running")
+    if lewis is not None:
+        # Fail straight away if the emulator has died rather than waiting for timeouts in the test
+        lewis.assert_alive()
 
     return lewis, ioc
 
 
+def get_running_traffic_tap(emulator_name: str) -> TrafficTap:
+    """
+    Get the traffic tap between an IOC and its emulator; the IOC entry must set "traffic_tap".
+
+    :param emulator_name: the name of the emulator
+    :return: the tap
+    """
+    tap = TrafficTapRegister.get_running(emulator_name)
+    if tap is None:
+        raise AssertionError(
+            f"No traffic tap for emulator ({emulator_name}); set traffic_tap in the IOC entry"
+        )
+    return tap
+
+
+def get_running_link_conditioner(emulator_name: str) -> LinkConditioner:
+    """
+    Get the link conditioner between an IOC and its emulator; the IOC entry must set
+    "link_conditions".
+
+    :param emulator_name: the name of the emulator
+    :return: the link conditioner
+    """
+    conditioner = LinkConditionerRegister.get_running(emulator_name)
+    if conditioner is None:
+        raise AssertionError(
+            f"No link conditioner for emulator ({emulator_name}); set link_conditions in the IOC "
+            f"entry"
+        )
+    return conditioner
+
+
 def assert_log_messages(
     ioc: "IocLauncher",
     number_of_messages: int | None = None,
@@ -175,6 +231,12 @@ def assert_log_messages(
         with assert_log_messages(self._ioc, 5, 5):
             do_something()
 
+    The log is read as messages arrive rather than once at the end, so the assertion finishes as
+    soon as its outcome is known: a must_contain assertion passes as soon as the string is logged,
+    and any assertion fails as soon as there are more than number_of_messages messages. The whole
+    of in_time is only waited for when checking that there are not too many messages, or when
+    neither is checked and the messages are just being collected.
+
     The context manager will keep a reference to the messages themselves::
         with assert_log_messages(self._ioc, 5) as cm:
             do_something()
@@ -185,7 +247,7 @@ def assert_log_messages(
         ioc (IocLauncher): The IOC that we are checking the logs for.
         number_of_messages (int): The maximum number of messages that are expected (None to not
             check number of messages)
-        in_time (int): The number of seconds to wait for messages
+        in_time (int): The most seconds to wait for messages
         must_contain (str): a string which must be contained in at least one of the messages (None
             to not check)
         ignore_log_client_failures (bool): Whether to ignore messages about not being able to
@@ -215,6 +277,9 @@ def skip_if_condition(
     runtime as opposed to class load time. This is necessary because otherwise the decorators don't
     properly pick up changes in IOCRegister.uses_rec_sim
 
+    The test runner checks the condition as each test starts, see skip_before_setup, so that a
+    skipped test does not run setUp. Without that the test is skipped once setUp has run.
+
     Args:
         condition (func): The condition on which to skip the test. Should be callable.
         reason (str): The reason for skipping the test
@@ -227,11 +292,36 @@ def skip_if_condition(
                 raise unittest.SkipTest(reason)
             return func(*args, **kwargs)
 
+        # Outermost decorator first
+        skip_conditions = [(condition, reason), *getattr(func, "skip_conditions", [])]
+        wrapper.skip_conditions = skip_conditions  # type: ignore[attr-defined]
         return wrapper
 
     return decorator
 
 
+def skip_before_setup(test: unittest.TestCase) -> None:
+    """
+    Checks the skip_if_condition decorators of a test which is about to run, and if it should be
+    skipped makes unittest skip it before calling setUp. Called by the test runner as each test
+    starts.
+
+    Args:
+        test: the test
+    """
+    name = getattr(test, "_testMethodName", None)
+    method = getattr(type(test), name, None) if name is not None else None
+    for condition, reason in getattr(method, "skip_conditions", []):
+        if condition():
+
+            @unittest.skip(reason)
+            def skipped() -> None:
+                pass
+
+            setattr(test, name, skipped)
+            return
+
+
 """Decorator to skip tests if running in recsim."""
 skip_if_recsim = functools.partial(skip_if_condition, lambda: IOCRegister.uses_rec_sim)
 
@@ -307,8 +397,13 @@ def unstable_test(
     Decorator which will retry a test on failure. This decorator should not be required on most
     tests and should not be included as standard when writing a test.
 
+    When run by run_tests the number of retries is chosen from the test's history, see flakiness:
+    a failure which has failed every attempt in recent runs and never been followed by a pass is not
+    retried, a new failure is retried once, and a test which rarely flakes is retried fewer times
+    than max_retries.
+
     Args:
-        max_retries: the max number of times to run the test before actually throwing an error
+        max_retries: the max number of times to retry the test before actually throwing an error
             (defaults to 2 retries)
         error_class: the class of error to retry under (defaults to AssertionError)
         wait_between_runs: number of seconds to wait between each failed attempt at running the test
@@ -319,24 +414,29 @@ def unstable_test(
     ) -> Callable[Concatenate[unittest.TestCase, P], T]:
         @functools.wraps(func)
         def wrapper(self: unittest.TestCase, *args: P.args, **kwargs: P.kwargs) -> T:
+            attempts = FlakinessRegister.attempts(self.id())
+            start = monotonic()
             try:
                 return func(self, *args, **kwargs)  # Initial attempt to run the test "normally"
-            except error_class:
-                last_error = None
-                for _ in range(max_retries):
+            except error_class as e:
+                last_error = e
+                attempts.failures.append(failure_signature(e))
+                retries = FlakinessRegister.retry_budget(
+                    self.id(), attempts.failures[-1], max_retries
+                )
+                for _ in range(retries):
                     sleep(wait_between_runs)
+                    attempts.attempts += 1
+                    attempts.retry_time = monotonic() - start
                     try:
                         self.setUp()  # Need to rerun setup
                         return func(self, *args, **kwargs)
                     except error_class as e:
                         last_error = e
+                        attempts.failures.append(failure_signature(e))
                     finally:
                         self.tearDown()  # Rerun tearDown regardless of success or not
-                if last_error is not None:
-                    raise last_error
-                raise AssertionError(
-                    "Retry decorator exhausted without capturing a retryable exception"
-                )
+                raise last_error
 
         return wrapper
 
@@ -0,0 +1,15 @@
+"""
+Fake devices for the tests of the things which sit between an IOC and its device.
+"""
+
+from ..stream_proxy import BUFFER_SIZE, StreamServer
+
+
+class UpperCaseDevice(StreamServer):
+    """
+    A device which replies to each request with it in upper case.
+    """
+
+    def handle_connection(self, client):
+        while data := client.recv(BUFFER_SIZE):
+            client.sendall(data.upper())
@@ -0,0 +1,212 @@
+import threading
+import unittest
+from unittest import mock
+
+from genie_python.genie_cachannel_wrapper import CaChannelWrapper
+from hamcrest import assert_that, calling, contains_exactly, equal_to, is_, none, raises
+
+from .. import axis
+from ..axis import AxisMotion, AxisTrace, _PositionMonitor
+
+
+class AxisTraceTests(unittest.TestCase):
+    def trace(self, positions):
+        trace = AxisTrace("MTR0101")
+        trace.positions = list(positions)
+        return trace
+
+    def test_GIVEN_positions_THEN_velocities_between_successive_positions(self):
+        trace = self.trace([(0.0, 0.0), (1.0, 2.0), (3.0, 0.0)])
+
+        assert_that(trace.velocities(), contains_exactly((0.5, 2.0), (2.0, -1.0)))
+        assert_that(trace.max_speed(), equal_to(2.0))
+        assert_that(trace.final_position(), equal_to(0.0))
+
+    def test_GIVEN_updates_at_same_time_THEN_they_are_not_used_for_velocity(self):
+        trace = self.trace([(0.0, 0.0), (0.0, 1.0), (1.0, 1.0)])
+
+        assert_that(trace.velocities(), contains_exactly((0.5, 0.0)))
+
+    def test_GIVEN_no_updates_THEN_not_moved(self):
+        trace = self.trace([])
+
+        assert_that(trace.max_speed(), equal_to(0.0))
+        assert_that(trace.final_position(), is_(none()))
+
+
+class FakeMonitor:
+    """
+    A monitor of a PV of a FakeChannelAccess, updated when the test changes the PV.
+    """
+
+    def __init__(self, channel_access, pv, trace=None):
+        self.pv = pv
+        self.trace = trace
+        self.all_values = []
+        self.latest_value = None
+        self.closed = False
+        channel_access.monitors.setdefault(pv, []).append(self)
+        if pv in channel_access.pvs:
+            self.update(channel_access.pvs[pv])
+
+    def close(self):
+        self.closed = True
+
+    def update(self, value):
+        if self.closed:
+            return
+        self.latest_value = value
+        self.all_values.append(value)
+        if self.trace is not None:
+            self.trace.add_position(value)
+
+    @property
+    def value(self):
+        return self.latest_value
+
+
+class FakeChannelAccess:
+    """
+    The motor record fields of some axes, sending monitor updates when they change.
+    """
+
+    def __init__(self, pvs):
+        self.pvs = dict(pvs)
+        self.monitors = {}
+
+    def get_pv_value(self, pv):
+        return self.pvs[pv]
+
+    def update(self, pv, value):
+        self.pvs[pv] = value
+        for monitor in self.monitors.get(pv, []):
+            monitor.update(value)
+
+
+class AxesMoveTests(unittest.TestCase):
+    def setUp(self):
+        for monitor_class in ("_MonitorAssertion", "_PositionMonitor"):
+            patcher = mock.patch.object(axis, monitor_class, FakeMonitor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ca = FakeChannelAccess(
+            {
+                "MTR0101.DMOV": 1,
+                "MTR0101.RBV": 0.0,
+                "MTR0101.RDBD": 0.1,
+                "MTR0102.DMOV": 1,
+                "MTR0102.RBV": 5.0,
+                "MTR0102.RDBD": 0.1,
+            }
+        )
+        self.motion = AxisMotion(self.ca, setpoint_suffix="", motor_suffix="")
+
+    def test_GIVEN_axis_not_yet_moved_WHEN_done_moving_goes_to_0_and_back_THEN_done(self):
+        move = self.motion.moving(["MTR0101"])
+
+        with mock.patch.object(move, "wait"):
+            with move as traces:
+                assert_that(move.is_done("MTR0101"), is_(False))
+                self.ca.update("MTR0101.DMOV", 0)
+                self.ca.update("MTR0101.RBV", 1.0)
+                assert_that(move.is_done("MTR0101"), is_(False))
+                self.ca.update("MTR0101.RBV", 2.0)
+                self.ca.update("MTR0101.DMOV", 1)
+
+        assert_that(move.is_done("MTR0101"), is_(True))
+        assert_that(
+            [position for _, position in traces["MTR0101"].positions],
+            contains_exactly(0.0, 1.0, 2.0),
+        )
+
+    def test_GIVEN_axis_within_deadband_of_target_WHEN_entered_THEN_done_without_moving(self):
+        move = self.motion.moving(["MTR0101", "MTR0102"], targets={"MTR0101": 0.05, "MTR0102": 6})
+
+        with mock.patch.object(move, "wait"):
+            with move:
+                pass
+
+        assert_that(move.is_done("MTR0101"), is_(True))
+        assert_that(move.is_done("MTR0102"), is_(False))
+
+    def test_GIVEN_axes_moved_in_block_WHEN_block_exits_THEN_waits_for_every_axis(self):
+        def move_axes():
+            for motor, position in (("MTR0101", 3.0), ("MTR0102", 7.0)):
+                self.ca.update(f"{motor}.DMOV", 0)
+                self.ca.update(f"{motor}.RBV", position)
+                self.ca.update(f"{motor}.DMOV", 1)
+
+        with self.motion.moving(["MTR0101", "MTR0102"], timeout=5) as traces:
+            threading.Timer(0.1, move_axes).start()
+
+        assert_that(traces["MTR0101"].final_position(), equal_to(3.0))
+        assert_that(traces["MTR0102"].final_position(), equal_to(7.0))
+
+    def test_GIVEN_axis_which_does_not_move_WHEN_waiting_THEN_error_names_axis_and_position(self):
+        move = self.motion.moving(["MTR0101", "MTR0102"], timeout=0.1)
+
+        with mock.patch.object(move, "wait"):
+            with move:
+                self.ca.update("MTR0101.DMOV", 0)
+                self.ca.update("MTR0101.DMOV", 1)
+
+        assert_that(
+            calling(move.wait),
+            raises(AssertionError, "Axes not done moving after 0.1 seconds: MTR0102 at 5.0$"),
+        )
+
+    def open_monitors(self):
+        return [
+            monitor
+            for monitors in self.ca.monitors.values()
+            for monitor in monitors
+            if not monitor.closed
+        ]
+
+    def test_GIVEN_move_finished_WHEN_axis_moves_again_THEN_trace_only_covers_the_move(self):
+        with self.motion.moving(["MTR0101"], targets={"MTR0101": 0.0}) as traces:
+            pass
+
+        self.ca.update("MTR0101.RBV", 4.0)
+
+        assert_that(self.open_monitors(), is_(equal_to([])))
+        assert_that(traces["MTR0101"].final_position(), equal_to(0.0))
+
+    def test_GIVEN_error_in_block_WHEN_block_exits_THEN_monitors_removed(self):
+        with self.assertRaises(ValueError):
+            with self.motion.moving(["MTR0101", "MTR0102"]):
+                raise ValueError("move failed")
+
+        assert_that(self.open_monitors(), is_(equal_to([])))
+
+    def test_GIVEN_deadband_can_not_be_read_WHEN_entered_THEN_monitors_removed(self):
+        del self.ca.pvs["MTR0102.RDBD"]
+
+        with self.assertRaises(KeyError):
+            with self.motion.moving(["MTR0101", "MTR0102"], targets={"MTR0102": 5.0}):
+                pass
+
+        assert_that(self.open_monitors(), is_(equal_to([])))
+
+
+class PositionMonitorTests(unittest.TestCase):
+    def test_GIVEN_monitor_closed_THEN_unsubscribed_and_later_updates_ignored(self):
+        ca = mock.Mock(create_pv_with_prefix=lambda pv: f"TE:MOT:{pv}")
+        unsubscribe = mock.Mock()
+        trace = AxisTrace("MTR0101")
+        with mock.patch.object(CaChannelWrapper, "add_monitor", return_value=unsubscribe) as add:
+            monitor = _PositionMonitor(ca, "MTR0101.RBV", trace)
+        callback = add.call_args.args[1]
+
+        callback(1.0, "NO_ALARM", "NO_ALARM")
+        monitor.close()
+        callback(2.0, "NO_ALARM", "NO_ALARM")
+        monitor.close()
+
+        unsubscribe.assert_called_once_with()
+        assert_that(trace.final_position(), equal_to(1.0))
+        assert_that(monitor.all_values, contains_exactly(1.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from time import monotonic
+
+from hamcrest import assert_that, contains_exactly, equal_to, is_, less_than
+
+from ..boot_scanner import BootScanner, BootScanResult
+from ..log_file import LogFileManager
+
+
+class BootScannerTests(unittest.TestCase):
+    def setUp(self):
+        self.scanner = BootScanner(["epics>"], failure_patterns=["Can't load dbd"])
+
+    def test_GIVEN_warnings_then_prompt_WHEN_scanned_THEN_succeeds_with_warnings_counted(self):
+        result = self.scanner.scan(
+            ["dbLoadRecords(test.db)\n", "macLib: macro P is undefined\n", "epics> \n"],
+            BootScanResult(),
+        )
+
+        assert_that(result.succeeded, is_(True))
+        assert_that(result.warning_count, equal_to(1))
+        assert_that(result.warning_lines, contains_exactly("macLib: macro P is undefined"))
+
+    def test_GIVEN_line_matching_warning_and_failure_WHEN_scanned_THEN_failure_wins(self):
+        result = self.scanner.scan(["ERROR: Can't load dbd file\n"], BootScanResult())
+
+        assert_that(result.failure_line, equal_to("ERROR: Can't load dbd file"))
+        assert_that(result.warning_count, equal_to(0))
+
+    def test_GIVEN_output_in_pieces_WHEN_scanned_THEN_result_builds_up(self):
+        result = BootScanResult()
+
+        self.scanner.scan(["Warning: slow\n"], result)
+        assert_that(result.finished, is_(False))
+        self.scanner.scan(["epics> \n"], result)
+
+        assert_that((result.succeeded, result.warning_count), equal_to((True, 1)))
+
+
+class WaitForBootTests(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.manager = LogFileManager(os.path.join(self.log_dir.name, "ioc.log"))
+        self.addCleanup(self.manager.close)
+
+    def test_GIVEN_failure_in_log_WHEN_waiting_for_boot_THEN_returns_without_timeout(self):
+        self.manager.log_file_w.write("iocInit: Database not loaded\n")
+        start = monotonic()
+
+        result = self.manager.wait_for_boot(120, BootScanner(["epics>"]))
+
+        assert_that(result.failure_line, equal_to("iocInit: Database not loaded"))
+        assert_that(monotonic() - start, less_than(1))
+
+    def test_GIVEN_no_prompt_WHEN_waiting_for_console_THEN_assertion_after_timeout(self):
+        self.manager.log_file_w.write("starting\n")
+
+        with self.assertRaises(AssertionError):
+            self.manager.wait_for_console(0.3, "epics>")
+
+
+if __name__ == "__main__":
+    unittest.main()
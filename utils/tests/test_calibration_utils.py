@@ -0,0 +1,89 @@
+import unittest
+
+from hamcrest import assert_that, calling, equal_to, raises
+
+from ..calibration_utils import CALIBRATION_MAX_TRIES, set_calibration_file, set_calibration_files
+
+
+class FakeChannelAccess:
+    """
+    The calibration PVs of some sensors, each of which loads a selected file after ignoring a number
+    of selections.
+    """
+
+    class Alarms:
+        NONE = "NO_ALARM"
+
+    def __init__(self, loaded, ignored_selections=None):
+        self.pvs = {}
+        for prefix, filename in loaded.items():
+            self.pvs[f"{prefix}CAL:RBV"] = filename
+            self.pvs[f"{prefix}CAL:SEL.SEVR"] = self.Alarms.NONE
+            self.pvs[f"{prefix}CAL:SEL:RBV.SEVR"] = self.Alarms.NONE
+        self.ignored_selections = dict(ignored_selections or {})
+        self.selections = []
+
+    def get_pv_value(self, pv):
+        return self.pvs[pv]
+
+    def set_pv_value(self, pv, value, sleep_after_set=None):
+        self.selections.append((pv, value))
+        prefix = pv[: -len("CAL:SEL")]
+        if self.ignored_selections.get(prefix, 0) > 0:
+            self.ignored_selections[prefix] -= 1
+        else:
+            self.pvs[f"{prefix}CAL:RBV"] = value
+
+    def assert_that_pv_is(self, pv, expected_value, timeout=None):
+        if self.pvs[pv] != expected_value:
+            raise AssertionError(f"{pv} is {self.pvs[pv]}")
+
+    def assert_that_pv_alarm_is(self, pv, alarm, timeout=None):
+        self.assert_that_pv_is(f"{pv}.SEVR", alarm)
+
+
+class SetCalibrationFilesTests(unittest.TestCase):
+    def test_GIVEN_file_already_loaded_THEN_not_selected(self):
+        ca = FakeChannelAccess({"A01:": "None.txt"})
+
+        set_calibration_file(ca, "None.txt", prefix="A01:")
+
+        assert_that(ca.selections, equal_to([]))
+
+    def test_GIVEN_sensors_WHEN_set_THEN_only_those_with_other_files_selected(self):
+        ca = FakeChannelAccess({"A01:": "None.txt", "A02:": "C.txt", "A03:": "None.txt"})
+
+        set_calibration_files(ca, {"A01:": "C.txt", "A02:": "C.txt", "A03:": "K.txt"})
+
+        assert_that(ca.selections, equal_to([("A01:CAL:SEL", "C.txt"), ("A03:CAL:SEL", "K.txt")]))
+        assert_that(ca.pvs["A03:CAL:RBV"], equal_to("K.txt"))
+
+    def test_GIVEN_selection_ignored_WHEN_set_THEN_only_that_sensor_selected_again(self):
+        ca = FakeChannelAccess({"A01:": "None.txt", "A02:": "None.txt"}, {"A02:": 2})
+
+        set_calibration_files(ca, {"A01:": "C.txt", "A02:": "C.txt"})
+
+        assert_that(
+            ca.selections,
+            equal_to(
+                [
+                    ("A01:CAL:SEL", "C.txt"),
+                    ("A02:CAL:SEL", "C.txt"),
+                    ("A02:CAL:SEL", "C.txt"),
+                    ("A02:CAL:SEL", "C.txt"),
+                ]
+            ),
+        )
+
+    def test_GIVEN_selection_always_ignored_WHEN_set_THEN_error_after_max_tries(self):
+        ca = FakeChannelAccess({"A01:": "None.txt"}, {"A01:": CALIBRATION_MAX_TRIES})
+
+        assert_that(
+            calling(set_calibration_file).with_args(ca, "C.txt", prefix="A01:"),
+            raises(ValueError, "A01:'C.txt'"),
+        )
+        assert_that(len(ca.selections), equal_to(CALIBRATION_MAX_TRIES))
+
+
+if __name__ == "__main__":
+    unittest.main()
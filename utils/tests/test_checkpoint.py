@@ -0,0 +1,89 @@
+import unittest
+
+from hamcrest import assert_that, equal_to
+
+from ..checkpoint import CheckpointItem, CheckpointRegister, restore_checkpoint_or_set_up
+
+
+class DeviceValue(CheckpointItem):
+    """
+    A value of a fake device, which can be put back unless it is fixed.
+    """
+
+    def __init__(self, device, name, fixed=False, tolerance=None):
+        super().__init__(tolerance)
+        self.device = device
+        self.name = name
+        self.restorable = not fixed
+
+    def read(self):
+        return self.device[self.name]
+
+    def restore(self, value):
+        self.device[self.name] = value
+
+    def describe(self):
+        return self.name
+
+
+class RestoreCheckpointOrSetUpTests(unittest.TestCase):
+    def setUp(self):
+        CheckpointRegister.clear()
+        self.addCleanup(CheckpointRegister.clear)
+        self.device = {}
+        self.set_up_calls = 0
+
+    def reset_device(self):
+        self.set_up_calls += 1
+        self.device.update({"temperature": 0.0, "calibration": "None.txt"})
+
+    def set_up(self, timeout=1):
+        restore_checkpoint_or_set_up(
+            self,
+            self.reset_device,
+            lambda: [
+                DeviceValue(self.device, "calibration", fixed=True),
+                DeviceValue(self.device, "temperature", tolerance=0.1),
+            ],
+            timeout=timeout,
+        )
+
+    def test_GIVEN_checkpoint_WHEN_nothing_changed_THEN_not_set_up_again(self):
+        self.set_up()
+        self.set_up()
+
+        assert_that(self.set_up_calls, equal_to(1))
+
+    def test_GIVEN_checkpoint_WHEN_restorable_value_changed_THEN_only_it_is_put_back(self):
+        self.set_up()
+        self.device["temperature"] = 50.0
+
+        self.set_up()
+
+        assert_that(self.device["temperature"], equal_to(0.0))
+        assert_that(self.set_up_calls, equal_to(1))
+
+    def test_GIVEN_checkpoint_WHEN_value_which_can_not_be_put_back_changed_THEN_set_up_again(self):
+        self.set_up()
+        self.device["calibration"] = "other.txt"
+
+        self.set_up()
+
+        assert_that(self.device["calibration"], equal_to("None.txt"))
+        assert_that(self.set_up_calls, equal_to(2))
+
+    def test_GIVEN_checkpoint_WHEN_put_back_but_does_not_hold_THEN_set_up_again(self):
+        self.set_up()
+        item_restore = DeviceValue.restore
+        self.addCleanup(setattr, DeviceValue, "restore", item_restore)
+        DeviceValue.restore = lambda item, value: None
+        self.device["temperature"] = 50.0
+
+        self.set_up(timeout=0.2)
+
+        assert_that(self.device["temperature"], equal_to(0.0))
+        assert_that(self.set_up_calls, equal_to(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,20 @@
 import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from time import sleep
 
-from hamcrest import assert_that, equal_to, has_length, is_
+from hamcrest import assert_that, calling, equal_to, has_length, is_, raises
 
-from ..emulator_launcher import CommandLineEmulatorLauncher
+from utils.emulator_exceptions import EmulatorDiedException
+
+from ..emulator_launcher import (
+    CommandLineEmulatorLauncher,
+    LewisLauncher,
+    ReplayEmulatorLauncher,
+)
+from ..stream_recording import StreamRecording
 
 
 class TestEmulatorLauncher(unittest.TestCase):
@@ -70,5 +80,88 @@ class TestEmulatorLauncher(unittest.TestCase):
         assert_that(emulator._process.children(recursive=True), is_(equal_to([])))
 
 
+class TestLewisLauncherWatchdog(unittest.TestCase):
+    def setUp(self):
+        self.var_dir = tempfile.TemporaryDirectory()
+        self.emulator = LewisLauncher(
+            "test_lewis_watchdog",
+            "watched_device",
+            "",
+            self.var_dir.name,
+            0,
+            {"emulator_watchdog_interval": 0.05},
+        )
+
+    def tearDown(self):
+        self.emulator._close()
+        self.var_dir.cleanup()
+
+    def _start_fake_emulator(self, code):
+        self.emulator._logFile = open(self.emulator._log_filename(), "a")
+        self.emulator._process = subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdout=self.emulator._logFile,
+            stderr=subprocess.STDOUT,
+        )
+        self.emulator._start_watchdog()
+
+    def _wait_for_watchdog(self):
+        for _ in range(100):
+            if self.emulator._watchdog.is_dead:
+                return
+            sleep(0.05)
+
+    def test_GIVEN_emulator_process_exits_THEN_backdoor_fails_immediately_with_diagnostics(self):
+        self._start_fake_emulator("print('emulator exploded'); raise SystemExit(3)")
+
+        self._wait_for_watchdog()
+
+        assert_that(self.emulator.check(), is_(equal_to(False)))
+        assert_that(
+            calling(self.emulator.backdoor_get_from_device).with_args("value"),
+            raises(EmulatorDiedException, "(?s)exited with code 3.*emulator exploded"),
+        )
+
+    def test_GIVEN_emulator_process_running_THEN_it_is_alive(self):
+        self._start_fake_emulator("import time; time.sleep(5)")
+
+        sleep(0.2)
+
+        assert_that(self.emulator.check(), is_(equal_to(True)))
+        self.emulator.assert_alive()
+        self.emulator._process.kill()
+        self.emulator._process.wait()
+
+
+class TestReplayEmulatorLauncher(unittest.TestCase):
+    def setUp(self):
+        self.var_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.var_dir.cleanup)
+        recording = StreamRecording("replayed_device")
+        recording.add_backdoor_value("test_one", "temperature", "12.5")
+        recording_file = os.path.join(self.var_dir.name, "recording.json")
+        recording.save(recording_file)
+        self.emulator = ReplayEmulatorLauncher(
+            "test_replay",
+            "replayed_device",
+            "",
+            self.var_dir.name,
+            None,
+            {"stream_recording_file": recording_file, "default_timeout": 0.5},
+        )
+        self.emulator._open()
+        self.addCleanup(self.emulator._close)
+        self.emulator.start_test("test_one")
+
+    def test_GIVEN_recorded_value_WHEN_asserted_without_timeout_THEN_passes(self):
+        self.emulator.assert_that_emulator_value_is("temperature", "12.5")
+
+    def test_GIVEN_other_value_WHEN_asserted_without_timeout_THEN_fails_after_default_timeout(self):
+        assert_that(
+            calling(self.emulator.assert_that_emulator_value_is).with_args("temperature", "20"),
+            raises(AssertionError, "Expected emulator to have value"),
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
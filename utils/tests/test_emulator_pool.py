@@ -0,0 +1,77 @@
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+from time import sleep
+
+from hamcrest import assert_that, contains_string, equal_to, has_length, is_, none, not_none
+
+from ..emulator_pool import LewisInterpreterPool
+from ..lewis_pool_worker import READY_MESSAGE
+
+FAKE_WORKER = textwrap.dedent(
+    f"""
+    import json, sys, time
+    print("{READY_MESSAGE}", flush=True)
+    request = json.loads(sys.stdin.readline())
+    with open(request["log_file"], "a") as f:
+        f.write(" ".join(request["arguments"]))
+    time.sleep(10)
+    """
+)
+
+
+class LewisInterpreterPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.worker_script = os.path.join(self.directory.name, "fake_worker.py")
+        with open(self.worker_script, "w") as f:
+            f.write(FAKE_WORKER)
+        self.log_file = os.path.join(self.directory.name, "lewis.log")
+        self.pool = LewisInterpreterPool(
+            sys.executable, None, None, 1, worker_script=self.worker_script
+        )
+
+    def tearDown(self):
+        self.pool.close()
+        self.directory.cleanup()
+
+    def test_GIVEN_pool_WHEN_worker_claimed_THEN_emulator_runs_with_arguments_and_pool_is_refilled(
+        self,
+    ):
+        self.pool.fill()
+
+        process = self.pool.claim(["-e", "100", "device"], self.log_file, timeout=10)
+
+        assert_that(process, is_(not_none()))
+        for _ in range(100):
+            if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+                break
+            sleep(0.05)
+        with open(self.log_file) as f:
+            assert_that(f.read(), contains_string("-e 100 device"))
+        assert_that(self.pool._idle, has_length(1))
+        process.kill()
+        process.wait()
+
+    def test_GIVEN_pool_size_zero_WHEN_getting_pool_THEN_pooling_is_off(self):
+        LewisInterpreterPool.configure(0)
+
+        assert_that(LewisInterpreterPool.get(sys.executable, None, None), is_(none()))
+
+    def test_GIVEN_worker_exits_during_start_up_WHEN_claimed_THEN_no_process_returned(self):
+        broken_pool = LewisInterpreterPool(
+            sys.executable, None, None, 1, worker_script=self.log_file
+        )
+        broken_pool.fill()
+        broken_pool._idle[0].process.wait()
+
+        process = broken_pool.claim(["device"], self.log_file, timeout=1)
+
+        assert_that(process, is_(equal_to(None)))
+        broken_pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+from hamcrest import assert_that, contains_exactly, equal_to
+
+from ..flakiness import (
+    MIN_RUNS_FOR_ADAPTIVE_RETRIES,
+    REGRESSION_RUNS,
+    FlakinessStore,
+    TestAttempts,
+    failure_signature,
+)
+
+TEST = "tests.galil.GalilTests.test_WHEN_moved"
+FLAKE = failure_signature(AssertionError("Expected 1.0 but was 2.5"))
+
+
+def attempts(outcome, failures, retry_time):
+    test_attempts = TestAttempts()
+    test_attempts.attempts = len(failures) + (1 if outcome == "passed" else 0)
+    test_attempts.retry_time = retry_time
+    test_attempts.failures = list(failures)
+    return test_attempts
+
+
+class FailureSignatureTests(unittest.TestCase):
+    def test_GIVEN_failures_differing_only_in_numbers_THEN_signatures_equal(self):
+        assert_that(
+            failure_signature(AssertionError("Expected 3 but was -4.5e3\nmore detail")),
+            equal_to(FLAKE),
+        )
+
+
+class FlakinessStoreTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = FlakinessStore(os.path.join(directory.name, "flakiness.sqlite3"))
+        self.addCleanup(self.store.close)
+
+    def record(self, test, outcome, failures, retry_time=0.0):
+        self.store.record(test, "run", outcome, attempts(outcome, failures, retry_time), 1.0)
+
+    def test_GIVEN_too_little_history_THEN_max_retries(self):
+        for _ in range(MIN_RUNS_FOR_ADAPTIVE_RETRIES - 1):
+            self.record(TEST, "passed", [])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(3))
+
+    def test_GIVEN_failure_failing_every_attempt_in_recent_runs_THEN_not_retried(self):
+        for _ in range(MIN_RUNS_FOR_ADAPTIVE_RETRIES):
+            self.record(TEST, "passed", [])
+        for _ in range(REGRESSION_RUNS):
+            self.record(TEST, "failed", [FLAKE, FLAKE])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(0))
+
+    def test_GIVEN_failure_failing_every_attempt_in_one_run_THEN_retried_once(self):
+        for _ in range(MIN_RUNS_FOR_ADAPTIVE_RETRIES):
+            self.record(TEST, "passed", [])
+        self.record(TEST, "failed", [FLAKE, FLAKE])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(1))
+
+    def test_GIVEN_stable_history_WHEN_first_flake_THEN_retried_and_then_learned(self):
+        for _ in range(MIN_RUNS_FOR_ADAPTIVE_RETRIES):
+            self.record(TEST, "passed", [])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(1))
+
+        # The retry passed
+        self.record(TEST, "passed", [FLAKE])
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(3))
+
+    def test_GIVEN_rare_flake_THEN_retried_fewer_than_max_retries(self):
+        # 1 failed attempt in 20
+        self.record(TEST, "passed", [FLAKE])
+        for _ in range(18):
+            self.record(TEST, "passed", [])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 5), equal_to(2))
+
+    def test_GIVEN_frequent_flake_THEN_max_retries(self):
+        for _ in range(MIN_RUNS_FOR_ADAPTIVE_RETRIES):
+            self.record(TEST, "passed", [FLAKE])
+
+        assert_that(self.store.retry_budget(TEST, FLAKE, 3), equal_to(3))
+
+    def test_GIVEN_retries_THEN_flakiest_ranked_by_time_spent_retrying(self):
+        self.record("a", "passed", [FLAKE], retry_time=2.0)
+        self.record("b", "passed", [FLAKE], retry_time=5.0)
+        self.record("c", "passed", [])
+
+        assert_that([test["test"] for test in self.store.flakiest(5)], contains_exactly("b", "a"))
+
+
+if __name__ == "__main__":
+    unittest.main()
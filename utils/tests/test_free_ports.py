@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from hamcrest import assert_that, equal_to, has_length, is_not, only_contains
+
+from .. import free_ports
+from ..free_ports import PORT_BLOCK_SIZE, PortLeaseRegister, get_free_ports, release_ports
+
+# Larger than the largest process id of Windows and Linux
+EXITED_PID = 2**31 - 1
+
+
+class PortLeaseRegisterTests(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(self.reset_register)
+
+    def reset_register(self):
+        PortLeaseRegister.release_all()
+        PortLeaseRegister.LeaseDirectory = None
+
+    def share(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        PortLeaseRegister.share(directory.name)
+        return directory.name
+
+    def test_GIVEN_ports_leased_THEN_no_port_leased_twice(self):
+        ports = get_free_ports(3) + get_free_ports(PORT_BLOCK_SIZE)
+
+        assert_that(set(ports), has_length(len(ports)))
+
+    def test_GIVEN_port_released_THEN_leased_again_after_other_free_ports(self):
+        (port,) = get_free_ports(1)
+        release_ports(port)
+
+        assert_that(get_free_ports(1), is_not(equal_to((port,))))
+        assert_that(PortLeaseRegister.Free[-1], equal_to(port))
+
+    def test_GIVEN_busy_ports_WHEN_leasing_THEN_they_are_kept_to_try_again(self):
+        with mock.patch.object(free_ports, "_port_is_free", side_effect=lambda port: port % 2 == 0):
+            ports = get_free_ports(3)
+        release_ports(*ports)
+
+        assert_that(PortLeaseRegister.Blocks, has_length(1))
+        assert_that(set(PortLeaseRegister.Free), has_length(PORT_BLOCK_SIZE))
+
+    def test_GIVEN_whole_block_busy_WHEN_leasing_THEN_next_block_claimed_and_busy_ports_kept(self):
+        busy_block = self.first_block()
+        with mock.patch.object(
+            free_ports,
+            "_port_is_free",
+            side_effect=lambda port: not busy_block <= port < busy_block + PORT_BLOCK_SIZE,
+        ):
+            (port,) = get_free_ports(1)
+
+        assert_that(PortLeaseRegister.Blocks, has_length(2))
+        assert_that(port, is_not(equal_to(busy_block)))
+        assert_that(
+            set(range(busy_block, busy_block + PORT_BLOCK_SIZE)) - set(PortLeaseRegister.Free),
+            equal_to(set()),
+        )
+
+    def test_GIVEN_scope_WHEN_exited_THEN_ports_leased_in_it_released(self):
+        (kept,) = get_free_ports(1)
+        with PortLeaseRegister.scope():
+            get_free_ports(2)
+
+        assert_that(PortLeaseRegister.Leased, equal_to({kept}))
+
+    def first_block(self):
+        get_free_ports(1)
+        block = PortLeaseRegister.Blocks[0]
+        PortLeaseRegister.release_all()
+        return block
+
+    def claim_in_lease_file(self, directory, block, pid):
+        with open(os.path.join(directory, f"{block}.lease"), "w") as f:
+            f.write(str(pid))
+
+    def test_GIVEN_shared_WHEN_block_leased_THEN_lease_file_written_and_removed_on_release_all(
+        self,
+    ):
+        directory = self.share()
+        get_free_ports(1)
+        lease_file = os.path.join(directory, f"{PortLeaseRegister.Blocks[0]}.lease")
+
+        with open(lease_file) as f:
+            assert_that(f.read(), equal_to(str(os.getpid())))
+        PortLeaseRegister.release_all()
+        assert_that(os.path.exists(lease_file), equal_to(False))
+
+    def test_GIVEN_shared_WHEN_block_claimed_by_running_process_THEN_other_block_claimed(self):
+        block = self.first_block()
+        directory = self.share()
+        self.claim_in_lease_file(directory, block, os.getppid())
+
+        get_free_ports(1)
+
+        assert_that(PortLeaseRegister.Blocks, only_contains(is_not(equal_to(block))))
+
+    def test_GIVEN_shared_WHEN_block_claimed_by_exited_process_THEN_block_taken_over(self):
+        block = self.first_block()
+        directory = self.share()
+        self.claim_in_lease_file(directory, block, EXITED_PID)
+
+        get_free_ports(1)
+
+        assert_that(PortLeaseRegister.Blocks, equal_to([block]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from time import monotonic, sleep
+
+import psutil
+from hamcrest import assert_that, calling, is_, less_than, raises
+
+from utils.test_modes import TestModes
+
+from ..ioc_launcher import MACROS_FILE, IocLauncher, IocsNotRunningCheck, ProcServLauncher
+
+
+class SlowToSearchIoc:
+    """
+    Stands in for an IOC launcher; searching for the existence PV takes the whole timeout unless
+    the IOC is running.
+    """
+
+    def __init__(self, device, running=False, existence_pv="DISABLE"):
+        self.device = device
+        self.running = running
+        self.existence_pv = None if existence_pv is None else f"TE:{device}:{existence_pv}"
+        self.checked_not_running = False
+
+    def is_running(self, timeout):
+        if not self.running:
+            sleep(timeout)
+        return self.running
+
+
+class IocsNotRunningCheckTests(unittest.TestCase):
+    def test_GIVEN_several_iocs_not_running_WHEN_checked_THEN_searched_at_once_and_marked(self):
+        iocs = [SlowToSearchIoc(f"IOC_{number:02d}") for number in range(1, 6)]
+        start = monotonic()
+
+        with IocsNotRunningCheck(iocs, timeout=0.3):
+            pass
+
+        assert_that(monotonic() - start, less_than(1.0))
+        assert_that(all(ioc.checked_not_running for ioc in iocs), is_(True))
+
+    def test_GIVEN_one_ioc_already_running_WHEN_checked_THEN_error_names_it(self):
+        iocs = [SlowToSearchIoc("IOC_01"), SlowToSearchIoc("STALE_01", running=True)]
+
+        assert_that(
+            calling(IocsNotRunningCheck(iocs, timeout=0.1).__enter__),
+            raises(AssertionError, "'STALE_01' \\(PV TE:STALE_01:DISABLE exists\\)"),
+        )
+        assert_that(iocs[0].checked_not_running, is_(False))
+
+    def test_GIVEN_ioc_without_existence_pv_WHEN_checked_THEN_it_is_left_to_check_itself(self):
+        ioc = SlowToSearchIoc("IOC_01", existence_pv=None)
+
+        with IocsNotRunningCheck([ioc]):
+            pass
+
+        assert_that(ioc.checked_not_running, is_(False))
+
+
+class UntrackableProcServLauncher(ProcServLauncher):
+    """
+    A procServ launcher which fails the test if it searches all processes.
+    """
+
+    def _find_processes(self):
+        raise AssertionError("Searched all processes")
+
+
+@unittest.skipUnless(sys.platform == "win32", "ProcServLauncher finds free ports the Windows way")
+class ProcServLauncherTests(unittest.TestCase):
+    def setUp(self):
+        self.var_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.var_dir.cleanup)
+        ioc = {
+            "name": "TEST_01",
+            "directory": self.var_dir.name,
+            "macros": {"EMULATOR_PORT": 0, "LOG_PORT": 0},
+        }
+        self.launcher = UntrackableProcServLauncher(
+            "test_module", ioc, TestModes.DEVSIM, self.var_dir.name
+        )
+        self.launcher._pid_file = os.path.join(self.var_dir.name, "EPICS_TEST_01.pid")
+
+    def test_GIVEN_tracked_procserv_with_child_WHEN_closed_THEN_tree_stopped_without_search(self):
+        code = (
+            "import subprocess, sys, time; "
+            "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+            "time.sleep(30)"
+        )
+        process = subprocess.Popen([sys.executable, "-c", code])
+        self.addCleanup(process.wait)
+        procserv = psutil.Process(process.pid)
+        deadline = monotonic() + 5
+        while not procserv.children() and monotonic() < deadline:
+            sleep(0.05)
+        child = procserv.children()[0]
+        self.launcher._procserv_processes = [procserv]
+
+        self.launcher.close()
+
+        assert_that(procserv.is_running() and procserv.status() != psutil.STATUS_ZOMBIE, is_(False))
+        assert_that(child.is_running() and child.status() != psutil.STATUS_ZOMBIE, is_(False))
+
+
+class MacrosFileTests(unittest.TestCase):
+    def setUp(self):
+        self.var_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.var_dir.cleanup)
+        ioc = {
+            "name": "TEST_01",
+            "directory": self.var_dir.name,
+            "macros": {"EMULATOR_PORT": 1234, "MODE": "FAST"},
+        }
+        self.launcher = IocLauncher("test_module", ioc, TestModes.DEVSIM, self.var_dir.name)
+
+    def test_GIVEN_new_macros_WHEN_macros_file_written_THEN_replaces_old_file_whole(self):
+        self.launcher.create_macros_file()
+        self.launcher.macros = {"MODE": "SLOW"}
+
+        self.launcher.create_macros_file()
+
+        tmp_dir = os.path.join(self.var_dir.name, "tmp")
+        assert_that(sorted(os.listdir(tmp_dir)), is_([MACROS_FILE]))
+        with open(os.path.join(tmp_dir, MACROS_FILE)) as f:
+            assert_that(f.read(), is_('TEST_01__MODE="SLOW"\n'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from time import monotonic
+
+from hamcrest import assert_that, calling, contains_string, less_than, raises
+
+from ..ioc_readiness import IocBoot, LogContains, ReadinessCondition, wait_until_ready
+
+
+class MetAfter(ReadinessCondition):
+    """
+    A condition which holds once some time has passed.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.time_met = monotonic() + seconds
+
+    def is_met(self, boot: IocBoot) -> bool:
+        return monotonic() >= self.time_met
+
+    def describe(self) -> str:
+        return "time has passed"
+
+
+class RaisesError(ReadinessCondition):
+    """
+    A condition which can not be checked.
+    """
+
+    def is_met(self, boot: IocBoot) -> bool:
+        raise ConnectionError("PV disconnected")
+
+    def describe(self) -> str:
+        return "PV is connected"
+
+
+class IocReadinessTests(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log_file_name = os.path.join(self.log_dir.name, "ioc.log")
+        open(self.log_file_name, "w").close()
+        self.boot = IocBoot(None, self.log_file_name)
+        self.addCleanup(self.boot.close)
+
+    def test_GIVEN_several_slow_conditions_WHEN_waiting_THEN_they_are_checked_together(self):
+        start = monotonic()
+
+        wait_until_ready([MetAfter(0.5), MetAfter(0.5), MetAfter(0.5)], self.boot, timeout=5)
+
+        assert_that(monotonic() - start, less_than(1.2))
+
+    def test_GIVEN_condition_which_never_holds_WHEN_waiting_THEN_error_names_it(self):
+        assert_that(
+            calling(wait_until_ready).with_args(
+                [MetAfter(0), LogContains("never logged")], self.boot, timeout=0.5
+            ),
+            raises(AssertionError, "log contains 'never logged'"),
+        )
+
+    def test_GIVEN_condition_which_raises_WHEN_waiting_THEN_error_gives_last_exception(self):
+        assert_that(
+            calling(wait_until_ready).with_args([RaisesError()], self.boot, timeout=0.5),
+            raises(
+                AssertionError,
+                r"PV is connected \(last error: ConnectionError\('PV disconnected'\)\)",
+            ),
+        )
+
+    def test_GIVEN_log_from_previous_boot_WHEN_checking_log_THEN_only_this_boot_is_searched(self):
+        with open(self.log_file_name, "w") as f:
+            f.write("Controller connected\nold boot finished\n")
+        boot = IocBoot(None, self.log_file_name, os.path.getsize(self.log_file_name))
+        self.addCleanup(boot.close)
+        condition = LogContains("Controller connected")
+
+        self.assertFalse(condition.is_met(boot))
+        with open(self.log_file_name, "a") as f:
+            f.write("Controller connected\n")
+        self.assertTrue(condition.is_met(boot))
+        assert_that(boot.log_text(), contains_string("Controller connected"))
+
+    def test_GIVEN_several_log_conditions_WHEN_checked_together_THEN_no_lines_are_lost(self):
+        lines = [f"line {i}" for i in range(50)]
+        with open(self.log_file_name, "a") as f:
+            for line in lines:
+                f.write(f"{line}\n")
+                f.flush()
+
+        wait_until_ready([LogContains(line) for line in lines], self.boot, timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from time import sleep
+
+from hamcrest import assert_that, contains_exactly, greater_than_or_equal_to, has_entries, is_
+
+from ..launch_timing import LaunchTimingRegister, PhaseTimer
+
+
+class LaunchTimingTests(unittest.TestCase):
+    def tearDown(self):
+        LaunchTimingRegister.clear()
+
+    def test_GIVEN_phases_timed_WHEN_operation_finishes_THEN_phases_and_total_are_recorded(self):
+        timer = PhaseTimer("open")
+
+        with timer.measure_total():
+            with timer.phase("start process"):
+                sleep(0.05)
+            with timer.phase("wait for console"):
+                pass
+            with timer.phase("start process"):
+                sleep(0.05)
+
+        assert_that(list(timer.phases), contains_exactly("start process", "wait for console"))
+        assert_that(timer.phases["start process"], greater_than_or_equal_to(0.1))
+        assert_that(timer.total, greater_than_or_equal_to(timer.phases["start process"]))
+        assert_that(timer.failed, is_(False))
+
+    def test_GIVEN_failing_operation_WHEN_timed_THEN_it_is_marked_failed(self):
+        timer = PhaseTimer("open")
+
+        with self.assertRaises(ValueError), timer.measure_total(), timer.phase("inits"):
+            raise ValueError("bad init")
+
+        assert_that(timer.failed, is_(True))
+        assert_that(timer.phases, has_entries({"inits": greater_than_or_equal_to(0)}))
+
+    def test_GIVEN_records_from_several_devices_WHEN_summarised_THEN_slowest_phase_first(self):
+        for device, duration in (("IOC_A", 1.0), ("IOC_B", 3.0)):
+            timer = PhaseTimer("open")
+            timer.phases = {"wait for console": duration, "inits": 0.5}
+            timer.total = duration + 0.5
+            LaunchTimingRegister.add_record("module", "ioc", device, timer)
+
+        summary = LaunchTimingRegister.summary()
+
+        assert_that(
+            list(summary["by_phase"].items()),
+            contains_exactly(("ioc open: wait for console", 4.0), ("ioc open: inits", 1.0)),
+        )
+        assert_that(list(summary["by_device"]), contains_exactly("ioc IOC_B", "ioc IOC_A"))
+
+
+if __name__ == "__main__":
+    unittest.main()
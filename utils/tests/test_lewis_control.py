@@ -0,0 +1,175 @@
+import json
+import threading
+import unittest
+
+import numpy as np
+import zmq
+from hamcrest import assert_that, calling, equal_to, is_, none, raises
+from lewis.core.control_server import ControlServer, ExposedObject
+
+from utils.emulator_exceptions import EmulatorBackdoorException, UnableToConnectToEmulatorException
+
+from ..free_ports import get_free_ports, release_ports
+from ..lewis_control import LewisControlConnection, parse_backdoor_value
+
+
+class ParseBackdoorValueTests(unittest.TestCase):
+    def test_GIVEN_printed_literals_WHEN_parsed_THEN_python_values_returned(self):
+        assert_that(parse_backdoor_value("12"), is_(equal_to(12)))
+        assert_that(parse_backdoor_value("1.5\n"), is_(equal_to(1.5)))
+        assert_that(parse_backdoor_value("True"), is_(equal_to(True)))
+        assert_that(parse_backdoor_value("[1, 2.5]"), is_(equal_to([1, 2.5])))
+        assert_that(parse_backdoor_value("{'a': 1}"), is_(equal_to({"a": 1})))
+
+    def test_GIVEN_nothing_printed_WHEN_parsed_THEN_none_returned(self):
+        assert_that(parse_backdoor_value(""), is_(none()))
+
+    def test_GIVEN_printed_numpy_array_WHEN_parsed_THEN_array_returned(self):
+        value = parse_backdoor_value("[1.  2.5 3. ]")
+
+        np.testing.assert_array_equal(value, np.array([1.0, 2.5, 3.0]))
+
+    def test_GIVEN_plain_text_WHEN_parsed_THEN_text_returned_unchanged(self):
+        assert_that(parse_backdoor_value("idle"), is_(equal_to("idle")))
+
+
+class FakeDevice:
+    def __init__(self):
+        self.temperature = 20.5
+        self.mode = "idle"
+
+    def ramp(self, start, rate):
+        return [start, start + rate]
+
+    def reset(self):
+        self.temperature = 0.0
+        return "reset"
+
+    def fail(self):
+        raise ValueError("device broken")
+
+
+class LewisControlConnectionTests(unittest.TestCase):
+    """
+    Tests against a lewis control server in a thread of the test process.
+    """
+
+    def setUp(self):
+        self.port = get_free_ports(1)[0]
+        self.device = FakeDevice()
+        self.connection = LewisControlConnection("fake_device", "127.0.0.1", self.port, timeout=1)
+        self._stop = threading.Event()
+        self._server_thread = None
+
+    def tearDown(self):
+        self.connection.close()
+        self._stop_server()
+        release_ports(self.port)
+
+    def _start_server(self):
+        server = ControlServer(
+            {"device": ExposedObject(self.device, exclude_inherited=True)},
+            f"127.0.0.1:{self.port}",
+        )
+        server.start_server()
+
+        def serve():
+            try:
+                while not self._stop.is_set():
+                    server.process(blocking=True)
+            finally:
+                server._socket.close()
+
+        self._server_thread = threading.Thread(target=serve, daemon=True)
+        self._server_thread.start()
+
+    def _stop_server(self):
+        if self._server_thread is not None:
+            self._stop.set()
+            self._server_thread.join()
+
+    def test_GIVEN_property_WHEN_get_and_set_THEN_native_values_round_trip(self):
+        self._start_server()
+
+        assert_that(self.connection.get("device", "temperature"), is_(equal_to(20.5)))
+        self.connection.set("device", "mode", "ramping")
+
+        assert_that(self.device.mode, is_(equal_to("ramping")))
+        assert_that(self.connection.get("device", "mode"), is_(equal_to("ramping")))
+
+    def test_GIVEN_numpy_values_WHEN_set_THEN_device_gets_python_values(self):
+        self._start_server()
+
+        self.connection.set("device", "temperature", np.int64(7))
+        assert_that(self.device.temperature, is_(equal_to(7)))
+        assert_that(type(self.device.temperature), is_(equal_to(int)))
+
+        self.connection.set("device", "mode", np.array([1.5, 2.5]))
+        assert_that(self.device.mode, is_(equal_to([1.5, 2.5])))
+
+    def test_GIVEN_value_json_can_not_send_WHEN_set_THEN_backdoor_exception(self):
+        assert_that(
+            calling(self.connection.set).with_args("device", "mode", object()),
+            raises(EmulatorBackdoorException, "device.mode:set not sent"),
+        )
+
+    def test_GIVEN_method_WHEN_get_THEN_falls_back_to_calling_it(self):
+        self._start_server()
+
+        # device.reset:get does not exist (-32601), so device.reset is called instead
+        assert_that(self.connection.get("device", "reset"), is_(equal_to("reset")))
+        assert_that(self.device.temperature, is_(equal_to(0.0)))
+
+    def test_GIVEN_method_with_arguments_WHEN_called_THEN_result_returned(self):
+        self._start_server()
+
+        assert_that(self.connection.call("device", "ramp", 1, 2.5), is_(equal_to([1, 3.5])))
+
+    def test_GIVEN_unknown_member_WHEN_get_THEN_backdoor_exception_with_method_not_found(self):
+        self._start_server()
+
+        with self.assertRaises(EmulatorBackdoorException) as context:
+            self.connection.get("device", "pressure")
+
+        assert_that(context.exception.code, is_(equal_to(-32601)))
+
+    def test_GIVEN_method_raises_WHEN_called_THEN_backdoor_exception_has_reason(self):
+        self._start_server()
+
+        assert_that(
+            calling(self.connection.call).with_args("device", "fail"),
+            raises(EmulatorBackdoorException, "device broken"),
+        )
+
+    def test_GIVEN_no_server_WHEN_request_THEN_times_out_and_next_request_reconnects(self):
+        assert_that(
+            calling(self.connection.get).with_args("device", "temperature"),
+            raises(UnableToConnectToEmulatorException),
+        )
+
+        self._start_server()
+
+        assert_that(self.connection.get("device", "temperature"), is_(equal_to(20.5)))
+
+    def test_GIVEN_reply_to_another_request_WHEN_request_THEN_backdoor_exception(self):
+        stub = zmq.Context.instance().socket(zmq.REP)
+        stub.setsockopt(zmq.LINGER, 0)
+        stub.bind(f"tcp://127.0.0.1:{self.port}")
+        self.addCleanup(stub.close)
+
+        def reply_with_wrong_id():
+            request = json.loads(stub.recv_string())
+            stub.send_string(json.dumps({"jsonrpc": "2.0", "id": "other", "result": request}))
+
+        thread = threading.Thread(target=reply_with_wrong_id, daemon=True)
+        thread.start()
+
+        assert_that(
+            calling(self.connection.get).with_args("device", "temperature"),
+            raises(EmulatorBackdoorException, "did not match the request"),
+        )
+        thread.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import sys
+import tempfile
+import unittest
+
+from hamcrest import assert_that, close_to, equal_to, is_
+
+from ..emulator_launcher import Emulator, HostedLewisLauncher, SharedProcessMultiLewisLauncher
+from ..free_ports import get_free_ports, release_ports
+
+# Both devices are julabos from the example devices shipped with lewis
+DEVICE = "julabo"
+PROTOCOL = "julabo-version-1"
+INITIAL_SET_POINT = 24.0
+
+
+class SharedProcessMultiLewisLauncherTests(unittest.TestCase):
+    def setUp(self):
+        self.var_dir = tempfile.TemporaryDirectory()
+        self.ports = get_free_ports(2)
+        options = {
+            "python_path": sys.executable,
+            "lewis_protocol": PROTOCOL,
+            "lewis_package": "lewis.devices",
+            "lewis_additional_path": "",
+            "speed": 1,
+            "emulator_watchdog_interval": None,
+        }
+        self.launcher = SharedProcessMultiLewisLauncher(
+            "test_lewis_multi_host",
+            [
+                Emulator(address, DEVICE, self.var_dir.name, port, options)
+                for address, port in zip((1, 2), self.ports)
+            ],
+        )
+
+    def tearDown(self):
+        release_ports(*self.ports)
+        self.var_dir.cleanup()
+
+    def test_GIVEN_two_devices_WHEN_created_THEN_each_is_hosted_by_its_launcher_address(self):
+        for address, launcher in self.launcher.emulator_launchers.items():
+            assert_that(isinstance(launcher, HostedLewisLauncher), is_(True))
+            assert_that(launcher._device_object, is_(equal_to(f"device_{address}")))
+            assert_that(launcher._simulation_object, is_(equal_to(f"simulation_{address}")))
+
+    def test_GIVEN_two_devices_in_one_process_WHEN_set_on_one_THEN_only_that_device_changes(self):
+        with self.launcher:
+            process = self.launcher._process
+            for launcher in self.launcher.emulator_launchers.values():
+                assert_that(launcher._process, is_(process))
+
+            self.launcher.backdoor_set_on_device(1, "set_point_temperature", 30.0)
+            assert_that(
+                self.launcher.backdoor_get_value_from_device(2, "set_point_temperature"),
+                is_(close_to(INITIAL_SET_POINT, 1e-6)),
+            )
+            self.launcher.backdoor_set_on_device(2, "set_point_temperature", 12.5)
+
+            assert_that(
+                self.launcher.backdoor_get_value_from_device(1, "set_point_temperature"),
+                is_(close_to(30.0, 1e-6)),
+            )
+            assert_that(
+                self.launcher.backdoor_get_value_from_device(2, "set_point_temperature"),
+                is_(close_to(12.5, 1e-6)),
+            )
+        process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import gzip
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from hamcrest import assert_that, contains_exactly, equal_to, has_length, is_, none
+
+from .. import log_archive
+from ..log_archive import archive_logs, line_time, load_index, query
+
+IOC_LOG = "log_tests_galil_devsim_GALIL_01_ioc.log"
+LEWIS_LOG = "log_tests_galil_devsim_galil_lewis.log"
+
+
+def timestamp(second):
+    return datetime(2024, 1, 31, 12, 0, second).timestamp()
+
+
+class LineTimeTests(unittest.TestCase):
+    def test_GIVEN_epics_timestamp_THEN_time_returned(self):
+        assert_that(
+            line_time("2024/01/31 12:00:05.250 asyn: read error"), equal_to(timestamp(5) + 0.25)
+        )
+
+    def test_GIVEN_python_logging_timestamp_THEN_time_returned(self):
+        assert_that(line_time("2024-01-31 12:00:05,000 INFO: device"), equal_to(timestamp(5)))
+
+    def test_GIVEN_no_timestamp_THEN_none(self):
+        assert_that(line_time("epics> dbl"), is_(none()))
+
+
+class ArchiveLogsTests(unittest.TestCase):
+    def setUp(self):
+        log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(log_dir.cleanup)
+        self.log_dir = log_dir.name
+        self.write(
+            IOC_LOG,
+            [f"2024/01/31 12:00:{second:02d}.000 ioc line {second}" for second in range(20)],
+        )
+        self.write(
+            LEWIS_LOG,
+            ["2024-01-31 12:00:10,500 lewis line", "a line without its own time"],
+        )
+        self.tests = [
+            {
+                "test": "tests.galil.GalilTests.test_WHEN_moved",
+                "start": timestamp(9),
+                "end": timestamp(11),
+            }
+        ]
+
+    def write(self, name, lines):
+        with open(os.path.join(self.log_dir, name), "a") as f:
+            f.writelines(f"{line}\n" for line in lines)
+
+    def test_GIVEN_logs_WHEN_archived_THEN_logs_emptied_and_archive_is_gzip(self):
+        run_dir = archive_logs(self.log_dir, self.tests)
+
+        assert_that(os.path.getsize(os.path.join(self.log_dir, IOC_LOG)), equal_to(0))
+        with gzip.open(os.path.join(run_dir, f"{IOC_LOG}.gz"), "rt") as f:
+            assert_that(f.readlines(), has_length(20))
+
+    def test_GIVEN_archived_run_WHEN_querying_test_THEN_lines_of_all_logs_in_time_order(self):
+        run_dir = archive_logs(self.log_dir, self.tests)
+
+        [(test, lines)] = list(query(run_dir, "test_WHEN_moved", margin=0))
+
+        assert_that(
+            [(source, line) for _, source, line in lines],
+            contains_exactly(
+                ("GALIL_01 ioc", "2024/01/31 12:00:09.000 ioc line 9"),
+                ("GALIL_01 ioc", "2024/01/31 12:00:10.000 ioc line 10"),
+                ("galil lewis", "2024-01-31 12:00:10,500 lewis line"),
+                ("galil lewis", "a line without its own time"),
+                ("GALIL_01 ioc", "2024/01/31 12:00:11.000 ioc line 11"),
+            ),
+        )
+
+    def test_GIVEN_many_blocks_WHEN_querying_THEN_only_blocks_in_window_decompressed(self):
+        with mock.patch.object(log_archive, "ARCHIVE_BLOCK_SIZE", 100):
+            run_dir = archive_logs(self.log_dir, self.tests)
+
+        with mock.patch.object(log_archive, "_block_lines", wraps=log_archive._block_lines) as read:
+            for _, lines in query(run_dir, "test_WHEN_moved", devices=["GALIL_01"], margin=0):
+                list(lines)
+
+        ioc_log = next(log for log in load_index(run_dir)["logs"] if log["log"] == IOC_LOG)
+        assert_that(ioc_log["blocks"], has_length(7))
+        assert_that(read.call_count, equal_to(1))
+
+    def test_GIVEN_nothing_logged_since_archive_WHEN_archiving_THEN_no_new_run(self):
+        archive_logs(self.log_dir, self.tests)
+
+        assert_that(archive_logs(self.log_dir, []), is_(none()))
+
+
+if __name__ == "__main__":
+    unittest.main()
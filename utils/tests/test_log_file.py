@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from hamcrest import assert_that, contains_exactly, empty, equal_to, has_length, is_
+
+from ..log_file import LogFileManager
+
+
+class LogFileManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.filename = os.path.join(self.log_dir.name, "ioc.log")
+        self.manager = LogFileManager(self.filename)
+        self.addCleanup(self.manager.close)
+
+    def write(self, data):
+        with open(self.filename, "ab") as f:
+            f.write(data)
+
+    def test_GIVEN_many_lines_WHEN_read_THEN_all_returned_in_one_read(self):
+        self.write(b"".join(b"asyn error %d\r\n" % i for i in range(10000)))
+
+        lines = self.manager.read_log()
+
+        assert_that(lines, has_length(10000))
+        assert_that(lines[-1], equal_to("asyn error 9999\n"))
+        assert_that(self.manager.read_log(), is_(empty()))
+
+    def test_GIVEN_partial_line_WHEN_read_THEN_returned_once_complete(self):
+        self.write(b"first\nsec")
+
+        assert_that(self.manager.read_log(), contains_exactly("first\n"))
+        assert_that(self.manager.partial_line, equal_to("sec"))
+        self.write(b"ond\n")
+        assert_that(self.manager.read_log(), contains_exactly("second\n"))
+
+    def test_GIVEN_multibyte_character_split_between_reads_WHEN_read_THEN_decoded(self):
+        data = "temperature 5 °C\n".encode()
+        self.write(data[:-3])
+        self.manager.read_log()
+        self.write(data[-3:])
+
+        assert_that(self.manager.read_log(), contains_exactly("temperature 5 °C\n"))
+
+    def test_GIVEN_log_truncated_WHEN_read_THEN_read_from_start(self):
+        self.write(b"old line one\nold line two\n")
+        self.manager.read_log()
+        with open(self.filename, "wb") as f:
+            f.write(b"new\n")
+
+        assert_that(self.manager.read_log(), contains_exactly("new\n"))
+
+    def test_GIVEN_log_rotated_WHEN_read_THEN_new_file_read_from_start(self):
+        self.write(b"old\n")
+        self.manager.read_log()
+        os.replace(self.filename, self.filename + ".1")
+        with open(self.filename, "wb") as f:
+            f.write(b"rotated but longer than before\n")
+
+        assert_that(self.manager.read_log(), contains_exactly("rotated but longer than before\n"))
+
+    def test_GIVEN_prompt_without_newline_WHEN_waiting_for_console_THEN_found(self):
+        self.write(b"iocInit\nepics> ")
+
+        self.manager.wait_for_console(1, "epics>")
+
+
+if __name__ == "__main__":
+    unittest.main()
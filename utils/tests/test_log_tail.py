@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+from hamcrest import assert_that, contains_exactly, empty, equal_to, is_
+
+from ..log_tail import LogTailService
+
+
+class LogTailServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.filename = os.path.join(self.log_dir.name, "ioc.log")
+        open(self.filename, "w").close()
+        self.service = LogTailService(use_notifications=False)
+        self.addCleanup(self.service.close)
+
+    def write(self, text):
+        with open(self.filename, "a") as f:
+            f.write(text)
+
+    def test_GIVEN_two_subscribers_WHEN_lines_written_THEN_both_receive_them(self):
+        first = self.service.subscribe(self.filename)
+        second = self.service.subscribe(self.filename)
+
+        self.write("one\ntwo\n")
+
+        assert_that(first.read_lines(), contains_exactly("one\n", "two\n"))
+        assert_that(second.read_lines(), contains_exactly("one\n", "two\n"))
+        assert_that(first.read_lines(), is_(empty()))
+
+    def test_GIVEN_no_read_WHEN_lines_written_THEN_waiting_subscriber_woken_by_service(self):
+        log = self.service.subscribe(self.filename)
+
+        self.write("epics> ")
+
+        assert_that(log.wait_for_output(5), is_(True))
+        assert_that(log.partial_line, equal_to("epics> "))
+
+    def test_GIVEN_start_before_lines_already_read_WHEN_subscribing_THEN_earlier_lines_received(
+        self,
+    ):
+        self.write("previous boot\n")
+        start = os.path.getsize(self.filename)
+        first = self.service.subscribe(self.filename)
+        self.write("this boot\n")
+        first.read_lines()
+
+        second = self.service.subscribe(self.filename, start=start)
+        self.write("after\n")
+
+        assert_that(second.read_lines(), contains_exactly("this boot\n", "after\n"))
+
+    def test_GIVEN_last_subscriber_closed_THEN_log_no_longer_watched(self):
+        log = self.service.subscribe(self.filename)
+        assert_that(self.service.watched(), contains_exactly(os.path.abspath(self.filename)))
+
+        log.close()
+
+        assert_that(self.service.watched(), is_(empty()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import unittest
+from time import monotonic, sleep
+
+from hamcrest import assert_that, empty, has_length, is_, less_than
+
+from ..process_tree import kill_processes, process_tree, terminate_processes, wait_for_exit
+
+# Starts a child which sleeps, then sleeps itself
+PARENT_AND_CHILD = (
+    "import subprocess, sys, time; "
+    "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+    "time.sleep(30)"
+)
+
+IGNORES_TERMINATE = (
+    "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"
+)
+
+
+class ProcessTreeTests(unittest.TestCase):
+    def start(self, code):
+        process = subprocess.Popen([sys.executable, "-c", code])
+        self.addCleanup(process.wait)
+        self.addCleanup(lambda: kill_processes(process_tree(process.pid), timeout=1))
+        return process
+
+    def test_GIVEN_process_with_child_WHEN_terminated_THEN_whole_tree_stops_quickly(self):
+        process = self.start(PARENT_AND_CHILD)
+        deadline = monotonic() + 5
+        while len(process_tree(process.pid)) < 2 and monotonic() < deadline:
+            sleep(0.05)
+        processes = process_tree(process.pid)
+        assert_that(processes, has_length(2))
+
+        start = monotonic()
+        still_running = terminate_processes(processes, timeout=5)
+
+        assert_that(still_running, is_(empty()))
+        assert_that(monotonic() - start, less_than(2))
+
+    def test_GIVEN_running_process_WHEN_waiting_for_exit_THEN_it_is_still_running(self):
+        process = self.start(IGNORES_TERMINATE)
+
+        assert_that(wait_for_exit(process_tree(process.pid), timeout=0.1), has_length(1))
+
+    @unittest.skipIf(sys.platform == "win32", "terminate is kill on Windows")
+    def test_GIVEN_process_ignoring_terminate_WHEN_killed_THEN_it_stops(self):
+        process = self.start(IGNORES_TERMINATE)
+        sleep(0.5)
+        processes = process_tree(process.pid)
+
+        assert_that(terminate_processes(processes, timeout=0.2), has_length(1))
+        assert_that(kill_processes(processes, timeout=2), is_(empty()))
+
+    def test_GIVEN_process_gone_WHEN_getting_tree_THEN_empty(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+
+        assert_that(process_tree(process.pid), is_(empty()))
+
+
+if __name__ == "__main__":
+    unittest.main()
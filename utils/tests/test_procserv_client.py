@@ -0,0 +1,159 @@
+import asyncio
+import socketserver
+import threading
+import unittest
+from time import monotonic
+
+from hamcrest import (
+    assert_that,
+    calling,
+    contains_exactly,
+    ends_with,
+    equal_to,
+    has_properties,
+    less_than,
+    raises,
+)
+
+from ..procserv_client import (
+    AUTORESTART_MODE,
+    AUTORESTART_TOGGLED,
+    CHILD_EXITED,
+    CONNECTED,
+    RESTARTED,
+    ProcServConnection,
+    ProcServControlClient,
+    parse_status_line,
+    strip_telnet_commands,
+)
+
+WELCOME = (
+    b"\xff\xfb\x01"  # IAC WILL ECHO
+    b"@@@ Welcome to procServ (procServ Version 2.8.0)\r\n"
+    b"@@@ Use ^X to kill the child, auto restart is ON, use ^T to toggle auto restart\r\n"
+    b"@@@ 0 user(s) and 0 logger(s) connected (plus you)\r\n"
+)
+
+
+class FakeProcServ(socketserver.BaseRequestHandler):
+    """
+    Answers like procServ running an IOC in auto restart mode.
+    """
+
+    def handle(self):
+        autorestart = True
+        pid = 100
+        self.request.sendall(WELCOME)
+        while data := self.request.recv(1024):
+            for command in data.decode("ascii").splitlines(keepends=True):
+                if command.startswith("\x18"):
+                    self.request.sendall(
+                        f"@@@ Received a sigChild for process {pid}. Normal exit status = 0\r\n"
+                        f'@@@ Restarting child "TEST"\r\n'.encode("ascii")
+                    )
+                    pid += 1
+                    self.request.sendall(
+                        f'@@@ The PID of new child "TEST" is: {pid}\r\niocInit\r\nepics> '.encode()
+                    )
+                elif command == "-\n":
+                    autorestart = not autorestart
+                    mode = "ON" if autorestart else "OFF"
+                    self.request.sendall(f"@@@ Toggled auto restart mode to {mode}\r\n".encode())
+                elif command.endswith("\n"):
+                    self.request.sendall(f"{command.strip()}\r\nepics> ".encode("ascii"))
+
+
+class ProcServClientTests(unittest.TestCase):
+    def setUp(self):
+        self.server = socketserver.ThreadingTCPServer(("localhost", 0), FakeProcServ)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = ProcServControlClient()
+        self.addCleanup(self.client.close)
+
+    def test_GIVEN_procserv_WHEN_connected_THEN_welcome_and_autorestart_mode_are_events(self):
+        event = self.client.connect("TEST", self.server.server_address[1])
+
+        assert_that(event.kind, equal_to(CONNECTED))
+        self.client.wait_for_event("TEST", AUTORESTART_MODE, timeout=5, start=0)
+        assert_that(
+            [event.kind for event in self.client.events("TEST")],
+            contains_exactly(CONNECTED, AUTORESTART_MODE),
+        )
+
+    def test_GIVEN_connected_WHEN_restarting_THEN_confirmed_by_events_and_prompt(self):
+        self.client.connect("TEST", self.server.server_address[1])
+        start = monotonic()
+
+        exited = self.client.command("TEST", "\x18", event=CHILD_EXITED, timeout=5)
+        restarted = self.client.wait_for_event("TEST", RESTARTED, timeout=5, start=exited.position)
+        output = self.client.wait_for_text("TEST", "epics>", timeout=5, start=restarted.position)
+
+        assert_that(monotonic() - start, less_than(1))
+        assert_that(exited, has_properties(pid=100))
+        assert_that(restarted, has_properties(pid=101))
+        assert_that(output, equal_to("iocInit\r\nepics>"))
+
+    def test_GIVEN_connected_WHEN_toggling_autorestart_THEN_new_mode_reported(self):
+        self.client.connect("TEST", self.server.server_address[1])
+
+        event = self.client.command("TEST", "-\n", event=AUTORESTART_TOGGLED, timeout=5)
+
+        assert_that(event.autorestart, equal_to("OFF"))
+
+    def test_GIVEN_connected_WHEN_sending_shell_command_THEN_waits_for_prompt(self):
+        self.client.connect("TEST", self.server.server_address[1])
+
+        output = self.client.command("TEST", "dbl\n", expect="epics> ", timeout=5)
+
+        assert_that(output, ends_with("dbl\r\nepics> "))
+
+    def test_GIVEN_no_confirmation_WHEN_sending_command_THEN_times_out(self):
+        self.client.connect("TEST", self.server.server_address[1])
+
+        assert_that(
+            calling(self.client.command).with_args(
+                "TEST", "dbl\n", expect="never printed", timeout=0.2
+            ),
+            raises(TimeoutError),
+        )
+
+    def test_GIVEN_several_procservs_WHEN_connected_together_THEN_all_kept_open(self):
+        async def connect_all():
+            connections = [
+                ProcServConnection(f"IOC_{n}", self.server.server_address[1]) for n in range(5)
+            ]
+            await asyncio.gather(*(connection.open(timeout=5) for connection in connections))
+            await asyncio.gather(
+                *(
+                    connection.command("\x18", event=RESTARTED, timeout=5)
+                    for connection in connections
+                )
+            )
+            for connection in connections:
+                await connection.close()
+            return connections
+
+        connections = asyncio.run(connect_all())
+
+        assert_that(
+            [connection.events[-1].kind for connection in connections],
+            contains_exactly(*[RESTARTED] * 5),
+        )
+
+
+class ProcServParsingTests(unittest.TestCase):
+    def test_GIVEN_telnet_command_split_across_reads_THEN_kept_for_next_read(self):
+        text, pending = strip_telnet_commands(b"abc\xff\xfb")
+
+        assert_that((text, pending), equal_to((b"abc", b"\xff\xfb")))
+        assert_that(strip_telnet_commands(pending + b"\x01def"), equal_to((b"def", b"")))
+
+    def test_GIVEN_console_output_WHEN_parsed_THEN_not_an_event(self):
+        assert_that(parse_status_line("TEST", "epics> dbl", 10), equal_to(None))
+
+
+if __name__ == "__main__":
+    unittest.main()
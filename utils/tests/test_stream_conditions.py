@@ -0,0 +1,76 @@
+import socket
+import unittest
+from time import monotonic
+
+from hamcrest import assert_that, equal_to, greater_than_or_equal_to, is_
+
+from ..stream_conditions import LinkConditioner, LinkConditions
+from ..stream_proxy import BUFFER_SIZE
+from .fake_devices import UpperCaseDevice
+
+
+class LinkConditionerTests(unittest.TestCase):
+    def setUp(self):
+        self.device = UpperCaseDevice("device")
+        self.device.start()
+        self.link = LinkConditioner("device", self.device.listen_port, seed=1)
+        self.link.__enter__()
+        self.ioc = socket.create_connection(("127.0.0.1", self.link.listen_port), timeout=5)
+
+    def tearDown(self):
+        self.ioc.close()
+        self.link.__exit__(None, None, None)
+        self.device.stop()
+
+    def request(self, data):
+        self.ioc.sendall(data)
+        response = b""
+        while len(response) < len(data):
+            response += self.ioc.recv(BUFFER_SIZE)
+        return response
+
+    def test_GIVEN_latency_WHEN_request_made_THEN_reply_is_delayed_and_conditions_restored(self):
+        with self.link.conditions(latency=0.3):
+            start = monotonic()
+            response = self.request(b"id?\r\n")
+            elapsed = monotonic() - start
+
+        assert_that(response, is_(equal_to(b"ID?\r\n")))
+        assert_that(elapsed, greater_than_or_equal_to(0.3))
+        assert_that(self.link.current_conditions, is_(equal_to(LinkConditions())))
+
+    def test_GIVEN_replies_dropped_WHEN_request_made_THEN_no_reply_until_link_restored(self):
+        with self.link.conditions(drop_probability=1.0):
+            self.ioc.sendall(b"lost\r\n")
+            self.ioc.settimeout(0.3)
+            self.assertRaises(TimeoutError, self.ioc.recv, BUFFER_SIZE)
+        self.ioc.settimeout(5)
+
+        assert_that(self.request(b"id?\r\n"), is_(equal_to(b"ID?\r\n")))
+        assert_that(self.link.dropped_replies, is_(1))
+
+    def test_GIVEN_link_stalled_WHEN_stall_ends_THEN_held_traffic_is_delivered(self):
+        with self.link.stalled():
+            self.ioc.sendall(b"id?\r\n")
+            self.ioc.settimeout(0.3)
+            self.assertRaises(TimeoutError, self.ioc.recv, BUFFER_SIZE)
+            self.ioc.settimeout(5)
+
+        response = b""
+        while len(response) < 5:
+            response += self.ioc.recv(BUFFER_SIZE)
+        assert_that(response, is_(equal_to(b"ID?\r\n")))
+
+    def test_GIVEN_bandwidth_limit_WHEN_large_reply_sent_THEN_it_takes_as_long_as_the_limit(self):
+        with self.link.conditions(bandwidth=5000):
+            start = monotonic()
+            response = self.request(b"x" * 1000)
+            elapsed = monotonic() - start
+
+        assert_that(response, is_(equal_to(b"X" * 1000)))
+        # 1000 bytes at 5000 bytes/s; the reply streams back while the request is being sent
+        assert_that(elapsed, greater_than_or_equal_to(0.15))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import socket
+import tempfile
+import unittest
+from time import sleep
+
+from hamcrest import assert_that, contains_exactly, equal_to, has_length, is_
+
+from ..stream_proxy import BUFFER_SIZE
+from ..stream_recording import StreamRecorder, StreamRecording, StreamReplayServer
+from .fake_devices import UpperCaseDevice
+
+
+def send_and_receive(port, request, response_length):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as ioc:
+        ioc.sendall(request)
+        response = b""
+        while len(response) < response_length:
+            response += ioc.recv(BUFFER_SIZE)
+    return response
+
+
+def send_chunks_and_receive(port, chunks, response_length):
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as ioc:
+        ioc.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for chunk in chunks:
+            ioc.sendall(chunk)
+            sleep(0.05)
+        response = b""
+        while len(response) < response_length:
+            response += ioc.recv(BUFFER_SIZE)
+    return response
+
+
+class StreamRecordingTests(unittest.TestCase):
+    def setUp(self):
+        self.device = UpperCaseDevice("device")
+        self.device.start()
+        self.recorder = StreamRecorder("recorder", self.device.listen_port, device="upper")
+        self.recorder.start()
+
+    def tearDown(self):
+        self.recorder.stop()
+        self.device.stop()
+
+    def test_GIVEN_traffic_through_recorder_WHEN_replayed_THEN_ioc_gets_recorded_responses(self):
+        self.recorder.start_test("test_one")
+        assert_that(send_and_receive(self.recorder.listen_port, b"id?\r\n", 5), is_(b"ID?\r\n"))
+        self.recorder.stop()
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "recording.json")
+            self.recorder.recording.save(filename)
+            recording = StreamRecording.load(filename)
+
+        replay = StreamReplayServer("replay", recording, use_recorded_delays=False)
+        replay.start()
+        replay.start_test("test_one")
+        try:
+            response = send_and_receive(replay.listen_port, b"id?\r\n", 5)
+        finally:
+            replay.stop()
+
+        assert_that(response, is_(equal_to(b"ID?\r\n")))
+        assert_that(recording.exchanges("test_one"), has_length(1))
+
+    def test_GIVEN_request_not_in_recording_WHEN_replayed_THEN_it_is_reported_and_skipped(self):
+        recording = StreamRecording("upper")
+        recording.add_exchange("test_one", 0.0, b"id?\r\n", b"ID?\r\n", 0.01)
+        replay = StreamReplayServer("replay", recording, use_recorded_delays=False)
+        replay.start()
+        try:
+            response = send_and_receive(replay.listen_port, b"other\r\nid?\r\n", 5)
+        finally:
+            replay.stop()
+
+        assert_that(response, is_(equal_to(b"ID?\r\n")))
+        assert_that(replay.unmatched_requests, contains_exactly(b"other\r\n"))
+
+    def recorded_requests(self, chunks, response_length):
+        self.recorder.start_test("test_one")
+        send_chunks_and_receive(self.recorder.listen_port, chunks, response_length)
+        self.recorder.stop()
+        return [request for request, _, _ in self.recorder.recording.exchanges("test_one")]
+
+    def test_GIVEN_request_split_across_chunks_WHEN_recorded_THEN_it_is_one_exchange(self):
+        requests = self.recorded_requests([b"id?\r\n", b"SE", b"TP 1", b"\r\n"], 13)
+
+        assert_that(requests, contains_exactly(b"id?\r\n", b"SETP 1\r\n"))
+
+    def test_GIVEN_requests_in_one_chunk_WHEN_recorded_THEN_each_is_an_exchange(self):
+        self.recorder.start_test("test_one")
+        send_and_receive(self.recorder.listen_port, b"id?\r\nver?\r\n", 11)
+        self.recorder.stop()
+
+        exchanges = self.recorder.recording.exchanges("test_one")
+        assert_that(
+            [(request, response) for request, response, _ in exchanges],
+            contains_exactly((b"id?\r\n", b""), (b"ver?\r\n", b"ID?\r\nVER?\r\n")),
+        )
+
+    def test_GIVEN_cr_lf_split_across_chunks_WHEN_recorded_THEN_lf_ends_the_same_request(self):
+        requests = self.recorded_requests([b"id?\r", b"\nver?\r\n"], 11)
+
+        assert_that(requests, contains_exactly(b"id?\r\n", b"ver?\r\n"))
+
+    def test_GIVEN_request_terminator_WHEN_recorded_THEN_requests_end_at_it(self):
+        self.recorder.stop()
+        self.recorder = StreamRecorder(
+            "recorder", self.device.listen_port, device="upper", request_terminator=b";"
+        )
+        self.recorder.start()
+
+        requests = self.recorded_requests([b"a\rb;c", b";"], 6)
+
+        assert_that(requests, contains_exactly(b"a\rb;", b"c;"))
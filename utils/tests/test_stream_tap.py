@@ -0,0 +1,44 @@
+import socket
+import unittest
+
+from hamcrest import assert_that, close_to, equal_to, has_entries, is_
+
+from ..stream_proxy import BUFFER_SIZE
+from ..stream_tap import TrafficTap, TrafficTapRegister, command_key
+from .fake_devices import UpperCaseDevice
+
+
+class TrafficTapTests(unittest.TestCase):
+    def setUp(self):
+        self.device = UpperCaseDevice("device")
+        self.device.start()
+
+    def tearDown(self):
+        self.device.stop()
+
+    def test_GIVEN_requests_with_numbers_WHEN_getting_command_key_THEN_numbers_are_replaced(self):
+        assert_that(command_key(b"SETP 12.5\r\n"), is_(equal_to("SETP #")))
+        assert_that(command_key(b"T-3e2"), is_(equal_to("T#")))
+
+    def test_GIVEN_ioc_sends_commands_through_tap_WHEN_measured_THEN_commands_are_counted(self):
+        with TrafficTap("device", self.device.listen_port) as tap:
+            assert_that(TrafficTapRegister.get_running("device"), is_(tap))
+            with tap.measure() as traffic:
+                with socket.create_connection(("127.0.0.1", tap.listen_port), timeout=5) as ioc:
+                    for request in (b"SETP 1\r\n", b"SETP 2\r\n", b"READ\r\n"):
+                        ioc.sendall(request)
+                        response = b""
+                        while len(response) < len(request):
+                            response += ioc.recv(BUFFER_SIZE)
+            stats = traffic.stats
+
+        assert_that(stats.commands, is_(3))
+        assert_that(stats.command_counts, has_entries({"SETP #": 2, "READ": 1}))
+        assert_that(stats.unanswered, is_(0))
+        assert_that(stats.bytes_from_device, is_(22))
+        assert_that(sum(stats.latency_histogram().values()), is_(3))
+        assert_that(stats.peak_commands_per_second(window=60), close_to(3 / 60, 1e-9))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,20 @@
+import os
+import tempfile
+import threading
 import unittest
+from time import monotonic
+from unittest.mock import ANY
 
-from hamcrest import assert_that, equal_to, is_
+from hamcrest import assert_that, contains_exactly, equal_to, is_, less_than
 
-from ..testing import add_method, parameterized_list
+from ..log_file import LogFileManager
+from ..testing import (
+    _AssertLogContext,
+    add_method,
+    parameterized_list,
+    skip_before_setup,
+    skip_if_condition,
+)
 
 
 class ParameterizedListTests(unittest.TestCase):
@@ -101,5 +113,94 @@ class AddMethodTests(unittest.TestCase):
         assert_that(result, is_(equal_to(expected_result)))
 
 
+class AssertLogMessagesTests(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.filename = os.path.join(self.log_dir.name, "ioc.log")
+        self.manager = LogFileManager(self.filename)
+        self.addCleanup(self.manager.close)
+
+    def write(self, text):
+        with open(self.filename, "a") as f:
+            f.write(text)
+
+    def write_later(self, text, delay=0.2):
+        timer = threading.Timer(delay, self.write, [text])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_GIVEN_must_contain_WHEN_message_logged_THEN_finishes_before_end_of_window(self):
+        self.write_later("asyn: device disconnected\n")
+        start = monotonic()
+
+        with _AssertLogContext(self.manager, in_time=30, must_contain="disconnected") as cm:
+            pass
+
+        assert_that(monotonic() - start, is_(less_than(5)))
+        assert_that(cm.messages, contains_exactly("asyn: device disconnected\n"))
+
+    def test_GIVEN_number_of_messages_WHEN_exceeded_THEN_fails_before_end_of_window(self):
+        self.write_later("error 1\nerror 2\nerror 3\n")
+        start = monotonic()
+
+        with self.assertRaises(AssertionError):
+            with _AssertLogContext(self.manager, number_of_messages=2, in_time=30):
+                pass
+
+        assert_that(monotonic() - start, is_(less_than(5)))
+
+    def test_GIVEN_number_of_messages_WHEN_not_exceeded_THEN_whole_window_read(self):
+        self.write_later("error 1\n", delay=0.1)
+
+        with _AssertLogContext(self.manager, number_of_messages=2, in_time=0.5) as cm:
+            pass
+
+        assert_that(cm.messages, contains_exactly("error 1\n"))
+
+    def test_GIVEN_ignored_messages_WHEN_counting_THEN_not_counted(self):
+        with _AssertLogContext(self.manager, number_of_messages=1, in_time=0.3) as cm:
+            self.write("log client: failed to connect\nautosave: saved\nerror 1\n")
+
+        assert_that(cm.messages, contains_exactly("error 1\n"))
+
+
+class SkipBeforeSetupTests(unittest.TestCase):
+    class Suite(unittest.TestCase):
+        set_up_calls = 0
+
+        def setUp(self):
+            SkipBeforeSetupTests.Suite.set_up_calls += 1
+
+        @skip_if_condition(lambda: True, "skipped in this mode")
+        def test_skipped(self):
+            pass
+
+        @skip_if_condition(lambda: False, "not skipped in this mode")
+        def test_run(self):
+            pass
+
+    def run_test(self, name):
+        self.Suite.set_up_calls = 0
+        test = self.Suite(name)
+        result = unittest.TestResult()
+        skip_before_setup(test)
+        test.run(result)
+        return result
+
+    def test_GIVEN_condition_holds_WHEN_run_THEN_skipped_without_set_up(self):
+        result = self.run_test("test_skipped")
+
+        assert_that(result.skipped, contains_exactly((ANY, "skipped in this mode")))
+        assert_that(self.Suite.set_up_calls, equal_to(0))
+
+    def test_GIVEN_condition_does_not_hold_WHEN_run_THEN_test_runs(self):
+        result = self.run_test("test_run")
+
+        assert_that(result.skipped, equal_to([]))
+        assert_that(result.testsRun, equal_to(1))
+        assert_that(self.Suite.set_up_calls, equal_to(1))
+
+
 if __name__ == "__main__":
     unittest.main()